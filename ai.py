@@ -0,0 +1,150 @@
+import board
+import engine
+import helpers
+import snapshot
+
+import random
+import time
+
+directions = ["up", "down", "left", "right"]
+
+# deep enough for both actions of a turn and a free disarm in between
+max_depth = 3
+
+# the rng only matters in a lobby, searches never touch it
+shared_rng = random.Random(0)
+
+
+class Timeout(Exception):
+	pass
+
+
+class Search:
+	__slots__ = ("player", "deadline", "nodes")
+
+	def __init__(self, player, deadline):
+		self.player = player
+		self.deadline = deadline
+		self.nodes = 0
+
+	def play(self, data, op, args):
+		if time.perf_counter() > self.deadline:
+			raise Timeout()
+		self.nodes += 1
+
+		# every node is rebuilt from its parent's snapshot, which is cheaper
+		# than undoing an action and cannot leak state between siblings
+		child = load(data)
+		try:
+			getattr(child, op)(*args)
+		except engine.ArenaError:
+			return None
+		child.remove_dead()
+
+		return child, snapshot.dump(child, 0, 0, with_events=False)
+
+	def value(self, node, depth):
+		match, data = node
+		fighter = match.players.get(self.player)
+		if depth == 0 or fighter is None or match.get_winner() is not None or match.get_current_turn() is not fighter:
+			return evaluate(match, self.player)
+
+		best = None
+		for op, args in candidates(match, self.player):
+			child = self.play(data, op, args)
+			if child is not None:
+				score = self.value(child, depth-1)
+				best = score if best is None else max(best, score)
+
+		return best if best is not None else evaluate(match, self.player)
+
+
+def load(data):
+	match = engine.Match(shared_rng)
+	snapshot.load(data, match)
+	return match
+
+
+def candidates(match, player):
+	fighter = match.players[player]
+	threats = match.map.threats
+
+	for i, direction in enumerate(directions):
+		target = threats.target(fighter, i)
+		if target is None or target is fighter:
+			continue
+
+		yield "attack", (player, direction)
+		if fighter.equip['name'] == "axe":
+			yield "shove", (player, direction)
+		if fighter.equip['name'] == "rapier" and target.equip is not engine.weapons_data[0]:
+			yield "disarm", (player, direction)
+
+	if fighter.equip['name'] == "dagger":
+		for target in match.fighters:
+			if target is not fighter and threats.in_throw_range(fighter, target):
+				yield "throw", (player, target.player)
+
+	# clamped moves that land on the same square are the same move
+	seen = {(fighter.x, fighter.y)}
+	for x in range(-4, 5):
+		for y in range(abs(x)-4, 5-abs(x)):
+			destination = (helpers.clamp(fighter.x+x, 1, match.map.width), helpers.clamp(fighter.y+y, 1, match.map.height))
+			if destination not in seen and match.map.tag(*destination) != board.FIGHTER:
+				seen.add(destination)
+				yield "move", (player, x, y)
+
+def evaluate(match, player):
+	fighter = match.players.get(player)
+	if fighter is None:
+		return -1000
+	if match.get_winner() is fighter:
+		return 1000
+
+	enemies = [i for i in match.fighters if i is not fighter]
+	nearest = min(engine.get_ranged_distance(fighter.get_position(), i.get_position()) for i in enemies)
+
+	# what the others could do to this square before the next turn comes
+	# around stands in for searching their replies
+	score = 3 * fighter.hp + 2 * fighter.equip['damage']
+	score -= 2 * sum(i.hp for i in enemies) + 10 * len(enemies)
+	score -= match.map.threats.danger_at(fighter.x, fighter.y, exclude=fighter)
+	score -= 0.1 * nearest
+	return score
+
+def search(data, player, budget):
+	"""
+	Pick an action for player within budget seconds. Runs iterative
+	deepening over the player's own actions this turn, scoring leaves by
+	the position and the damage the others could deal in reply, and keeps
+	the best move of the deepest search that finished.
+	"""
+	state = Search(player, time.perf_counter() + budget)
+
+	root = load(data)
+
+	best = ("skip", ())
+	children = []
+	try:
+		for op, args in candidates(root, player):
+			child = state.play(data, op, args)
+			if child is not None:
+				children.append((evaluate(child[0], player), op, args, child))
+	except Timeout:
+		pass
+
+	# out of time before any action was tried, or nothing to try at all
+	if not children:
+		return best[0], best[1], state.nodes
+
+	children.sort(key=lambda i: i[0], reverse=True)
+	best = children[0][1:3]
+
+	for depth in range(1, max_depth):
+		try:
+			scored = [(state.value(child, depth), op, args) for score, op, args, child in children]
+		except Timeout:
+			break
+		best = max(scored, key=lambda i: i[0])[1:3]
+
+	return best[0], best[1], state.nodes
\ No newline at end of file
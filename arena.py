@@ -1,227 +1,172 @@
-import helpers
 import battlemap
+import engine
+import generation
+import helpers
+import liveboard
+import metrics
+import renderer
+import snapshot
+from engine import weapons_data, ArenaError, Object, Fighter, Weapon, Trap
 
-import random
+import asyncio
 import discord.embeds
+import itertools
+from os import getenv
 
-weapons_data = [
-	{"name": "fist", "damage": 1, "range": 1},
-	{"name": "dagger", "damage": 2, "range": 1},
-	{"name": "rapier", "damage": 3, "range": 1},
-	{"name": "axe", "damage": 3, "range": 1},
-	{"name": "spear", "damage": 2, "range": 2},
-]
-
-class Object:
-	def __init__(self, x, y, map):
-		self.x = chr(x + 96)
-		self.y = y
-		map[x-1][y-1] = self
-	
-	def get_position(self):
-		return [ord(self.x) - 96, self.y]
-		
-	def put_in_map(self):
-		pass # must override
-
-class Fighter(Object):
-	def __init__(self, x, y, map, user, shortcode):
-		Object.__init__(self, x, y, map)
-		self.user = user
-		
-		self.move = 4
-		self.actions = 2
-		self.hp = 12
-	
-		self.equip = weapons_data[0]
+local_renderer = None
+if getenv("LOCAL_RENDER") and renderer.available():
+	local_renderer = renderer.Renderer()
 
-		self.shortcode = shortcode
+class MatchState(engine.Match):
+	def __init__(self, ctx, rng=None, size=10, layout=generation.default):
+		engine.Match.__init__(self, rng, width=size, height=size, layout=layout)
+		self.setup(ctx.guild, ctx.channel)
 
-	def confirm_move(self, x, y, map):
-		prev_x, prev_y = self.get_position()
-	
-		map[prev_x-1][prev_y-1] = 0
-		self.x = helpers.num_to_alpha(helpers.clamp(prev_x+x, 1, 10))
-		self.y = helpers.clamp(prev_y+y, 1, 10)
-		map[helpers.alpha_to_num(self.x)-1][self.y-1] = self
-
-	def map_move(self, x, y, map):
-		prev_x, prev_y = self.get_position()
-		cx = helpers.clamp(prev_x+x, 1, 10)
-		cy = helpers.clamp(prev_y+y, 1, 10)
-
-		destination_object = map[cx-1][cy-1]
-		if destination_object == 0:
-			self.confirm_move(x, y, map)
-		else:
-			obj_type = type(destination_object).__name__
-			match obj_type:
-				case "Fighter":
-					pass
-					
-				case "Weapon":
-					self.equip = destination_object.data
-					self.confirm_move(x, y, map)
-					
-				case "Trap":
-					self.hp -= destination_object.damage
-					self.confirm_move(x, y, map)
-				
-		
-		return destination_object
-	
-	def reset_actions(self):
-		self.move = 4
-		self.actions = 2
-	
-	def put_in_map(self):
-		if self.shortcode is None:
-			return f"/{self.x}{self.y}-{self.user.name}"
-		else:
-			return f"/{self.x}{self.y}~{self.shortcode}"
+		self.add_fighter(ctx.author)
 
-class Weapon(Object):
-	def __init__(self, x, y, data, map):
-		Object.__init__(self, x, y, map)
-		self.data = data
-	
-	def put_in_map(self):
-		return f"/{self.x}{self.y}-{self.data['name']}"
-
-class Trap(Object):
-	def __init__(self, x, y, name, damage, map):
-		Object.__init__(self, x, y, map)
-		self.name = name
-		self.damage = damage
-	
-	def put_in_map(self):
-		return f"/{self.x}{self.y}-{self.name}"
+	def setup(self, guild, channel):
+		self.guild = guild
+		self.channel = channel
+		self.shortcode_tasks = set()
+		self.rendered = None
+		self.canvas = None
+		self.prerendered = None
+		self.live = liveboard.LiveBoard(channel)
+		self.lock = asyncio.Lock()
+		self.timed_turn = None
 
-class MatchState:
-	def __init__(self, ctx):
-		self.guild = ctx.guild
-		self.channel = ctx.channel
-		self.invoker = ctx.author
+		# resolves to the winning player once the match is over
+		self.finished = asyncio.get_running_loop().create_future()
 
-		self.started = False
-		self.fighters = []
-		self.weapons = []
-		self.traps = []
-		self.map = [[0 for i in range(10)] for j in range(10)]
+	@classmethod
+	def for_players(cls, channel, users, size=10, layout=generation.default):
+		match = cls.__new__(cls)
+		engine.Match.__init__(match, width=size, height=size, layout=layout)
+		match.setup(channel.guild, channel)
 
-		self.current_turn = 0
-		self.current_round = 0
+		for i in users:
+			match.add_fighter(i)
 
-		self.add_fighter(ctx.author)
-	
-	def is_empty(self, x, y):
-		return self.map[x-1][y-1] == 0
+		return match
 
-	def generate_weapons(self):
-		generate = 4
+	@classmethod
+	def restore(cls, data, channel):
+		match = cls.__new__(cls)
+		engine.Match.__init__(match)
+		match.setup(channel.guild, channel)
+		snapshot.load(data, match)
 
-		while generate > 0:
-			x = random.randint(1, 10)
-			y = random.randint(1, 10)
-			data = weapons_data[random.randint(1, len(weapons_data)-1)]
+		guild_id, channel_id, message_id = snapshot.read_header(data)
+		if message_id is not None:
+			match.live.message = channel.get_partial_message(message_id)
 
-			if self.is_empty(x, y):
-				self.weapons.append(Weapon(x, y, data, self.map))
-				generate -= 1
+		return match
 
-	def generate_traps(self):
-		generate = 4
+	def dump_snapshot(self, with_events=True):
+		message_id = self.live.message.id if self.live.message is not None else None
+		return snapshot.dump(self, self.guild.id if self.guild else None, self.channel.id, message_id, with_events)
 
-		while generate > 0:
-			x = random.randint(1, 10)
-			y = random.randint(1, 10)
-			
-			if self.is_empty(x, y):
-				self.traps.append(Trap(x, y, "spikes", 2, self.map))
-				generate -= 1
+	def add_fighter(self, user):
+		if user.avatar is None:
+			shortcode = None
+		else:
+			shortcode = battlemap.get_cached_shortcode(user.avatar.url)
+		new = engine.Match.add_fighter(self, user.id, user.name, shortcode)
+		self.observe_generation("spawn")
 
-	def start_match(self):
-		random.shuffle(self.fighters)
-		self.generate_weapons()
-		self.generate_traps()
+		# the plain name token is used until the avatar shortcode resolves
+		if user.avatar is not None and shortcode is None:
+			loop = asyncio.get_running_loop()
+			task = loop.create_task(self.resolve_shortcode(user.id, user.avatar.url))
+			self.shortcode_tasks.add(task)
+			task.add_done_callback(self.shortcode_tasks.discard)
 
-		self.current_turn += 1
-		self.current_round += 1
-		self.started = True
-	
-	def find_user_in_match(self, user_mention):
-		for i in self.fighters:
-			if i.user.mention == user_mention:
-				return i
+		return new
 
-	def add_fighter(self, user):
-		x = random.randint(1, 10)
-		y = random.randint(1, 10)
+	def add_ai(self):
+		player = next(i for i in itertools.count(1) if i not in self.players)
+		new = engine.Match.add_fighter(self, player, f"AI{player}")
+		self.observe_generation("spawn")
+		return new
 
-		while not self.is_empty(x, y):
-			x = random.randint(1, 10)
-			y = random.randint(1, 10)
+	def start_match(self):
+		engine.Match.start_match(self)
+		self.observe_generation("start")
 
-		if user.avatar is None:
-			shortcode = None
-		else:
-			shortcode = battlemap.get_shortcode(user.avatar.url)
-		new = Fighter(x, y, self.map, user, shortcode)
+	def observe_generation(self, stage):
+		metrics.observe("arena_generation_seconds", self.generation_time, layout=self.layout.name, stage=stage)
 
-		self.fighters.append(new)
-	
-	def remove_fighter(self, user):
-		obj = self.find_user_in_match(user.mention)
-		x, y = obj.get_position()
-		self.map[x-1][y-1] = 0
-		self.fighters.remove(obj)
-	
-	def get_current_turn(self):
-		return self.fighters[self.current_turn]
-	
-	def end_turn(self):
-		if (self.current_turn + 1) >= len(self.fighters):
-			self.current_round += 1
-			self.current_turn = 0
+	async def resolve_shortcode(self, player, avatar_url):
+		shortcode = await battlemap.get_shortcode(avatar_url)
+		fighter = self.players.get(player)
 
-			for i in self.fighters:
-				i.reset_actions()
-		else:
-			self.current_turn += 1
+		if shortcode is not None and fighter is not None:
+			fighter.shortcode = shortcode
+			self.map.refresh(fighter)
 
-	def check_actions_left(self):
-		if self.get_current_turn().actions > 1:
-			self.get_current_turn().actions -= 1
+	def remove_fighter(self, player):
+		engine.Match.remove_fighter(self, player)
 
-		else:
-			self.end_turn()
-	
-	def remove_dead(self):
-		for i in self.fighters:
-			if i.hp <= 0:
-				self.remove_fighter(i.user)
+		# an ai cannot type //start, so a human keeps the lobby
+		if self.invoker is not None and helpers.is_ai(self.invoker):
+			self.invoker = next((i.player for i in self.fighters if not helpers.is_ai(i.player)), self.invoker)
 
+	@metrics.timed("arena_update_map_seconds")
 	def update_map(self):
-		message = 	f"""Current Turn: {self.get_current_turn().user.mention}
+		message = 	f"""Current Turn: {helpers.mention(self.get_current_turn().player)}
 						Current Round: {self.current_round}
 						Current Actions Left: {self.get_current_turn().actions}
 						Current Health: {self.get_current_turn().hp}/12
 						Equipped: {self.get_current_turn().equip['name']}"""
 
+		# boards past 10x10 only show the part around the current fighter
+		view = self.get_view()
+		key = (self.map.hash, view, message)
+		if self.rendered is not None and self.rendered[0] == key:
+			return self.rendered[1]
+
 		embed = discord.Embed(title="Battlemap", description=message)
-		url = battlemap.get_url() + "10x10"
-		for i in self.map:
-			for j in i:
-				if j != 0:
-					url = url + j.put_in_map()
+		if local_renderer is not None:
+			url = "attachment://board.png"
+		elif view is None:
+			url = f"{battlemap.get_url()}{self.map.width}x{self.map.height}{self.map.render()}"
+		else:
+			url = f"{battlemap.get_url()}{view[2]}x{view[3]}{self.map.render(view)}"
 	
 		embed.set_image(url=url)
+		self.rendered = (key, embed)
 		return embed
 	
+	@metrics.timed("arena_render_image_seconds")
+	def render_image(self):
+		if local_renderer is None:
+			return None
+		view = self.get_view()
+		if self.prerendered is not None and self.prerendered[0] == (self.map.hash, view):
+			return self.prerendered[1]
+
+		if self.canvas is None:
+			width, height = view[2:] if view is not None else (self.map.width, self.map.height)
+			self.canvas = renderer.Canvas(local_renderer, width, height)
+		return local_renderer.render(self.map, self.canvas, view)
+
+	def finish(self):
+		# a match cut short goes to the healthiest fighter still standing
+		winner = self.get_winner()
+		if winner is None and self.started and self.fighters:
+			winner = max(self.fighters, key=lambda i: i.hp)
+		winner = winner.player if winner is not None else None
+
+		# a tournament that was called off has cancelled the future already
+		if not self.finished.done():
+			self.finished.set_result(winner)
+		return winner
+
+	def show(self, line=None):
+		self.live.post(line, self.update_map(), self.render_image())
+	
 	def display_roster(self):
-		message = f"FIGHTERS({len(self.fighters)}/4):\n"
-
-		for i in self.fighters:
-			message += f"{self.fighters.index(i)+1}. {i.user.mention}\n"
+		message = f"FIGHTERS({len(self.fighters)}/{self.max_fighters()}):\n"
+		message += helpers.numbered([helpers.mention(i.player) for i in self.fighters], helpers.description_length - len(message))
 		
 		return discord.Embed(title=f"Battle at {self.channel}!", description=message)
\ No newline at end of file
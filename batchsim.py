@@ -0,0 +1,426 @@
+import engine
+
+import argparse
+import time
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+
+size = 10
+cells = size * size
+
+MOVE, ATTACK, THROW, SHOVE, DISARM = range(5)
+
+# same order as engine.get_attack_offset
+directions = ["up", "down", "left", "right"]
+offset_x = [0, 0, -1, 1]
+offset_y = [-1, 1, 0, 0]
+
+def available():
+	return np is not None
+
+
+class Batch:
+	"""
+	N matches held as arrays and stepped in lock-step, one action per
+	match per step. Fighters keep their slot for the whole match, slot
+	order is turn order, and a removed fighter only clears its alive flag.
+	Board cells are flattened as (x-1)*10 + (y-1).
+	"""
+	def __init__(self, matches, players=4, seed=0, weapons=None, trap_damage=2, weapon_count=4, trap_count=4):
+		weapons = weapons or engine.weapons_data
+		names = [i["name"] for i in weapons]
+
+		self.rng = np.random.default_rng(seed)
+		self.matches = matches
+		self.players = players
+		self.weapons = weapons
+		self.damage = np.array([i["damage"] for i in weapons], np.int16)
+		self.range = np.array([i["range"] for i in weapons], np.int16)
+		self.dagger = names.index("dagger")
+		self.rapier = names.index("rapier")
+		self.axe = names.index("axe")
+		self.trap = len(weapons)
+		self.trap_damage = trap_damage
+
+		# a random permutation of the cells places fighters, weapons and traps
+		# on distinct squares, like the engine's retry loops
+		layout = self.rng.random((matches, cells)).argsort(axis=1)
+		rows = np.arange(matches)[:, None]
+		spawn = layout[:, :players]
+
+		self.x = (spawn // size).astype(np.int16)
+		self.y = (spawn % size).astype(np.int16)
+		self.spawn_x = self.x.copy()
+		self.spawn_y = self.y.copy()
+		self.hp = np.full((matches, players), 12, np.int16)
+		self.equip = np.zeros((matches, players), np.int16)
+		self.actions = np.full((matches, players), 2, np.int8)
+		self.alive = np.ones((matches, players), bool)
+
+		self.occupant = np.zeros((matches, cells), np.int8)
+		self.occupant[rows, spawn] = np.arange(1, players+1, dtype=np.int8)
+
+		self.items = np.zeros((matches, cells), np.int8)
+		end = players + weapon_count
+		self.items[rows, layout[:, players:end]] = self.rng.integers(1, len(weapons), (matches, weapon_count))
+		self.items[rows, layout[:, end:end+trap_count]] = self.trap
+
+		# start_match moves the pointer past the first fighter
+		self.turn = np.full(matches, 1 % players, np.int64)
+		self.round = np.ones(matches, np.int64)
+		self.steps = np.zeros(matches, np.int64)
+		self.rejected = np.zeros(matches, np.int64)
+		self.done = np.zeros(matches, bool)
+		self.winner = np.full(matches, -1, np.int64)
+
+		self.record = None
+
+	def ray(self, rows, slots, direction, reach):
+		x = self.x[rows, slots]
+		y = self.y[rows, slots]
+		ox = np.take(offset_x, direction)
+		oy = np.take(offset_y, direction)
+		target = np.full(len(rows), -1, np.int64)
+
+		# clamping means a ray off the edge can land on the attacker itself
+		for i in range(1, int(reach.max(initial=0))+1):
+			rx = np.clip(x + ox*i, 0, size-1)
+			ry = np.clip(y + oy*i, 0, size-1)
+			hit = self.occupant[rows, rx*size + ry].astype(np.int64) - 1
+			found = (target < 0) & (hit >= 0) & (i <= reach)
+			target[found] = hit[found]
+
+		return target
+
+	def map_move(self, rows, slots, dx, dy):
+		cx = np.clip(self.x[rows, slots] + dx, 0, size-1)
+		cy = np.clip(self.y[rows, slots] + dy, 0, size-1)
+		cell = cx*size + cy
+		occupant = self.occupant[rows, cell].astype(np.int64) - 1
+
+		free = occupant < 0
+		rows, slots, cell = rows[free], slots[free], cell[free]
+		self.occupant[rows, self.x[rows, slots]*size + self.y[rows, slots]] = 0
+
+		item = self.items[rows, cell]
+		weapon = (item > 0) & (item != self.trap)
+		self.equip[rows[weapon], slots[weapon]] = item[weapon]
+		trap = item == self.trap
+		self.hp[rows[trap], slots[trap]] -= self.trap_damage
+		self.items[rows, cell] = 0
+
+		self.x[rows, slots] = cx[free]
+		self.y[rows, slots] = cy[free]
+		self.occupant[rows, cell] = slots + 1
+		return occupant
+
+	def next_slot(self, rows):
+		alive = self.alive[rows]
+		later = alive & (np.arange(self.players) > self.turn[rows][:, None])
+		wraps = ~later.any(axis=1)
+		return np.where(wraps, alive.argmax(axis=1), later.argmax(axis=1)), wraps
+
+	def end_turn(self, rows):
+		following, wraps = self.next_slot(rows)
+		self.turn[rows] = following
+
+		wrapped = rows[wraps]
+		self.round[wrapped] += 1
+		self.actions[wrapped] = 2
+
+	def spend(self, rows, slots):
+		more = self.actions[rows, slots] > 1
+		self.actions[rows[more], slots[more]] -= 1
+		self.end_turn(rows[~more])
+
+	def apply(self, rows, op, a, b):
+		slots = self.turn[rows]
+		equip = self.equip[rows, slots]
+		spent = np.zeros(len(rows), bool)
+
+		move = op == MOVE
+		near = move & (np.abs(a) + np.abs(b) <= 4)
+		occupant = self.map_move(rows[near], slots[near], a[near], b[near])
+		spent[near] = (occupant < 0) | (occupant == slots[near])
+
+		melee = (op == ATTACK) | (op == SHOVE) | (op == DISARM)
+		melee &= (op == ATTACK) | ((op == SHOVE) & (equip == self.axe)) | ((op == DISARM) & (equip == self.rapier))
+		target = np.full(len(rows), -1, np.int64)
+		target[melee] = self.ray(rows[melee], slots[melee], a[melee], self.range[equip[melee]])
+		hit = target >= 0
+
+		attack = hit & (op == ATTACK)
+		self.hp[rows[attack], target[attack]] -= self.damage[equip[attack]]
+		spent |= attack
+
+		throw = np.flatnonzero((op == THROW) & (equip == self.dagger))
+		r, s, t = rows[throw], slots[throw], a[throw]
+		distance = np.abs(self.x[r, s] - self.x[r, t]) + np.abs(self.y[r, s] - self.y[r, t])
+		throw = throw[self.alive[r, t] & (distance <= 5)]
+		self.hp[rows[throw], a[throw]] -= self.damage[equip[throw]]
+		spent[throw] = True
+
+		shove = hit & (op == SHOVE)
+		direction = a[shove]
+		self.map_move(rows[shove], target[shove], np.take(offset_x, direction)*2, np.take(offset_y, direction)*2)
+		self.hp[rows[shove], target[shove]] -= 1
+		spent |= shove
+
+		# disarming does not use up an action in the engine either
+		disarm = hit & (op == DISARM)
+		self.equip[rows[disarm], target[disarm]] = 0
+
+		self.rejected[rows] += ~(spent | disarm)
+		self.spend(rows[spent], slots[spent])
+
+	def remove_dead(self, rows):
+		dead = self.alive[rows] & (self.hp[rows] <= 0)
+		if not dead.any():
+			return
+
+		r, s = np.nonzero(dead)
+		r = rows[r]
+		self.alive[r, s] = False
+		self.occupant[r, self.x[r, s]*size + self.y[r, s]] = 0
+
+		# the turn passes to whoever followed the dead fighter, starting the
+		# next round if it wraps
+		current = rows[~self.alive[rows, self.turn[rows]]]
+		self.end_turn(current)
+
+	def step(self, policy, max_steps=1000):
+		rows = np.flatnonzero(~self.done)
+		if not len(rows):
+			return False
+
+		op, a, b = policy(self, rows)
+		if self.record is not None:
+			self.record.append((rows, op, a, b))
+
+		self.apply(rows, op, a, b)
+		self.steps[rows] += 1
+		self.remove_dead(rows)
+
+		left = self.alive[rows].sum(axis=1)
+		finished = (left <= 1) | (self.steps[rows] >= max_steps)
+		ended = rows[finished]
+		self.done[ended] = True
+		self.winner[ended] = np.where(left[finished] == 1, self.alive[ended].argmax(axis=1), -1)
+		return True
+
+	def run(self, policy, max_steps=1000):
+		while self.step(policy, max_steps):
+			pass
+		return self
+
+
+def random_policy(batch, rows):
+	"""The same action mix as bench.random_action."""
+	rng = batch.rng
+	roll = rng.random(len(rows))
+	op = np.select([roll < 0.45, roll < 0.8, roll < 0.9, roll < 0.95], [MOVE, ATTACK, THROW, SHOVE], DISARM)
+
+	dx = rng.integers(-4, 5, len(rows))
+	span = 4 - np.abs(dx)
+	dy = (rng.random(len(rows)) * (2*span+1)).astype(np.int64) - span
+
+	direction = rng.integers(0, 4, len(rows))
+	target = (rng.random((len(rows), batch.players)) * batch.alive[rows]).argmax(axis=1)
+
+	a = np.select([op == MOVE, op == THROW], [dx, target], direction)
+	b = np.where(op == MOVE, dy, 0)
+	return op, a, b
+
+def toward(dx, dy, budget):
+	step_x = np.sign(dx) * np.minimum(np.abs(dx), budget)
+	step_y = np.sign(dy) * np.minimum(np.abs(dy), budget - np.abs(step_x))
+	return step_x, step_y
+
+def greedy_policy(batch, rows, explore=0.1):
+	"""Attack what is in reach, throw daggers, pick up a weapon when bare-handed, otherwise close in."""
+	slots = batch.turn[rows]
+	count = len(rows)
+	equip = batch.equip[rows, slots]
+	x = batch.x[rows, slots].astype(np.int64)
+	y = batch.y[rows, slots].astype(np.int64)
+
+	op, a, b = random_policy(batch, rows)
+	decided = batch.rng.random(count) < explore
+
+	for direction in range(len(directions)):
+		target = batch.ray(rows, slots, np.full(count, direction), batch.range[equip])
+		found = ~decided & (target >= 0) & (target != slots)
+		op[found], a[found], b[found] = ATTACK, direction, 0
+		decided |= found
+
+	enemies = batch.alive[rows].copy()
+	enemies[np.arange(count), slots] = False
+	distance = np.abs(batch.x[rows] - x[:, None]) + np.abs(batch.y[rows] - y[:, None])
+	distance = np.where(enemies, distance, cells)
+	nearest = distance.argmin(axis=1)
+	gap = distance[np.arange(count), nearest]
+
+	throw = ~decided & (equip == batch.dagger) & (gap <= 5)
+	op[throw], a[throw], b[throw] = THROW, nearest[throw], 0
+	decided |= throw
+
+	grid = np.arange(cells)
+	bare = np.flatnonzero(~decided & (equip == 0))
+	items = batch.items[rows[bare]]
+	reach = np.abs(grid // size - x[bare, None]) + np.abs(grid % size - y[bare, None])
+	reach = np.where((items > 0) & (items != batch.trap), reach, cells)
+	closest = reach.argmin(axis=1)
+	near = reach[np.arange(len(bare)), closest] <= 4
+	pickup, closest = bare[near], closest[near]
+	step_x, step_y = toward(closest // size - x[pickup], closest % size - y[pickup], 4)
+	op[pickup], a[pickup], b[pickup] = MOVE, step_x, step_y
+	decided[pickup] = True
+
+	step_x, step_y = toward(batch.x[rows, nearest] - x, batch.y[rows, nearest] - y, np.minimum(4, gap-1))
+	chase = ~decided
+	op[chase], a[chase], b[chase] = MOVE, step_x[chase], step_y[chase]
+	return op, a, b
+
+policies = {"random": random_policy, "greedy": greedy_policy}
+
+
+def verify(matches, players, seed, policy):
+	"""Step engine.Match copies of a small batch alongside it and compare every fighter after every action."""
+	batch = Batch(matches, players, seed)
+	batch.record = []
+
+	games = []
+	for i in range(matches):
+		game = engine.Match(seed=0)
+		for slot in range(players):
+			fighter = engine.Fighter(int(batch.x[i, slot])+1, int(batch.y[i, slot])+1, game.map, slot, f"p{slot}", None)
+			game.fighters.append(fighter)
+			game.players[slot] = fighter
+		for cell in np.flatnonzero(batch.items[i]):
+			x, y = divmod(int(cell), size)
+			if batch.items[i, cell] == batch.trap:
+				game.traps.append(engine.Trap(x+1, y+1, "spikes", batch.trap_damage, game.map))
+			else:
+				game.weapons.append(engine.Weapon(x+1, y+1, engine.weapons_data[batch.items[i, cell]], game.map))
+		game.started = True
+		game.current_turn = 1 % players
+		game.current_round = 1
+		games.append(game)
+
+	checked = 0
+	while batch.step(policy):
+		rows, op, a, b = batch.record.pop()
+		for row, action, first, second in zip(rows, op, a, b):
+			game = games[row]
+			player = game.get_current_turn().player
+			try:
+				match action:
+					case 0: game.move(player, int(first), int(second))
+					case 1: game.attack(player, directions[first])
+					case 2: game.throw(player, int(first))
+					case 3: game.shove(player, directions[first])
+					case 4: game.disarm(player, directions[first])
+			except engine.ArenaError:
+				pass
+			game.remove_dead()
+
+			expected = sorted((i.player, i.x-1, i.y-1, i.hp, engine.weapons_data.index(i.equip)) for i in game.fighters)
+			actual = [(slot, batch.x[row, slot], batch.y[row, slot], batch.hp[row, slot], batch.equip[row, slot])
+				for slot in np.flatnonzero(batch.alive[row])]
+			if expected != actual or game.get_current_turn().player != batch.turn[row] or game.current_round != batch.round[row]:
+				raise AssertionError(f"match {row} diverged after {batch.steps[row]} steps: {expected} != {actual}")
+			checked += 1
+
+	return checked
+
+
+def percent(part, whole):
+	return f"{100*part/whole:5.1f}%" if whole else "    -"
+
+def report(batches, elapsed):
+	matches = sum(i.matches for i in batches)
+	players = batches[0].players
+	weapons = batches[0].weapons
+	winners = np.concatenate([i.winner for i in batches])
+	steps = np.concatenate([i.steps for i in batches])
+
+	won = np.concatenate([np.arange(players) == i.winner[:, None] for i in batches])
+	equip = np.concatenate([i.equip for i in batches])
+	spawn_x = np.concatenate([i.spawn_x for i in batches])
+	spawn_y = np.concatenate([i.spawn_y for i in batches])
+
+	print(f"matches:          {matches:,} ({players} players, {(winners < 0).sum():,} unfinished)")
+	print(f"matches/sec:      {matches/elapsed:,.0f}")
+	print(f"actions/match:    {steps.mean():.1f} mean, {np.percentile(steps, 99):.0f} p99")
+
+	# weapons are credited to whoever held them when they died or won
+	print("\nfinal weapon      fighters     win rate")
+	for index, data in enumerate(weapons):
+		held = equip == index
+		print(f"  {data['name']:<14} {held.sum():>10,}     {percent(won[held].sum(), held.sum())}")
+
+	print("\nturn order        win rate")
+	for slot in range(players):
+		print(f"  slot {slot+1:<10}   {percent(won[:, slot].sum(), matches)}")
+
+	edge = np.minimum(np.minimum(spawn_x, size-1-spawn_x), np.minimum(spawn_y, size-1-spawn_y))
+	print("\nspawn ring        fighters     win rate")
+	for ring in range(size // 2):
+		spawned = edge == ring
+		print(f"  {ring} from edge     {spawned.sum():>10,}     {percent(won[spawned].sum(), spawned.sum())}")
+
+def parse_overrides(overrides):
+	weapons = [dict(i) for i in engine.weapons_data]
+	trap_damage = 2
+
+	for i in overrides:
+		key, value = i.split("=")
+		if key == "trap.damage":
+			trap_damage = int(value)
+			continue
+
+		name, field = key.split(".")
+		for data in weapons:
+			if data["name"] == name:
+				data[field] = int(value)
+				break
+		else:
+			raise ValueError(f"no weapon called {name}")
+
+	return weapons, trap_damage
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Simulate arena matches in bulk for weapon balance")
+	parser.add_argument("--matches", type=int, default=100000)
+	parser.add_argument("--players", type=int, default=4)
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--chunk", type=int, default=20000, help="matches held in memory at once")
+	parser.add_argument("--max-actions", type=int, default=1000)
+	parser.add_argument("--policy", choices=sorted(policies), default="greedy")
+	parser.add_argument("--set", action="append", default=[], metavar="WEAPON.FIELD=VALUE",
+		help="override weapons_data for this run, e.g. spear.range=3 or trap.damage=3")
+	parser.add_argument("--verify", type=int, metavar="MATCHES", help="check the simulator against the engine instead")
+	args = parser.parse_args()
+
+	if not available():
+		parser.error("the batch simulator needs numpy installed")
+
+	if args.verify:
+		checked = verify(args.verify, args.players, args.seed, policies[args.policy])
+		print(f"verified:         {checked:,} actions across {args.verify} matches")
+	else:
+		weapons, trap_damage = parse_overrides(args.set)
+
+		batches = []
+		start = time.perf_counter()
+		for offset in range(0, args.matches, args.chunk):
+			count = min(args.chunk, args.matches - offset)
+			batch = Batch(count, args.players, args.seed + offset, weapons, trap_damage)
+			batches.append(batch.run(policies[args.policy], args.max_actions))
+		elapsed = time.perf_counter() - start
+
+		report(batches, elapsed)
\ No newline at end of file
@@ -1,22 +1,75 @@
-import requests
+import cache
+import metrics
+
+import asyncio
 import base64
+from os import getenv
+
+import aiohttp
 from bs4 import BeautifulSoup
 
 
 base_url = "https://otfbm.io/"
-token_url = "https://token.otfbm.io/meta/"
+token_url = getenv("OTFBM_TOKEN_URL", "https://token.otfbm.io/meta/")
+
+timeout = aiohttp.ClientTimeout(total=5, connect=2)
+session = None
+
+shortcodes = cache.ShortcodeCache(getenv("SHORTCODE_CACHE", "shortcodes.db"))
 
 
 def get_url():
 	return base_url
 
-def get_shortcode(url):
+def get_session():
+	global session
+
+	if session is None or session.closed:
+		connector = aiohttp.TCPConnector(limit=20, ttl_dns_cache=300)
+		session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+	return session
+
+async def close_session():
+	global session
+
+	if session is not None and not session.closed:
+		await session.close()
+	session = None
+
+	shortcodes.close()
+
+def encode_avatar(url):
 	url_bytes = url.encode("ascii")
 	base64_bytes = base64.b64encode(url_bytes)
-	base64_string = base64_bytes.decode("ascii")
-	
-	page = requests.get(token_url + base64_string)
-	
-	soup = BeautifulSoup(page.content, "html.parser")
-	
-	return soup.find("body").text.strip()
\ No newline at end of file
+	return base64_bytes.decode("ascii")
+
+def get_cached_shortcode(url):
+	return shortcodes.peek(url)
+
+@metrics.timed("arena_shortcode_seconds")
+async def get_shortcode(url):
+	shortcode = await shortcodes.get(url)
+	if shortcode is not None:
+		return shortcode
+
+	metrics.count("arena_http_requests_total", host="token.otfbm.io")
+	try:
+		async with get_session().get(token_url + encode_avatar(url)) as page:
+			page.raise_for_status()
+			content = await page.read()
+	except (aiohttp.ClientError, asyncio.TimeoutError):
+		return None
+
+	soup = BeautifulSoup(content, "html.parser")
+	body = soup.find("body")
+
+	if body is None:
+		return None
+
+	shortcode = body.text.strip()
+	if not shortcode:
+		return None
+
+	await shortcodes.set(url, shortcode)
+	return shortcode
\ No newline at end of file
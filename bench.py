@@ -0,0 +1,210 @@
+import ai
+import engine
+import generation
+import renderer
+import snapshot
+
+import argparse
+import random
+import time
+import tracemalloc
+
+directions = ["up", "down", "left", "right"]
+
+def random_action(match, rng):
+	fighter = match.get_current_turn()
+	roll = rng.random()
+
+	if roll < 0.45:
+		x = rng.randint(-4, 4)
+		y = rng.randint(-(4-abs(x)), 4-abs(x))
+		return match.move, (fighter.player, x, y)
+	if roll < 0.8:
+		return match.attack, (fighter.player, rng.choice(directions))
+	if roll < 0.9:
+		target = rng.choice(match.fighters)
+		return match.throw, (fighter.player, target.player)
+	if roll < 0.95:
+		return match.shove, (fighter.player, rng.choice(directions))
+	return match.disarm, (fighter.player, rng.choice(directions))
+
+def play_match(seed, players=4, max_actions=1000, latencies=None, size=10, layout="classic", generation_times=None):
+	rng = random.Random(seed)
+	match = engine.Match(seed=seed, width=size, height=size, layout=layout)
+
+	spawned = 0.0
+	for i in range(players):
+		match.add_fighter(i+1, f"p{i+1}")
+		spawned += match.generation_time
+	match.start_match()
+
+	if generation_times is not None:
+		generation_times.append(spawned + match.generation_time)
+
+	actions = 0
+	rejected = 0
+
+	while match.get_winner() is None and actions < max_actions:
+		action, args = random_action(match, rng)
+
+		start = time.perf_counter_ns()
+		try:
+			action(*args)
+		except engine.ArenaError:
+			rejected += 1
+		match.remove_dead()
+		end = time.perf_counter_ns()
+
+		if latencies is not None:
+			latencies.append(end - start)
+		actions += 1
+
+	return actions, rejected
+
+def percentile(values, fraction):
+	return values[min(len(values)-1, int(len(values) * fraction))]
+
+def run(matches, players, seed, size=10, layout="classic"):
+	latencies = []
+	generation_times = []
+	actions = 0
+	rejected = 0
+
+	start = time.perf_counter()
+	for i in range(matches):
+		played, failed = play_match(seed+i, players, latencies=latencies, size=size, layout=layout, generation_times=generation_times)
+		actions += played
+		rejected += failed
+	elapsed = time.perf_counter() - start
+
+	latencies.sort()
+	generation_times.sort()
+	print(f"matches:          {matches} ({players} players, {size}x{size}, {layout} layout)")
+	print(f"actions:          {actions} ({rejected} rejected)")
+	print(f"actions/sec:      {actions/elapsed:,.0f}")
+	print(f"matches/sec:      {matches/elapsed:,.1f}")
+	for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0)):
+		print(f"latency {name}:      {percentile(latencies, fraction)/1000:.1f}us")
+	for name, fraction in (("p50", 0.5), ("p99", 0.99)):
+		print(f"generation {name}:   {percentile(generation_times, fraction)*1e6:.1f}us")
+
+def run_allocations(matches, players, seed, size=10):
+	tracemalloc.start()
+	before = tracemalloc.take_snapshot()
+
+	for i in range(matches):
+		play_match(seed+i, players, size=size)
+
+	after = tracemalloc.take_snapshot()
+	current, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+
+	ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+	stats = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "lineno")
+	print(f"allocations:      {sum(i.count_diff for i in stats if i.count_diff > 0)} blocks retained")
+	print(f"peak memory:      {peak/1024:.1f}KiB over {matches} matches")
+	for i in stats[:5]:
+		print(f"  {i}")
+
+def run_render(matches, players, seed, size=10):
+	local_renderer = renderer.Renderer()
+	frames = []
+	cached = []
+
+	for i in range(matches):
+		rng = random.Random(seed+i)
+		match = engine.Match(seed=seed+i, width=size, height=size)
+		for j in range(players):
+			match.add_fighter(j+1, f"p{j+1}")
+		match.start_match()
+		view = match.get_view()
+		width, height = view[2:] if view is not None else (match.map.width, match.map.height)
+		canvas = renderer.Canvas(local_renderer, width, height)
+
+		actions = 0
+		while match.get_winner() is None and actions < 200:
+			action, args = random_action(match, rng)
+			try:
+				action(*args)
+			except engine.ArenaError:
+				pass
+			match.remove_dead()
+			actions += 1
+
+			if not match.fighters:
+				break
+			view = match.get_view()
+			hit = renderer.frame_key(match.map, view) in local_renderer.frames
+			start = time.perf_counter_ns()
+			local_renderer.render(match.map, canvas, view)
+			(cached if hit else frames).append(time.perf_counter_ns() - start)
+
+	frames.sort()
+	cached.sort()
+	print(f"frames:           {len(frames)} rendered, {len(cached)} from cache")
+	for name, fraction in (("p50", 0.5), ("p99", 0.99)):
+		print(f"render {name}:       {percentile(frames, fraction)/1000:.1f}us")
+	if cached:
+		print(f"cached p50:       {percentile(cached, 0.5)/1000:.1f}us")
+
+def run_ai(matches, players, seed, budget, size=10):
+	nodes = 0
+	searches = 0
+	overruns = []
+
+	start = time.perf_counter()
+	for i in range(matches):
+		rng = random.Random(seed+i)
+		match = engine.Match(seed=seed+i, width=size, height=size)
+		for j in range(players):
+			match.add_fighter(j+1, f"p{j+1}")
+		match.start_match()
+
+		# fighter 1 searches every one of its turns, the rest play randomly
+		actions = 0
+		while match.get_winner() is None and actions < 300:
+			fighter = match.get_current_turn()
+			if fighter.player == 1:
+				began = time.perf_counter()
+				op, args, searched = ai.search(snapshot.dump(match, 0, 0, with_events=False), 1, budget)
+				overruns.append(time.perf_counter() - began - budget)
+				nodes += searched
+				searches += 1
+				action, args = (match.skip_turn, ()) if op == "skip" else (getattr(match, op), args)
+			else:
+				action, args = random_action(match, rng)
+
+			try:
+				action(*args)
+			except engine.ArenaError:
+				pass
+			match.remove_dead()
+			actions += 1
+	elapsed = time.perf_counter() - start
+
+	overruns.sort()
+	print(f"searches:         {searches} ({budget*1000:.0f}ms budget)")
+	print(f"nodes/search:     {nodes/searches:,.0f}")
+	print(f"nodes/sec:        {nodes/elapsed:,.0f}")
+	print(f"overrun p99:      {max(0, percentile(overruns, 0.99))*1000:.2f}ms")
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Benchmark the headless arena engine")
+	parser.add_argument("--matches", type=int, default=2000)
+	parser.add_argument("--players", type=int, default=4)
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--size", type=int, default=10, help="width and height of the board")
+	parser.add_argument("--layout", default="classic", choices=list(generation.layouts))
+	parser.add_argument("--render", action="store_true", help="benchmark the local battlemap renderer instead")
+	parser.add_argument("--ai", type=float, metavar="BUDGET", help="benchmark the AI search with this many seconds per move instead")
+	args = parser.parse_args()
+
+	if args.render:
+		if not renderer.available():
+			parser.error("the local renderer needs Pillow installed")
+		run_render(min(args.matches, 100), args.players, args.seed, args.size)
+	elif args.ai:
+		run_ai(min(args.matches, 20), args.players, args.seed, args.ai, args.size)
+	else:
+		run(args.matches, args.players, args.seed, args.size, args.layout)
+		run_allocations(min(args.matches, 200), args.players, args.seed, args.size)
\ No newline at end of file
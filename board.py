@@ -0,0 +1,201 @@
+from array import array
+from collections import OrderedDict
+
+EMPTY = 0
+FIGHTER = 1
+WEAPON = 2
+TRAP = 3
+
+bucket_size = 8
+
+
+class FreeCells:
+	"""
+	The unoccupied cells of a board, packed at the front of an array so one
+	can be picked at random, taken or given back in constant time.
+	"""
+	__slots__ = ("cells", "positions")
+
+	def __init__(self, count):
+		self.cells = array("i", range(count))
+		# where each cell sits in cells, or -1 while it is occupied
+		self.positions = array("i", range(count))
+
+	def __len__(self):
+		return len(self.cells)
+
+	def __contains__(self, index):
+		return self.positions[index] >= 0
+
+	def __getitem__(self, position):
+		return self.cells[position]
+
+	def add(self, index):
+		if self.positions[index] < 0:
+			self.positions[index] = len(self.cells)
+			self.cells.append(index)
+
+	def remove(self, index):
+		position = self.positions[index]
+		if position < 0:
+			return
+
+		# the last free cell fills the gap
+		last = self.cells.pop()
+		if last != index:
+			self.cells[position] = last
+			self.positions[last] = position
+		self.positions[index] = -1
+
+	def choice(self, rng):
+		return self.cells[rng.randrange(len(self.cells))]
+
+
+class Board:
+	__slots__ = ("width", "height", "cells", "tags", "buckets", "free", "entities", "next_id",
+		"segments", "hash", "cache_size", "rendered", "threats")
+
+	def __init__(self, width=10, height=10, cache_size=16):
+		self.width = width
+		self.height = height
+
+		# entity id and type tag of every occupied cell, keyed by column-major
+		# index, so memory follows the entities rather than the board area.
+		# the buckets group occupied cells into coarse squares for area queries
+		self.cells = {}
+		self.tags = {}
+		self.buckets = {}
+		self.free = FreeCells(width * height)
+		self.entities = {}
+		self.next_id = 1
+
+		# token segment of every occupied cell, and an xor of their hashes
+		# that changes with every placement so renders can be cached
+		self.segments = {}
+		self.hash = 0
+
+		self.cache_size = cache_size
+		self.rendered = OrderedDict()
+
+		# set by the match that plays on this board
+		self.threats = None
+
+	def index(self, x, y):
+		return (x-1) * self.height + (y-1)
+
+	def position(self, index):
+		x, y = divmod(index, self.height)
+		return x+1, y+1
+
+	def get(self, x, y):
+		entity = self.cells.get((x-1) * self.height + (y-1))
+		return self.entities[entity] if entity else 0
+
+	def tag(self, x, y):
+		return self.tags.get((x-1) * self.height + (y-1), EMPTY)
+
+	def is_empty(self, x, y):
+		return (x-1) * self.height + (y-1) not in self.tags
+
+	def bucket(self, index):
+		x, y = divmod(index, self.height)
+		return (x // bucket_size, y // bucket_size)
+
+	def within(self, left, top, width, height):
+		"""Indices of the occupied cells in the width x height area after column left and row top."""
+		for bx in range(left // bucket_size, (left + width - 1) // bucket_size + 1):
+			for by in range(top // bucket_size, (top + height - 1) // bucket_size + 1):
+				for index in self.buckets.get((bx, by), ()):
+					x, y = divmod(index, self.height)
+					if left <= x < left + width and top <= y < top + height:
+						yield index
+
+	def view(self, x, y, size=10):
+		"""The size x size window around x, y that is shown of a larger board, or None when it all fits."""
+		if self.width <= size and self.height <= size:
+			return None
+
+		width = min(size, self.width)
+		height = min(size, self.height)
+		left = max(0, min(x - 1 - width // 2, self.width - width))
+		top = max(0, min(y - 1 - height // 2, self.height - height))
+		return (left, top, width, height)
+
+	def set_segment(self, index, segment):
+		previous = self.segments.pop(index, None)
+		if previous is not None:
+			self.hash ^= hash(previous)
+
+		if segment is not None:
+			self.segments[index] = segment
+			self.hash ^= hash(segment)
+
+	def place(self, obj, x, y):
+		if not obj.id:
+			obj.id = self.next_id
+			self.next_id += 1
+
+		index = self.index(x, y)
+		previous = self.cells.get(index)
+		if previous and previous != obj.id:
+			replaced = self.entities.pop(previous)
+			if self.threats is not None and replaced.tag == FIGHTER:
+				self.threats.cleared(replaced, index)
+		elif not previous:
+			key = self.bucket(index)
+			bucket = self.buckets.get(key)
+			if bucket is None:
+				bucket = self.buckets[key] = set()
+			bucket.add(index)
+			self.free.remove(index)
+
+		self.cells[index] = obj.id
+		self.tags[index] = obj.tag
+		self.entities[obj.id] = obj
+		self.set_segment(index, obj.put_in_map())
+
+		if self.threats is not None and obj.tag == FIGHTER:
+			self.threats.placed(obj, index)
+
+	def clear(self, x, y):
+		index = self.index(x, y)
+		entity = self.cells.pop(index, 0)
+		tag = self.tags.pop(index, EMPTY)
+		if entity:
+			entity = self.entities.pop(entity)
+			self.buckets[self.bucket(index)].discard(index)
+			self.free.add(index)
+
+		self.set_segment(index, None)
+
+		if self.threats is not None and tag == FIGHTER:
+			self.threats.cleared(entity, index)
+
+	def refresh(self, obj):
+		x, y = obj.get_position()
+		index = self.index(x, y)
+		if self.cells.get(index) == obj.id:
+			self.set_segment(index, obj.put_in_map())
+
+			if self.threats is not None and obj.tag == FIGHTER:
+				self.threats.placed(obj, index)
+
+	def render(self, view=None):
+		key = self.hash if view is None else (self.hash, view)
+		tokens = self.rendered.get(key)
+
+		if tokens is None:
+			if view is None:
+				tokens = "".join(self.segments.values())
+			else:
+				# labels are relative to the corner of the view
+				left, top, width, height = view
+				tokens = "".join(self.entities[self.cells[i]].put_in_map(left, top) for i in self.within(left, top, width, height))
+			self.rendered[key] = tokens
+
+			while len(self.rendered) > self.cache_size:
+				self.rendered.popitem(last=False)
+		else:
+			self.rendered.move_to_end(key)
+
+		return tokens
\ No newline at end of file
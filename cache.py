@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+log = logging.getLogger(__name__)
+
+
+class ShortcodeCache:
+	def __init__(self, path, ttl=7*24*60*60, memory_size=1024, disk_size=100000):
+		self.ttl = ttl
+		self.memory_size = memory_size
+		self.disk_size = disk_size
+
+		self.memory = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+		self.writes = 0
+
+		# the disk tier is only touched from threads, one at a time, and the
+		# file is not opened until the first of them needs it
+		self.lock = threading.Lock()
+		self.path = path
+		self.db = None
+		self.errors = 0
+
+	def connect(self):
+		if self.db is None and self.path:
+			# every shard process shares the file
+			db = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+			db.execute("PRAGMA journal_mode=WAL")
+			db.execute("""CREATE TABLE IF NOT EXISTS shortcodes (
+				url TEXT PRIMARY KEY,
+				shortcode TEXT NOT NULL,
+				expires REAL NOT NULL)""")
+			db.execute("CREATE INDEX IF NOT EXISTS shortcodes_expires ON shortcodes (expires)")
+			db.commit()
+			self.db = db
+		return self.db
+
+	def remember(self, url, shortcode, expires):
+		self.memory[url] = (shortcode, expires)
+		self.memory.move_to_end(url)
+
+		while len(self.memory) > self.memory_size:
+			self.memory.popitem(last=False)
+
+	def peek(self, url):
+		"""The shortcode for url if the memory tier has it, without waiting on the disk."""
+		entry = self.memory.get(url)
+		if entry is None:
+			return None
+		if entry[1] <= time.time():
+			del self.memory[url]
+			return None
+
+		self.memory.move_to_end(url)
+		self.hits += 1
+		return entry[0]
+
+	async def get(self, url):
+		shortcode = self.peek(url)
+		if shortcode is not None:
+			return shortcode
+
+		if self.path:
+			row = await asyncio.to_thread(self.read, url)
+			if row is not None:
+				self.remember(url, row[0], row[1])
+				self.hits += 1
+				return row[0]
+
+		self.misses += 1
+		return None
+
+	def read(self, url):
+		# the disk tier failing only makes it a miss
+		with self.lock:
+			try:
+				db = self.connect()
+				if db is None:
+					return None
+				return db.execute("SELECT shortcode, expires FROM shortcodes WHERE url = ? AND expires > ?", (url, time.time())).fetchone()
+			except sqlite3.Error:
+				self.errors += 1
+				log.exception("could not read the shortcode cache")
+				return None
+
+	async def set(self, url, shortcode):
+		expires = time.time() + self.ttl
+		self.remember(url, shortcode, expires)
+
+		if self.path:
+			await asyncio.to_thread(self.write, url, shortcode, expires)
+
+	def write(self, url, shortcode, expires):
+		# and the memory tier still has what could not be written
+		with self.lock:
+			try:
+				db = self.connect()
+				if db is None:
+					return
+				db.execute("INSERT OR REPLACE INTO shortcodes VALUES (?, ?, ?)", (url, shortcode, expires))
+				db.commit()
+
+				self.writes += 1
+				if self.writes % 100 == 0:
+					self.prune()
+			except sqlite3.Error:
+				self.errors += 1
+				log.exception("could not write the shortcode cache")
+
+	def prune(self):
+		if self.db is None:
+			return
+
+		self.db.execute("DELETE FROM shortcodes WHERE expires <= ?", (time.time(),))
+		self.db.execute("""DELETE FROM shortcodes WHERE url IN (
+			SELECT url FROM shortcodes ORDER BY expires DESC LIMIT -1 OFFSET ?)""", (self.disk_size,))
+		self.db.commit()
+
+	def stats(self):
+		return {"hits": self.hits, "misses": self.misses, "writes": self.writes, "errors": self.errors, "memory": len(self.memory)}
+
+	def close(self):
+		with self.lock:
+			self.path = None
+			if self.db is not None:
+				self.db.close()
+				self.db = None
\ No newline at end of file
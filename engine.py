@@ -0,0 +1,385 @@
+import helpers
+import board
+import events
+import generation
+import threats
+
+import random
+import time
+
+weapons_data = [
+	{"name": "fist", "damage": 1, "range": 1},
+	{"name": "dagger", "damage": 2, "range": 1},
+	{"name": "rapier", "damage": 3, "range": 1},
+	{"name": "axe", "damage": 3, "range": 1},
+	{"name": "spear", "damage": 2, "range": 2},
+]
+
+class ArenaError(Exception):
+	def __init__(self, code, *params):
+		Exception.__init__(self, code, *params)
+		self.code = code
+		self.params = params
+
+def get_attack_offset(atk_dir: str):
+	atk_dir = atk_dir.lower()
+	match atk_dir:
+		case "up": return [0, -1]
+		case "down": return [0, 1]
+		case "left": return [-1, 0]
+		case "right": return [1, 0]
+		case _: return None
+
+def get_attack_target(weapon_range, position, offset, match_map):
+	for i in range(1, weapon_range+1, 1):
+		rx = helpers.clamp(position[0]+(offset[0]*i), 1, match_map.width)
+		ry = helpers.clamp(position[1]+(offset[1]*i), 1, match_map.height)
+		if match_map.tag(rx, ry) == board.FIGHTER:
+			return match_map.get(rx, ry)
+
+def get_ranged_distance(origin, target):
+	return abs(target[0]-origin[0]) + abs(target[1]-origin[1])
+
+class Object:
+	__slots__ = ("id", "x", "y")
+	tag = board.EMPTY
+
+	def __init__(self, x, y, map):
+		self.id = 0
+		self.x = x
+		self.y = y
+		map.place(self, x, y)
+	
+	def get_position(self):
+		return [self.x, self.y]
+
+	# left and top shift the label into a view of the board
+	def label(self, left=0, top=0):
+		return f"{helpers.num_to_alpha(self.x - left)}{self.y - top}"
+		
+	def put_in_map(self, left=0, top=0):
+		pass # must override
+
+class Fighter(Object):
+	__slots__ = ("player", "name", "move", "actions", "hp", "equip", "shortcode")
+	tag = board.FIGHTER
+
+	def __init__(self, x, y, map, player, name, shortcode):
+		self.player = player
+		self.name = name
+		
+		self.move = 4
+		self.actions = 2
+		self.hp = 12
+	
+		self.equip = weapons_data[0]
+
+		self.shortcode = shortcode
+
+		Object.__init__(self, x, y, map)
+
+	def confirm_move(self, x, y, map):
+		prev_x, prev_y = self.get_position()
+	
+		map.clear(prev_x, prev_y)
+		self.x = helpers.clamp(prev_x+x, 1, map.width)
+		self.y = helpers.clamp(prev_y+y, 1, map.height)
+		map.place(self, self.x, self.y)
+
+	def map_move(self, x, y, map):
+		prev_x, prev_y = self.get_position()
+		cx = helpers.clamp(prev_x+x, 1, map.width)
+		cy = helpers.clamp(prev_y+y, 1, map.height)
+
+		destination_object = map.get(cx, cy)
+		match map.tag(cx, cy):
+			case board.EMPTY:
+				self.confirm_move(x, y, map)
+
+			case board.FIGHTER:
+				pass
+				
+			case board.WEAPON:
+				self.equip = destination_object.data
+				self.confirm_move(x, y, map)
+				
+			case board.TRAP:
+				self.hp -= destination_object.damage
+				self.confirm_move(x, y, map)
+		
+		return destination_object
+	
+	def reset_actions(self):
+		self.move = 4
+		self.actions = 2
+	
+	def put_in_map(self, left=0, top=0):
+		if self.shortcode is None:
+			return f"/{self.label(left, top)}-{self.name}"
+		else:
+			return f"/{self.label(left, top)}~{self.shortcode}"
+
+class Weapon(Object):
+	__slots__ = ("data",)
+	tag = board.WEAPON
+
+	def __init__(self, x, y, data, map):
+		self.data = data
+		Object.__init__(self, x, y, map)
+	
+	def put_in_map(self, left=0, top=0):
+		return f"/{self.label(left, top)}-{self.data['name']}"
+
+class Trap(Object):
+	__slots__ = ("name", "damage")
+	tag = board.TRAP
+
+	def __init__(self, x, y, name, damage, map):
+		self.name = name
+		self.damage = damage
+		Object.__init__(self, x, y, map)
+	
+	def put_in_map(self, left=0, top=0):
+		return f"/{self.label(left, top)}-{self.name}"
+
+class Match:
+	def __init__(self, rng=None, seed=None, width=10, height=10, layout="classic"):
+		# only a seeded match can be rebuilt from its event log
+		if rng is None:
+			seed = seed if seed is not None else random.getrandbits(63)
+			rng = random.Random(seed)
+		self.seed = seed
+		self.rng = rng
+		self.events = events.EventLog()
+
+		self.invoker = None
+
+		self.started = False
+		self.fighters = []
+		self.players = {}
+		self.weapons = []
+		self.traps = []
+		self.map = None
+		self.resize(width, height)
+
+		self.layout = None
+		self.set_layout(layout)
+		self.generation_time = 0.0
+
+		self.current_turn = 0
+		self.current_round = 0
+
+	def resize(self, width, height):
+		# only boards off the default size are logged, so older logs and
+		# ordinary matches replay the same as ever
+		if (width, height) != (10, 10):
+			self.events.board(width, height)
+
+		self.map = board.Board(width, height)
+		self.map.threats = threats.ThreatMap(self.map)
+
+	def set_layout(self, name):
+		# like the board size, the classic layout is what logs without one
+		# were made with
+		if name != "classic":
+			self.events.layout(name)
+
+		self.layout = generation.layouts[name]
+
+	def get_area(self):
+		return self.map.width * self.map.height
+
+	def max_fighters(self):
+		# four on the standard board, and one more for every 25 cells past it
+		return min(255, max(4, self.get_area() // 25))
+
+	def get_view(self):
+		if not self.fighters:
+			return None
+		return self.map.view(*self.get_current_turn().get_position())
+
+	def random_cell(self):
+		return self.rng.randint(1, self.map.width), self.rng.randint(1, self.map.height)
+	
+	def is_empty(self, x, y):
+		return self.map.is_empty(x, y)
+
+	def start_match(self):
+		self.events.start()
+		self.rng.shuffle(self.fighters)
+
+		start = time.perf_counter()
+		self.layout.arrange(self)
+		self.layout.populate(self)
+		self.generation_time = time.perf_counter() - start
+
+		self.current_turn += 1
+		self.current_round += 1
+		self.started = True
+	
+	def find_user_in_match(self, player):
+		return self.players.get(player)
+
+	def add_fighter(self, player, name, shortcode=None):
+		self.events.add(player, name)
+
+		start = time.perf_counter()
+		x, y = self.layout.spawn(self)
+		self.generation_time = time.perf_counter() - start
+
+		new = Fighter(x, y, self.map, player, name, shortcode)
+		self.fighters.append(new)
+		self.players[player] = new
+
+		if self.invoker is None:
+			self.invoker = player
+
+		return new
+	
+	def remove_fighter(self, player):
+		obj = self.players.pop(player)
+		x, y = obj.get_position()
+		self.map.clear(x, y)
+
+		index = self.fighters.index(obj)
+		self.fighters.remove(obj)
+
+		# keep the turn pointer on the same fighter, or on whoever followed
+		# the one who left on their own turn
+		if index < self.current_turn:
+			self.current_turn -= 1
+		elif self.current_turn >= len(self.fighters):
+			# the last in the order ends the round, as end_turn would
+			self.current_turn = 0
+			if self.started:
+				self.current_round += 1
+				for i in self.fighters:
+					i.reset_actions()
+
+		if self.invoker == player:
+			self.invoker = self.fighters[0].player if self.fighters else None
+	
+	def get_current_turn(self):
+		return self.fighters[self.current_turn]
+	
+	def end_turn(self):
+		if (self.current_turn + 1) >= len(self.fighters):
+			self.current_round += 1
+			self.current_turn = 0
+
+			for i in self.fighters:
+				i.reset_actions()
+		else:
+			self.current_turn += 1
+
+	def skip_turn(self):
+		self.events.skip()
+		self.end_turn()
+
+	def retire(self, player):
+		self.events.retire(player)
+		self.remove_fighter(player)
+
+	def check_actions_left(self):
+		if self.get_current_turn().actions > 1:
+			self.get_current_turn().actions -= 1
+
+		else:
+			self.end_turn()
+	
+	def remove_dead(self):
+		dead = [i for i in self.fighters if i.hp <= 0]
+		if dead:
+			self.events.dead()
+
+		for i in dead:
+			self.remove_fighter(i.player)
+
+		return dead
+
+	def get_winner(self):
+		if self.started and len(self.fighters) == 1:
+			return self.fighters[0]
+
+	def check_turn(self, player):
+		if not self.started:
+			raise ArenaError(9)
+		if self.get_current_turn().player != player:
+			raise ArenaError(10)
+
+		return self.get_current_turn()
+
+	def check_equip(self, fighter, weapon, command):
+		if fighter.equip['name'] != weapon:
+			raise ArenaError(17, weapon, command)
+
+	def find_target(self, fighter, atk_dir):
+		offset = get_attack_offset(atk_dir)
+		if offset is None:
+			raise ArenaError(14)
+
+		target = self.map.threats.target(fighter, threats.directions.index(tuple(offset)))
+		if target is None:
+			raise ArenaError(15)
+
+		return target, offset
+
+	def damage_target(self, damage, target):
+		target.hp -= damage
+		self.check_actions_left()
+
+	def move(self, player, x, y):
+		self.events.move(player, x, y)
+		invoker = self.check_turn(player)
+		if (abs(x)+abs(y)) > 4:
+			raise ArenaError(11)
+
+		move = invoker.map_move(x, y, self.map)
+		if isinstance(move, Fighter) and move != invoker:
+			raise ArenaError(12)
+
+		self.check_actions_left()
+		return move
+
+	def attack(self, player, atk_dir):
+		self.events.direction(events.ATTACK, player, atk_dir)
+		attacker = self.check_turn(player)
+		target, offset = self.find_target(attacker, atk_dir)
+
+		self.damage_target(attacker.equip['damage'], target)
+		return target
+
+	def throw(self, player, target_player):
+		self.events.throw(player, target_player)
+		attacker = self.check_turn(player)
+		self.check_equip(attacker, "dagger", "throw")
+
+		target = self.find_user_in_match(target_player)
+		if target is None:
+			raise ArenaError(18, target_player)
+
+		if not self.map.threats.in_throw_range(attacker, target):
+			raise ArenaError(19)
+
+		self.damage_target(attacker.equip['damage'], target)
+		return target
+
+	def shove(self, player, atk_dir):
+		self.events.direction(events.SHOVE, player, atk_dir)
+		attacker = self.check_turn(player)
+		self.check_equip(attacker, "axe", "shove")
+		target, offset = self.find_target(attacker, atk_dir)
+
+		target.map_move(offset[0]*2, offset[1]*2, self.map)
+		self.damage_target(1, target)
+		return target
+
+	def disarm(self, player, atk_dir):
+		self.events.direction(events.DISARM, player, atk_dir)
+		attacker = self.check_turn(player)
+		self.check_equip(attacker, "rapier", "disarm")
+		target, offset = self.find_target(attacker, atk_dir)
+
+		target.equip = weapons_data[0]
+		self.map.refresh(target)
+		return target
\ No newline at end of file
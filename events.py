@@ -0,0 +1,186 @@
+import engine
+import generation
+
+import struct
+
+ADD = 1
+START = 2
+MOVE = 3
+ATTACK = 4
+THROW = 5
+SHOVE = 6
+DISARM = 7
+SKIP = 8
+RETIRE = 9
+DEAD = 10
+BOARD = 11
+LAYOUT = 12
+
+directions = ["up", "down", "left", "right"]
+
+player = struct.Struct("<BQ")
+move = struct.Struct("<BQbb")
+direction = struct.Struct("<BQB")
+throw = struct.Struct("<BQQ")
+size = struct.Struct("<BHH")
+layout = struct.Struct("<BB")
+record = struct.Struct("<QI")
+
+
+def encode_direction(atk_dir):
+	atk_dir = atk_dir.lower()
+	return directions.index(atk_dir) if atk_dir in directions else 255
+
+def decode_direction(code):
+	return directions[code] if code < len(directions) else "?"
+
+
+class EventLog:
+	def __init__(self, data=b""):
+		self.data = bytearray(data)
+
+	def __len__(self):
+		return len(self.data)
+
+	def add(self, player_id, name):
+		encoded = (name or "").encode("utf-8")[:255]
+		self.data += player.pack(ADD, player_id) + bytes([len(encoded)]) + encoded
+
+	def start(self):
+		self.data.append(START)
+
+	def move(self, player_id, x, y):
+		# anything past a signed byte is rejected as too far either way
+		self.data += move.pack(MOVE, player_id, max(-128, min(127, x)), max(-128, min(127, y)))
+
+	def direction(self, op, player_id, atk_dir):
+		self.data += direction.pack(op, player_id, encode_direction(atk_dir))
+
+	def throw(self, player_id, target):
+		self.data += throw.pack(THROW, player_id, target or 0)
+
+	def skip(self):
+		self.data.append(SKIP)
+
+	def retire(self, player_id):
+		self.data += player.pack(RETIRE, player_id)
+
+	def dead(self):
+		self.data.append(DEAD)
+
+	def board(self, width, height):
+		self.data += size.pack(BOARD, width, height)
+
+	def layout(self, name):
+		self.data += layout.pack(LAYOUT, generation.layouts[name].code)
+
+	def __iter__(self):
+		data = self.data
+		offset = 0
+
+		while offset < len(data):
+			op = data[offset]
+
+			if op == ADD:
+				unused, player_id = player.unpack_from(data, offset)
+				length = data[offset + player.size]
+				start = offset + player.size + 1
+				yield op, (player_id, data[start:start+length].decode("utf-8"))
+				offset = start + length
+			elif op == MOVE:
+				unused, player_id, x, y = move.unpack_from(data, offset)
+				yield op, (player_id, x, y)
+				offset += move.size
+			elif op in (ATTACK, SHOVE, DISARM):
+				unused, player_id, code = direction.unpack_from(data, offset)
+				yield op, (player_id, decode_direction(code))
+				offset += direction.size
+			elif op == THROW:
+				unused, player_id, target = throw.unpack_from(data, offset)
+				yield op, (player_id, target or None)
+				offset += throw.size
+			elif op == RETIRE:
+				unused, player_id = player.unpack_from(data, offset)
+				yield op, (player_id,)
+				offset += player.size
+			elif op == BOARD:
+				unused, width, height = size.unpack_from(data, offset)
+				yield op, (width, height)
+				offset += size.size
+			elif op == LAYOUT:
+				unused, code = layout.unpack_from(data, offset)
+				yield op, (generation.codes[code].name,)
+				offset += layout.size
+			else:
+				yield op, ()
+				offset += 1
+
+
+def replay(seed, log, state=None):
+	if state is None:
+		state = engine.Match(seed=seed)
+
+	handlers = {
+		ADD: state.add_fighter,
+		START: state.start_match,
+		MOVE: state.move,
+		ATTACK: state.attack,
+		THROW: state.throw,
+		SHOVE: state.shove,
+		DISARM: state.disarm,
+		SKIP: state.skip_turn,
+		RETIRE: state.retire,
+		DEAD: state.remove_dead,
+		BOARD: state.resize,
+		LAYOUT: state.set_layout,
+	}
+
+	for op, args in log:
+		try:
+			handlers[op](*args)
+		except engine.ArenaError:
+			pass
+
+	return state
+
+
+class EventFile:
+	def __init__(self, path):
+		# unbuffered, so each batch is one append even with several shard
+		# processes sharing the file
+		self.file = open(path, "ab", buffering=0)
+		# finished matches wait here until the next checkpoint takes them
+		# to disk together
+		self.pending = []
+
+	def write(self, seed, log):
+		self.pending.append(record.pack(seed, len(log.data)) + log.data)
+
+	def take(self):
+		pending, self.pending = self.pending, []
+		return b"".join(pending)
+
+	def put_back(self, data):
+		self.pending.insert(0, data)
+
+	def append(self, data):
+		if data:
+			self.file.write(data)
+
+	def close(self):
+		self.append(self.take())
+		self.file.close()
+
+def read_file(path):
+	with open(path, "rb") as file:
+		data = file.read()
+
+	offset = 0
+	while offset + record.size <= len(data):
+		seed, length = record.unpack_from(data, offset)
+		offset += record.size
+		# a record cut off by a crash mid-append is left out
+		if offset + length > len(data):
+			break
+		yield seed, EventLog(data[offset:offset+length])
+		offset += length
\ No newline at end of file
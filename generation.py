@@ -0,0 +1,189 @@
+import engine
+
+import math
+
+# spawns that have to keep their distance give up on random picks after
+# this many tries and take the one of them farthest from everyone instead
+tries = 16
+
+
+class Layout:
+	"""
+	How a board gets filled: where fighters spawn as they join, and the
+	weapons and traps scattered once the match starts. Densities are per
+	100 cells, so the standard board gets four of each, and min_distance
+	keeps spawns that many squares apart where the board allows it.
+	"""
+	code = None
+
+	def __init__(self, name, weapons=4, traps=4, min_distance=0):
+		self.name = name
+		self.weapons = weapons
+		self.traps = traps
+		self.min_distance = min_distance
+
+	def count(self, match, density):
+		return max(1, match.get_area() * density // 100) if density else 0
+
+	def pick(self, match, away_from=(), distance=0):
+		free = match.map.free
+		if not free:
+			raise engine.ArenaError(7)
+
+		if not distance or not away_from:
+			return match.map.position(free.choice(match.rng))
+
+		best, farthest = None, -1
+		for i in range(tries):
+			cell = match.map.position(free.choice(match.rng))
+			nearest = min(engine.get_ranged_distance(cell, j) for j in away_from)
+			if nearest >= distance:
+				return cell
+			if nearest > farthest:
+				best, farthest = cell, nearest
+
+		return best
+
+	def nearest(self, match, x, y):
+		# rings of growing distance around x, y until one has a free cell
+		for distance in range(match.map.width + match.map.height):
+			for i in range(-distance, distance+1):
+				for j in {distance - abs(i), abs(i) - distance}:
+					cx, cy = x+i, y+j
+					if 1 <= cx <= match.map.width and 1 <= cy <= match.map.height and match.is_empty(cx, cy):
+						return cx, cy
+		raise engine.ArenaError(7)
+
+	def spawn(self, match):
+		return self.pick(match, [i.get_position() for i in match.fighters], self.min_distance)
+
+	def arrange(self, match):
+		pass
+
+	def weapon(self, match, x, y, data):
+		match.weapons.append(engine.Weapon(x, y, data, match.map))
+
+	def trap(self, match, x, y):
+		match.traps.append(engine.Trap(x, y, "spikes", 2, match.map))
+
+	def populate(self, match):
+		for i in range(self.count(match, self.weapons)):
+			if not match.map.free:
+				return
+			x, y = self.pick(match)
+			self.weapon(match, x, y, engine.weapons_data[match.rng.randint(1, len(engine.weapons_data)-1)])
+
+		for i in range(self.count(match, self.traps)):
+			if not match.map.free:
+				return
+			self.trap(match, *self.pick(match))
+
+
+class Classic(Layout):
+	"""
+	Draws coordinates until one lands on an empty cell, the way boards were
+	filled before layouts. Kept so event logs from then replay the same.
+	"""
+	def draw(self, match):
+		for i in range(100):
+			x, y = match.random_cell()
+			if match.is_empty(x, y):
+				return x, y
+		return self.pick(match)
+
+	def spawn(self, match):
+		return self.draw(match)
+
+	def populate(self, match):
+		generate = self.count(match, self.weapons)
+		attempts = 0
+
+		# the weapon was rolled with every draw, hit or miss
+		while generate > 0 and match.map.free:
+			x, y = match.random_cell()
+			data = engine.weapons_data[match.rng.randint(1, len(engine.weapons_data)-1)]
+
+			attempts += 1
+			if attempts > 100:
+				x, y = self.pick(match)
+			if match.is_empty(x, y):
+				self.weapon(match, x, y, data)
+				generate -= 1
+				attempts = 0
+
+		generate = self.count(match, self.traps)
+		while generate > 0 and match.map.free:
+			x, y = self.draw(match)
+			self.trap(match, x, y)
+			generate -= 1
+
+
+class Symmetric(Layout):
+	"""
+	Spreads the fighters evenly around a circle once the match starts, and
+	mirrors every weapon and trap through the centre of the board.
+	"""
+	def count(self, match, density):
+		return (Layout.count(self, match, density) + 1) // 2
+
+	def arrange(self, match):
+		width, height = match.map.width, match.map.height
+		radius = (min(width, height) - 1) * 0.375
+		offset = match.rng.randrange(4) * math.pi / 2
+
+		for i in match.fighters:
+			match.map.clear(i.x, i.y)
+
+		count = len(match.fighters)
+		for index, fighter in enumerate(match.fighters):
+			# with an even count the second half mirrors the first exactly,
+			# whichever way the rounding went
+			if count % 2 == 0 and index >= count // 2:
+				opposite = match.fighters[index - count // 2]
+				x, y = width+1-opposite.x, height+1-opposite.y
+			else:
+				angle = offset + 2 * math.pi * index / count
+				x = min(width, max(1, round((width+1) / 2 + radius * math.cos(angle))))
+				y = min(height, max(1, round((height+1) / 2 + radius * math.sin(angle))))
+			if not match.is_empty(x, y):
+				x, y = self.nearest(match, x, y)
+
+			fighter.x, fighter.y = x, y
+			match.map.place(fighter, x, y)
+
+	def mirror(self, match, x, y):
+		mx, my = match.map.width+1-x, match.map.height+1-y
+		if (mx, my) != (x, y) and match.is_empty(mx, my):
+			return mx, my
+
+	def weapon(self, match, x, y, data):
+		Layout.weapon(self, match, x, y, data)
+		mirrored = self.mirror(match, x, y)
+		if mirrored is not None:
+			Layout.weapon(self, match, *mirrored, data)
+
+	def trap(self, match, x, y):
+		Layout.trap(self, match, x, y)
+		mirrored = self.mirror(match, x, y)
+		if mirrored is not None:
+			Layout.trap(self, match, *mirrored)
+
+
+# event logs store the code, so layouts are only ever added at the end
+layouts = {}
+codes = []
+
+def register(layout):
+	layout.code = len(codes)
+	layouts[layout.name] = layout
+	codes.append(layout)
+	return layout
+
+register(Classic("classic"))
+register(Layout("standard"))
+register(Layout("spread", min_distance=5))
+register(Symmetric("symmetric"))
+register(Layout("sparse", weapons=2, traps=1))
+register(Layout("dense", weapons=8, traps=8))
+
+default = "standard"
\ No newline at end of file
@@ -1,8 +1,47 @@
 def clamp(num, min, max):
 	return min if num < min else max if num > max else num
 	
+# columns past z carry on as aa, ab, ... like a spreadsheet
 def num_to_alpha(num):
-	return chr(num + 96)
+	letters = ""
+	while num > 0:
+		num, rest = divmod(num - 1, 26)
+		letters = chr(rest + 97) + letters
+	return letters
 
 def alpha_to_num(ch):
-	return ord(ch) - 96
\ No newline at end of file
+	num = 0
+	for i in ch:
+		num = num * 26 + ord(i) - 96
+	return num
+
+def mention_to_id(mention):
+	digits = mention.strip("<@!>")
+	return int(digits) if digits.isdigit() else None
+
+# discord ids carry a timestamp above bit 22, so smaller ids are free for
+# computer-controlled fighters
+def is_ai(player):
+	return player < 1 << 22
+
+def mention(player):
+	if is_ai(player):
+		return f"**AI {player}**"
+	return f"<@{player}>"
+
+# the most discord shows of an embed description
+description_length = 4096
+
+def numbered(lines, limit=description_length):
+	"""Number lines one per row, leaving off whatever does not fit in limit characters."""
+	rows = [f"{index+1}. {line}\n" for index, line in enumerate(lines)]
+	text = "".join(rows)
+	if len(text) <= limit:
+		return text
+
+	text = ""
+	for index, row in enumerate(rows):
+		more = f"...and {len(rows) - index} more\n"
+		if len(text) + len(row) + len(more) > limit:
+			return text + more
+		text += row
\ No newline at end of file
@@ -0,0 +1,58 @@
+import outbox
+
+import io
+from collections import deque
+
+import discord
+
+
+class LiveBoard:
+	def __init__(self, channel, history=5):
+		self.channel = channel
+		self.message = None
+		self.lines = deque(maxlen=history)
+		self.embed = None
+		self.image = None
+
+	def post(self, line=None, embed=None, image=None):
+		if line:
+			self.lines.append(line)
+		if embed is not None:
+			self.embed = embed
+		if image is not None:
+			self.image = image
+
+		# posts queued behind the same pending edit are merged into it
+		outbox.get(self.channel).call(self.flush, key=self)
+
+	async def flush(self):
+		content = "\n".join(self.lines)
+
+		if self.message is not None:
+			try:
+				if self.image is None:
+					await self.message.edit(content=content, embed=self.embed)
+				else:
+					await self.message.edit(content=content, embed=self.embed, attachments=[self.file()])
+				return
+			except discord.NotFound:
+				self.message = None
+
+		if self.image is None:
+			self.message = await self.channel.send(content, embed=self.embed)
+		else:
+			self.message = await self.channel.send(content, embed=self.embed, file=self.file())
+		try:
+			await self.message.pin()
+		except discord.HTTPException:
+			pass
+
+	def file(self):
+		return discord.File(io.BytesIO(self.image), "board.png")
+
+	async def unpin(self):
+		if self.message is not None:
+			await self.message.unpin()
+
+	def close(self):
+		outbox.get(self.channel).call(self.unpin)
\ No newline at end of file
@@ -0,0 +1,223 @@
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import resource
+import tempfile
+import time
+
+import discord
+from aiohttp import web
+from discord.ext import commands
+from discord.ext.commands.view import StringView
+
+directions = ["up", "down", "left", "right"]
+
+# real snowflakes, so they never look like ai fighters
+ids = itertools.count(1 << 40)
+
+
+class FakeREST:
+	"""Stands in for the Discord REST API, answering every call after a fixed latency."""
+	def __init__(self, latency):
+		self.latency = latency
+		self.calls = 0
+
+	async def call(self):
+		self.calls += 1
+		await asyncio.sleep(self.latency)
+
+class FakeMessage:
+	def __init__(self, rest, channel, author=None, content=""):
+		self.id = next(ids)
+		self.rest = rest
+		self.channel = channel
+		self.guild = channel.guild
+		self.author = author
+		self.content = content
+		self.attachments = []
+		self._state = None
+
+	async def edit(self, **kwargs):
+		await self.rest.call()
+		return self
+
+	async def pin(self):
+		await self.rest.call()
+
+	async def unpin(self):
+		await self.rest.call()
+
+class FakeChannel:
+	def __init__(self, rest, guild):
+		self.id = next(ids)
+		self.rest = rest
+		self.guild = guild
+		self.name = f"arena-{self.id}"
+
+	def __str__(self):
+		return self.name
+
+	async def send(self, content=None, **kwargs):
+		await self.rest.call()
+		return FakeMessage(self.rest, self)
+
+	def get_partial_message(self, message_id):
+		return FakeMessage(self.rest, self)
+
+class FakeGuild:
+	def __init__(self):
+		self.id = next(ids)
+
+class FakeAvatar:
+	def __init__(self, user_id):
+		self.url = f"https://cdn.discordapp.com/avatars/{user_id}/avatar.png"
+
+class FakeUser:
+	def __init__(self):
+		self.id = next(ids)
+		self.name = f"user{self.id}"
+		self.mention = f"<@{self.id}>"
+		self.avatar = FakeAvatar(self.id)
+		self.guild_permissions = discord.Permissions.none()
+
+	def __str__(self):
+		return self.name
+
+
+async def serve_otfbm(port, latency):
+	"""A local stand-in for token.otfbm.io that hands out a shortcode per avatar."""
+	async def handle(request):
+		await asyncio.sleep(latency)
+		return web.Response(text=f"<html><body>{request.match_info['avatar'][-6:]}</body></html>", content_type="text/html")
+
+	app = web.Application()
+	app.router.add_get("/meta/{avatar}", handle)
+
+	runner = web.AppRunner(app, access_log=None)
+	await runner.setup()
+	await web.TCPSite(runner, "127.0.0.1", port).start()
+	return runner
+
+
+class Session:
+	def __init__(self, bot, rest, latencies, think):
+		self.bot = bot
+		self.rest = rest
+		self.latencies = latencies
+		self.think = think
+		self.failed = 0
+
+	async def invoke(self, channel, author, name, *args):
+		message = FakeMessage(self.rest, channel, author, f"//{name} {' '.join(str(i) for i in args)}")
+		command = self.bot.get_command(name)
+		ctx = commands.Context(message=message, bot=self.bot, view=StringView(" ".join(str(i) for i in args)),
+			prefix="//", command=command, invoked_with=name)
+
+		start = time.perf_counter()
+		try:
+			await command.invoke(ctx)
+		except commands.CommandError:
+			self.failed += 1
+		self.latencies.setdefault(name, []).append(time.perf_counter() - start)
+
+		if self.think:
+			await asyncio.sleep(self.think)
+
+	async def play(self, matches, rng, players, max_actions, size=10):
+		guild = FakeGuild()
+		channel = FakeChannel(self.rest, guild)
+		users = [FakeUser() for i in range(players)]
+		users[0].guild_permissions = discord.Permissions(administrator=True)
+
+		await self.invoke(channel, users[0], "challenge", size)
+		for i in users[1:]:
+			await self.invoke(channel, i, "join")
+		await self.invoke(channel, users[0], "start")
+
+		by_id = {i.id: i for i in users}
+		for i in range(max_actions):
+			match = matches.get_match_in_channel(channel, guild)
+			if match is None:
+				return
+			author = by_id[match.get_current_turn().player]
+
+			if rng.random() < 0.5:
+				x = rng.randint(-2, 2)
+				await self.invoke(channel, author, "move", x, rng.randint(-(2-abs(x)), 2-abs(x)))
+			else:
+				await self.invoke(channel, author, "attack", rng.choice(directions))
+
+		# matches that outlast the action budget are ended by their challenger
+		await self.invoke(channel, users[0], "end")
+
+
+def percentile(values, fraction):
+	return values[min(len(values)-1, int(len(values) * fraction))]
+
+def rss():
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+async def run(args):
+	import main
+	import outbox
+
+	otfbm = await serve_otfbm(args.otfbm_port, args.otfbm_latency)
+	rest = FakeREST(args.rest_latency)
+
+	bot = main.create_bot()
+	await bot.setup_hook()
+
+	latencies = {}
+	session = Session(bot, rest, latencies, args.think)
+	memory_before = rss()
+
+	start = time.perf_counter()
+	await asyncio.gather(*(session.play(main.matches, random.Random(args.seed+i), args.players, args.actions, args.size)
+		for i in range(args.matches)))
+	elapsed = time.perf_counter() - start
+
+	memory_peak = rss()
+	while outbox.outboxes:
+		await asyncio.sleep(0.1)
+	drained = time.perf_counter() - start
+
+	total = sum(len(i) for i in latencies.values())
+	print(f"matches:          {args.matches} ({args.players} players, {args.size}x{args.size})")
+	print(f"commands:         {total} ({session.failed} failed)")
+	print(f"commands/sec:     {total/elapsed:,.0f}")
+	for name, values in sorted(latencies.items()):
+		values.sort()
+		print(f"  {name:<10} p50 {percentile(values, 0.5)*1000:7.2f}ms  p99 {percentile(values, 0.99)*1000:7.2f}ms  max {values[-1]*1000:7.2f}ms")
+
+	stats = outbox.stats()
+	print(f"rest calls:       {rest.calls} ({stats['merged']} merged, {stats['dropped']} deduplicated)")
+	print(f"outbox drained:   {drained:.1f}s (queue p50 {stats['latency_p50']:.2f}s, p99 {stats['latency_p99']:.2f}s)")
+	print(f"memory:           {memory_before/1024:.1f}MiB -> {memory_peak/1024:.1f}MiB peak ({(memory_peak-memory_before)/args.matches:.1f}KiB per match)")
+
+	await bot.shutdown()
+	await otfbm.cleanup()
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Drive the bot's commands with simulated guilds")
+	parser.add_argument("--matches", type=int, default=1000)
+	parser.add_argument("--players", type=int, default=4)
+	parser.add_argument("--size", type=int, default=10, help="width and height of every board")
+	parser.add_argument("--actions", type=int, default=100, help="actions per match before everyone retires")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--think", type=float, default=0.0, help="seconds each player waits between commands")
+	parser.add_argument("--rest-latency", type=float, default=0.05)
+	parser.add_argument("--otfbm-latency", type=float, default=0.1)
+	parser.add_argument("--otfbm-port", type=int, default=8765)
+	args = parser.parse_args()
+
+	# keep the run away from the real services and the real databases
+	scratch = tempfile.mkdtemp(prefix="arena-load-")
+	os.environ["OTFBM_TOKEN_URL"] = f"http://127.0.0.1:{args.otfbm_port}/meta/"
+	os.environ.setdefault("SHORTCODE_CACHE", os.path.join(scratch, "shortcodes.db"))
+	os.environ.setdefault("CHECKPOINT_DB", os.path.join(scratch, "matches.db"))
+	os.environ.setdefault("EVENT_LOG", os.path.join(scratch, "events.log"))
+	os.environ.setdefault("STATS_DB", os.path.join(scratch, "stats.db"))
+
+	asyncio.run(run(args))
\ No newline at end of file
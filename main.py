@@ -1,11 +1,28 @@
 from typing import Any
 import arena
+import battlemap
+import events
+import generation
 import helpers
+import metrics
+import outbox
+import registry
+import snapshot
+import stats
+import timers
+import tournament
+import workers
 
 import discord
+from discord import app_commands
 from discord.ext import commands
 from os import getenv
+import asyncio
+import contextlib
+import io
 import random
+import sqlite3
+import time
 
 class ArenaHelp(commands.MinimalHelpCommand):
 	async def send_bot_help(self, mapping):
@@ -13,13 +30,21 @@ class ArenaHelp(commands.MinimalHelpCommand):
 		getting_started = 	"""
 							To start a fight in the channel, use the `//challenge` command
 							For those who want to join, use the `//join` command
+							If nobody else is around, `//addai` adds a computer-controlled fighter
 							Once there is at least two combatants,
 							Fighter No. 1 in the roster can use the `//start` command to start the fight
 
+							For bigger events, `//tournament open` starts a sign-up list for
+							a bracket of matches played out in threads of the channel
+
+							`//leaderboard` shows the best rated fighters of the server
+
 							Admins can use the `//end` command to end an ongoing match, and those who
 							joined a match before starting can use the `//retire` command to back out
 							
 							The other commands are action commands, good luck
+
+							Every command also works as a slash command, like `/challenge`
 							"""
 		
 		embed.add_field(name="Getting Started", value=getting_started, inline=True)
@@ -41,76 +66,333 @@ class ArenaHelp(commands.MinimalHelpCommand):
 		channel = self.get_destination()
 		await channel.send(embed=embed)
 
-if __name__ == '__main__':
-	matches = []
+class ArenaBot(commands.AutoShardedBot):
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self.timers = timers.Scheduler()
+
+		self.checkpoints = snapshot.CheckpointStore(getenv("CHECKPOINT_DB", "matches.db"))
+		self.checkpoint_interval = float(getenv("CHECKPOINT_INTERVAL", 2))
+		self.restored = False
+
+		# which players are in a match on any shard, when there are several
+		self.shared_players = registry.PlayerStore(getenv("SHARED_DB")) if getenv("SHARED_DB") else None
+
+		self.event_log = events.EventFile(getenv("EVENT_LOG", "events.log"))
+
+		self.stats = stats.StatsStore(getenv("STATS_DB", "stats.db"), float(getenv("LEADERBOARD_TTL", 60)))
+		self.stats_interval = float(getenv("STATS_INTERVAL", 5))
+
+		self.game = workers.GamePool(int(getenv("GAME_WORKERS", 0)), arena.local_renderer is not None)
+
+		self.lag_monitor = metrics.LagMonitor()
+		self.metrics_port = int(getenv("METRICS_PORT", 0))
+		self.metrics_server = None
+
+		# pushing the slash commands to discord is rate limited, so it is
+		# only done when asked for after they change
+		self.sync_commands = bool(getenv("SYNC_COMMANDS"))
+
+	def owns(self, guild_id):
+		if self.shard_ids is None or self.shard_count is None:
+			return True
+		return registry.shard_for(guild_id, self.shard_count) in self.shard_ids
+
+	async def setup_hook(self):
+		self.timers.start()
+		self.timers.schedule("checkpoint", self.checkpoint_interval, self.checkpoint)
+		self.timers.schedule("stats", self.stats_interval, self.flush_stats)
+		self.lag_monitor.start()
+
+		if self.metrics_port:
+			self.metrics_server = await metrics.serve(self.metrics_port)
+
+		if self.sync_commands:
+			await self.tree.sync()
+
+	async def checkpoint(self):
+		# snapshots are taken on the loop, only the disk writes leave it, and
+		# a write that fails is tried again next time
+		try:
+			await self.write_checkpoints()
+			await self.write_events()
+		finally:
+			self.timers.schedule("checkpoint", self.checkpoint_interval, self.checkpoint)
+
+	async def write_checkpoints(self):
+		dirty, removed = self.checkpoints.take()
+		if not dirty and not removed:
+			return
+
+		data = {key: match.dump_snapshot() for key, match in dirty.items()}
+		try:
+			await asyncio.to_thread(self.checkpoints.write, data, removed)
+		except Exception:
+			self.checkpoints.put_back(dirty, removed)
+			raise
+
+	async def write_events(self):
+		# finished matches are logged in one append per checkpoint
+		records = self.event_log.take()
+		if not records:
+			return
+
+		try:
+			await asyncio.to_thread(self.event_log.append, records)
+		except Exception:
+			self.event_log.put_back(records)
+			raise
+
+	async def flush_stats(self):
+		try:
+			await self.stats.flush()
+		finally:
+			self.timers.schedule("stats", self.stats_interval, self.flush_stats)
+
+	async def close(self):
+		await self.shutdown()
+		await super().close()
+
+	async def shutdown(self):
+		self.timers.stop()
+		self.lag_monitor.stop()
+		self.game.close()
+
+		dirty, removed = self.checkpoints.take()
+		self.checkpoints.write({key: match.dump_snapshot() for key, match in dirty.items()}, removed)
+		self.checkpoints.close()
+		if self.shared_players is not None:
+			self.shared_players.close()
+		self.event_log.close()
+		self.stats.close()
+
+		if self.metrics_server is not None:
+			await self.metrics_server.cleanup()
+		await battlemap.close_session()
+
+def create_bot():
+	global matches
+
+	shard_count = int(getenv("SHARD_COUNT")) if getenv("SHARD_COUNT") else None
+	shard_ids = [int(i) for i in getenv("SHARD_IDS").split(",")] if getenv("SHARD_IDS") else None
+
+	turn_timeout = float(getenv("TURN_TIMEOUT", 120))
+	idle_timeout = float(getenv("IDLE_TIMEOUT", 900))
+	ai_delay = float(getenv("AI_DELAY", 1))
+	ai_budget = float(getenv("AI_BUDGET", 1))
+	# snapshots store coordinates in a byte
+	max_size = min(255, int(getenv("MAX_BOARD_SIZE", 64)))
+	tournament_concurrency = int(getenv("TOURNAMENT_CONCURRENCY", 8))
+	tournaments = {}
     
+	# without message content the bot can only read commands in messages
+	# that mention it, but discord still sends it every message in its
+	# guilds; slash-only mode turns those message events off as well, and
+	# with them the prefix-only //profile
 	intents = discord.Intents.default()
-	intents.message_content = True
+	intents.message_content = getenv("MESSAGE_CONTENT", "1") != "0"
+	if getenv("SLASH_ONLY"):
+		intents.messages = False
+		intents.message_content = False
 
-	bot = commands.Bot(command_prefix='//', intents=intents)
+	bot = ArenaBot(command_prefix=commands.when_mentioned_or('//'), intents=intents, shard_count=shard_count, shard_ids=shard_ids)
 	bot.help_command = ArenaHelp()
+	matches = registry.MatchRegistry(bot.shared_players)
+
+	metrics.gauge("arena_matches", lambda: len(matches))
+	metrics.gauge("arena_fighters", lambda: sum(len(i.fighters) for i in matches))
+	metrics.gauge("arena_outbox", outbox.stats)
+	metrics.gauge("arena_shortcodes", battlemap.shortcodes.stats)
+	metrics.gauge("arena_stats_pending", lambda: bot.stats.pending())
+
+	directions = [app_commands.Choice(name=i, value=i) for i in ("up", "down", "left", "right")]
+	layouts = [app_commands.Choice(name=i, value=i) for i in generation.layouts]
+
+	@bot.before_invoke
+	async def before_command(ctx):
+		ctx.started_at = time.perf_counter()
+		ctx.answered = False
+		metrics.command.set(ctx.command.qualified_name)
+
+		# slash commands have three seconds to answer, and waiting on a
+		# match lock or a worker can take longer
+		if ctx.interaction is not None:
+			await ctx.defer(ephemeral=True)
+
+	@bot.after_invoke
+	async def after_command(ctx):
+		status = "error" if ctx.command_failed else "ok"
+		metrics.observe("arena_command_seconds", time.perf_counter() - ctx.started_at, command=ctx.command.qualified_name, status=status)
+
+		# the outcome is posted to the channel like any other, so the
+		# deferred "thinking" reply is only in the way
+		if ctx.interaction is not None and not ctx.answered:
+			with contextlib.suppress(discord.HTTPException):
+				await ctx.interaction.delete_original_response()
+
+	async def reply(ctx, message):
+		if ctx.interaction is not None:
+			ctx.answered = True
+			await ctx.send(message, ephemeral=True)
+		else:
+			outbox.send(ctx.channel, message)
 
-	def get_attack_offset(atk_dir: str):
-		atk_dir = atk_dir.lower()
-		match atk_dir:
-			case "up": return [0, -1]
-			case "down": return [0, 1]
-			case "left": return [-1, 0]
-			case "right": return [1, 0]
-			case _: return None
+	def watch_match(match):
+		bot.checkpoints.mark(match.channel.id, match)
+		bot.timers.schedule((match, "idle"), idle_timeout, lambda: expire_match(match))
 
-	def get_attack_target(weapon_range, position, offset, match_map):
-		for i in range(1, weapon_range+1, 1):
-			rx = helpers.clamp(position[0]+(offset[0]*i), 1, 10)
-			ry = helpers.clamp(position[1]+(offset[1]*i), 1, 10)
-			map_target = match_map[rx-1][ry-1]
+		# the turn clock restarts only when the turn passes to someone else,
+		# which a removal shifting the indexes does not count as
+		if match.started:
+			turn = (match.current_round, match.get_current_turn().player)
+			if match.timed_turn != turn:
+				match.timed_turn = turn
+				bot.timers.schedule((match, "turn"), turn_timeout, lambda: skip_turn(match))
 
-			if isinstance(map_target, arena.Fighter):
-				return map_target
+			if helpers.is_ai(match.get_current_turn().player):
+				bot.timers.schedule((match, "ai"), ai_delay, lambda: play_ai(match))
 
-	def get_ranged_distance(origin, target):
-		return abs(target[0]-origin[0]) + abs(target[1]-origin[1])
+	def end_match(match):
+		global matches
 
-	def move_shove_target(match, offset, target):
-		target.map_move(offset[0]*2, offset[1]*2, match.map)
+		matches.remove(match)
+		bot.checkpoints.discard(match.channel.id)
+		bot.event_log.write(match.seed or 0, match.events)
+		bot.timers.cancel((match, "idle"))
+		bot.timers.cancel((match, "turn"))
+		bot.timers.cancel((match, "ai"))
+		match.live.close()
+		bot.stats.finish(match, match.finish())
+
+	async def launch_match(channel, users, size, layout):
+		# one match to a channel, tournament or not
+		if matches.get_match_in_channel(channel, channel.guild) is not None:
+			return None
+
+		# players who got into another match meanwhile are left out on the
+		# tournament's next try
+		new = arena.MatchState.for_players(channel, users, size, layout)
+		if await matches.add(new):
+			matches.remove(new)
+			return None
+
+		new.start_match()
+		await bot.game.prerender(new)
+		new.show("Battle has started!")
+		watch_match(new)
+		return new
+
+	async def skip_turn(match):
+		async with match.lock:
+			if matches.get_match_in_channel(match.channel, match.guild) is not match:
+				return
+
+			fighter = match.get_current_turn()
+			match.skip_turn()
+			await bot.game.prerender(match)
+			match.show(f"{helpers.mention(fighter.player)} ran out of time and skipped their turn")
+			watch_match(match)
+
+	async def play_ai(match):
+		async with match.lock:
+			if matches.get_match_in_channel(match.channel, match.guild) is not match:
+				return
+
+			fighter = match.get_current_turn()
+			if not helpers.is_ai(fighter.player):
+				return
+
+			op, args, nodes = await bot.game.think(match, fighter.player, ai_budget)
+			metrics.count("arena_ai_nodes_total", nodes)
+
+			outcome = await bot.game.run(match, op, *args) if op != "skip" else None
+			if outcome is None or outcome.error is not None:
+				match.skip_turn()
+				await bot.game.prerender(match)
+				match.show(f"{helpers.mention(fighter.player)} skipped their turn")
+				watch_match(match)
+				return
+
+			await report_action(None, match, fighter.player, op, outcome)
+
+	async def expire_match(match):
+		async with match.lock:
+			if matches.get_match_in_channel(match.channel, match.guild) is not match:
+				return
+
+			end_match(match)
+			outbox.send(match.channel, f"The Battle at the {match.channel} has ended after being idle")
 
 	async def check_win(ctx, match):
-		global matches
+		winner = match.get_winner()
+		if winner is not None:
+			match.live.post(f"{helpers.mention(winner.player)} has won!")
+			end_match(match)
+
+	async def report_action(ctx, match, player, op, outcome):
+		bot.stats.action(match, player, op, outcome)
+		for i in match.remove_dead():
+			matches.remove_player(i.player)
+			bot.stats.dead(match, i.player, player)
+
+		# a death clears a cell after the action's own frame was made
+		await bot.game.prerender(match)
+		match.show(describe_action(helpers.mention(player), op, outcome))
+		watch_match(match)
+		await check_win(ctx, match)
 
-		match.remove_dead()
+	@bot.event
+	async def on_ready():
+		if bot.restored:
+			return
+		bot.restored = True
 
-		if len(match.fighters) == 1:
-			matches.remove(match)
-			await ctx.send(f"{match.fighters[0].user.mention} has won!")
+		# this process answers for the players of its own shards only
+		if bot.shared_players is not None:
+			await bot.shared_players.reset_shards(bot.shard_ids or list(range(bot.shard_count)), bot.shard_count)
 
-	async def damage_target(ctx, damage, target, match):
-		target.hp -= damage
-		match.check_actions_left()
-		await check_win(ctx, match)
+		for data in bot.checkpoints.load_all():
+			try:
+				guild_id, channel_id, message_id = snapshot.read_header(data)
+			except ValueError:
+				continue
+			if not bot.owns(guild_id):
+				continue
 
-	def find_user_in_matches(user_mention):
-		global matches
-		
-		if len(matches) == 0:
-			return None
-		
-		for i in matches:
-			if i.find_user_in_match(user_mention):
-				return i
-		
-		return None
+			channel = bot.get_channel(channel_id)
+			if channel is None:
+				bot.checkpoints.discard(channel_id)
+				continue
 
-	def get_match_in_channel(channel, guild):
-		global matches
+			restored = arena.MatchState.restore(data, channel)
+			await matches.add(restored)
+			watch_match(restored)
 
-		if len(matches) == 0:
-			return None
+	@contextlib.asynccontextmanager
+	async def locked_match(ctx):
+		channel_match = matches.get_match_in_channel(ctx.channel, ctx.guild)
 
-		for i in matches:
-			if i.channel == channel and i.guild == guild:
-				return i
-		
-		return None
+		if channel_match is None:
+			yield None
+			return
+
+		async with channel_match.lock:
+			# the match may have ended while this command was waiting
+			if matches.get_match_in_channel(ctx.channel, ctx.guild) is channel_match:
+				yield channel_match
+			else:
+				yield None
+
+	def describe_action(actor, op, outcome):
+		match op, outcome.kind:
+			case "move", "moved": return f"{actor} has moved to {outcome.location}"
+			case "move", "skipped": return f"{actor} has not moved and skipped an action"
+			case "move", "weapon": return f"{actor} has equipped a {outcome.weapon} and moved to {outcome.location}"
+			case "move", "trap": return f"{actor} has stepped into a {outcome.trap} trap and moved to {outcome.location}"
+			case "attack", _: return f"{actor} has dealt {outcome.damage} with a {outcome.weapon} to {helpers.mention(outcome.target)}"
+			case "throw", _: return f"{actor} threw a dagger at {helpers.mention(outcome.target)}, dealing {outcome.damage}"
+			case "shove", _: return f"{actor} has shoved {helpers.mention(outcome.target)} by 2 square with a {outcome.weapon} and dealt 1 damage"
+			case "disarm", _: return f"{actor} has disarmed {helpers.mention(outcome.target)}"
 
 	async def send_error(ctx, error_code, *argv):
 		
@@ -136,33 +418,72 @@ if __name__ == '__main__':
 			case 17: message = f"you must equip {argv[0]} to use {argv[1]} command"
 			case 18: message = f"no target called {argv[0]} found"
 			case 19: message = "target is out of range of 5 squares"
+			case 20: message = "only admins can profile the bot"
+			case 21: message = "a profile is already running"
+			case 22: message = f"board size must be between 10 and {max_size}"
+			case 23: message = f"no layout called {argv[0]}, try one of {', '.join(generation.layouts)}"
+			case 24: message = "a tournament is already open in this channel"
+			case 25: message = "no tournament open in this channel"
+			case 26: message = "you already signed up for this tournament"
+			case 27: message = "need at least 2 players to start a tournament"
+			case 28: message = "only the organiser or an admin can do that"
+			case 29: message = "tournament already started"
+			case 30: message = "tournament groups must have 2 to 4 players"
 			case _: message = "unknown error occured, this should not be possible"
 		
-		await ctx.send("Error: " + message)
+		await reply(ctx, "Error: " + message)
 
-	@bot.command()
-	async def challenge(ctx):
+	@bot.hybrid_command()
+	@app_commands.describe(size="width and height of the board", layout="how the board is filled")
+	@app_commands.choices(layout=layouts)
+	async def challenge(ctx, size: int = 10, layout: str = generation.default):
 		"""
 		Challenge the current channel and start looking for other combatants.
 		Only 1 match per channel is allowed.
+
+		***PARAMATERS***:
+		`size` - optional width and height of the board, 10 by default.
+		Bigger boards have room for more fighters, and only show the area
+		around whoever's turn it is
+		`layout` - optional way to fill the board: standard, spread (spawns
+		kept apart), symmetric (fighters in a circle, mirrored items),
+		sparse, dense or classic
+
+		***EXAMPLE***:
+		`//challenge 20` to fight on a 20x20 board
+		`//challenge 16 symmetric` to fight on a 16x16 symmetric board
 		"""
 		global matches
 
-		channel_match = get_match_in_channel(ctx.channel, ctx.guild)
+		if not 10 <= size <= max_size:
+			await send_error(ctx, 22)
+			return
+
+		layout = layout.lower()
+		if layout not in generation.layouts:
+			await send_error(ctx, 23, layout)
+			return
+
+		channel_match = matches.get_match_in_channel(ctx.channel, ctx.guild)
 
 		if channel_match:
 			await send_error(ctx, 1)
 			return
 		
-		if find_user_in_matches(ctx.author.mention):
+		if matches.is_playing(ctx.author.id):
 			await send_error(ctx, 4)
 			return
 		
-		new = arena.MatchState(ctx)
-		matches.append(new)
-		await ctx.send(f"{ctx.author.mention} has challenged this channel!", embed=new.display_roster())
+		new = arena.MatchState(ctx, size=size, layout=layout)
+		if await matches.add(new):
+			matches.remove(new)
+			await send_error(ctx, 4)
+			return
+
+		watch_match(new)
+		outbox.send(ctx.channel, f"{ctx.author.mention} has challenged this channel!", embed=new.display_roster())
 
-	@bot.command()
+	@bot.hybrid_command()
 	async def start(ctx):
 		"""
 		Start the match in the current channel.
@@ -170,76 +491,108 @@ if __name__ == '__main__':
 		"""
 		global matches
 
-		channel_match = get_match_in_channel(ctx.channel, ctx.guild)
-
-		if channel_match is None:
-			await send_error(ctx, 2)
-			return
-		if channel_match.started:
-			await send_error(ctx, 3)
-			return
-		if len(channel_match.fighters) <= 1:
-			await send_error(ctx, 5)
-			return
-		if channel_match.invoker != ctx.author:
-			await send_error(ctx, 6)
-			return
-		
-		channel_match.start_match()
-		await ctx.send("Battle has started!", embed=channel_match.update_map())
-
-	@bot.command()
+		async with locked_match(ctx) as channel_match:
+			if channel_match is None:
+				await send_error(ctx, 2)
+				return
+			if channel_match.started:
+				await send_error(ctx, 3)
+				return
+			if len(channel_match.fighters) <= 1:
+				await send_error(ctx, 5)
+				return
+			if channel_match.invoker != ctx.author.id:
+				await send_error(ctx, 6)
+				return
+
+			channel_match.start_match()
+			await bot.game.prerender(channel_match)
+			channel_match.show("Battle has started!")
+			watch_match(channel_match)
+
+	@bot.hybrid_command()
 	async def join(ctx):
 		"""
 		Join a match in the current channel if there are any.
 		"""
 		global matches
 
-		channel_match = get_match_in_channel(ctx.channel, ctx.guild)
-
-		if channel_match is None:
-			await send_error(ctx, 2)
-			return
-		if channel_match.started:
-			await send_error(ctx, 3)
-			return
-		if find_user_in_matches(ctx.author.mention):
-			await send_error(ctx, 4)
-			return
-		if len(channel_match.fighters) >= 4:
-			await send_error(ctx, 7)
-			return
-		
-		channel_match.add_fighter(ctx.author)
-		await ctx.send(f"{ctx.author.mention} has joined the Battle at the {ctx.channel}!", embed=channel_match.display_roster())
+		async with locked_match(ctx) as channel_match:
+			if channel_match is None:
+				await send_error(ctx, 2)
+				return
+			if channel_match.started:
+				await send_error(ctx, 3)
+				return
+			if matches.is_playing(ctx.author.id):
+				await send_error(ctx, 4)
+				return
+			if len(channel_match.fighters) >= channel_match.max_fighters():
+				await send_error(ctx, 7)
+				return
+			if not await matches.claim(channel_match, ctx.author.id):
+				await send_error(ctx, 4)
+				return
+
+			channel_match.add_fighter(ctx.author)
+			watch_match(channel_match)
+			outbox.send(ctx.channel, f"{ctx.author.mention} has joined the Battle at the {ctx.channel}!", embed=channel_match.display_roster())
+
+	@bot.hybrid_command()
+	async def addai(ctx):
+		"""
+		Add a computer-controlled fighter to the match in the current channel.
+		Only fighters already in the match can add one.
+		"""
+		global matches
 
-	@bot.command()
+		async with locked_match(ctx) as channel_match:
+			if channel_match is None:
+				await send_error(ctx, 2)
+				return
+			if channel_match.started:
+				await send_error(ctx, 3)
+				return
+			if channel_match.find_user_in_match(ctx.author.id) is None:
+				await send_error(ctx, 8)
+				return
+			if len(channel_match.fighters) >= channel_match.max_fighters():
+				await send_error(ctx, 7)
+				return
+
+			fighter = channel_match.add_ai()
+			watch_match(channel_match)
+			outbox.send(ctx.channel, f"{helpers.mention(fighter.player)} has joined the Battle at the {ctx.channel}!", embed=channel_match.display_roster())
+
+	@bot.hybrid_command()
 	async def retire(ctx):
 		"""
 		Back out from the match you joined in the current channel.
 		"""
 		global matches
 
-		channel_match = get_match_in_channel(ctx.channel, ctx.guild)
-
-		if channel_match is None:
-			await send_error(ctx, 2)
-			return
-		if not channel_match.started:
-			channel_match.remove_fighter(ctx.author)
-		else:
-			await send_error(ctx, 16)
-			return
-		if not channel_match.fighters:
-			matches.remove(channel_match)
-			await ctx.send(f"Admin {ctx.author} has ended the Battle at the {ctx.channel}!")
-			return
-		else:
-			channel_match.invoker = channel_match.fighters[0].user
-
-		await ctx.send(f"{ctx.author} has retired from the match", embed=channel_match.display_roster())
-
-	@bot.command()
+		async with locked_match(ctx) as channel_match:
+			if channel_match is None:
+				await send_error(ctx, 2)
+				return
+			if channel_match.find_user_in_match(ctx.author.id) is None:
+				await send_error(ctx, 8)
+				return
+			if not channel_match.started:
+				channel_match.retire(ctx.author.id)
+				matches.remove_player(ctx.author.id)
+			else:
+				await send_error(ctx, 16)
+				return
+			if all(helpers.is_ai(i.player) for i in channel_match.fighters):
+				end_match(channel_match)
+				outbox.send(ctx.channel, f"Admin {ctx.author} has ended the Battle at the {ctx.channel}!")
+				return
+
+			watch_match(channel_match)
+			outbox.send(ctx.channel, f"{ctx.author} has retired from the match", embed=channel_match.display_roster())
+
+	@bot.hybrid_command(description="End the match in this channel (admins only)")
 	async def end(ctx):
 		"""
 		***FOR ADMINS ONLY***
@@ -252,21 +605,20 @@ if __name__ == '__main__':
 
 		global matches
 
-		channel_match = get_match_in_channel(ctx.channel, ctx.guild)
+		async with locked_match(ctx) as channel_match:
+			if channel_match is None:
+				await send_error(ctx, 2)
+				return
+			if not channel_match.started:
+				await send_error(ctx, 9)
+				return
 
-		if channel_match is None:
-			await send_error(ctx, 2)
-			return
-		if not channel_match.started:
-			await send_error(ctx, 9)
-			return
-		
-		#channel_match.end_match()
-		matches.remove(channel_match)
-		await ctx.send(f"Admin {ctx.author} has ended the Battle at the {ctx.channel}!")
+			end_match(channel_match)
+			outbox.send(ctx.channel, f"Admin {ctx.author} has ended the Battle at the {ctx.channel}!")
 
-	@bot.command()
-	async def move(ctx, x, y):
+	@bot.hybrid_command()
+	@app_commands.describe(x="squares to the right, negative for left", y="squares down, negative for up")
+	async def move(ctx, x: int, y: int):
 		"""
 		Used to move around the map via the x and y axis.
 		You can only move 4 squares, x and y must not total greater than 4.
@@ -287,48 +639,22 @@ if __name__ == '__main__':
 		"""
 		global matches
 
-		channel_match = get_match_in_channel(ctx.channel, ctx.guild)
-		
-		try:
-			x = int(x)
-			y = int(y)
-		except ValueError:
-			await send_error(ctx, 13)
-			return
-		if channel_match is None:
-			await send_error(ctx, 2)
-			return
-		if not channel_match.started:
-			await send_error(ctx, 9)
-			return
-		if channel_match.get_current_turn().user != ctx.author:
-			await send_error(ctx, 10)
-			return
-		if (abs(x)+abs(y)) > 4:
-			await send_error(ctx, 11)
-			return
-		
-		invoker = channel_match.get_current_turn()
-		move = invoker.map_move(int(x), int(y), channel_match.map)
-		move_location = invoker.x + str(invoker.y)
-		
-		if move == 0:
-			await ctx.send(f"{ctx.author.mention} has moved to {move_location}")
-		elif move == invoker:
-			await ctx.send(f"{ctx.author.mention} has not moved and skipped an action")
-		elif isinstance(move, arena.Fighter):
-			await send_error(ctx, 12)
-			return
-		elif isinstance(move, arena.Weapon):
-			await ctx.send(f"{ctx.author.mention} has equipped a {channel_match.get_current_turn().equip['name']} and moved to {move_location}")
-		elif isinstance(move, arena.Trap):
-			await ctx.send(f"{ctx.author.mention} has stepped into a {move.name} trap and moved to {move_location}")
+		async with locked_match(ctx) as channel_match:
+			if channel_match is None:
+				await send_error(ctx, 2)
+				return
+
+			move = await bot.game.run(channel_match, "move", ctx.author.id, x, y)
+			if move.error is not None:
+				await send_error(ctx, move.error, *move.params)
+				return
 
-		channel_match.check_actions_left()
-		await ctx.send(embed=channel_match.update_map())
+			await report_action(ctx, channel_match, ctx.author.id, "move", move)
 
-	@bot.command()
-	async def attack(ctx, atk_dir):
+	@bot.hybrid_command(description="Attack the first enemy in a direction")
+	@app_commands.describe(atk_dir="direction to attack")
+	@app_commands.choices(atk_dir=directions)
+	async def attack(ctx, atk_dir: str):
 		"""
 		Attack in a certain direction, and damage an enemy
 		if there are any in the direction. Attack range depend on weapon.
@@ -338,76 +664,50 @@ if __name__ == '__main__':
 		"""
 		global matches
 
-		channel_match = get_match_in_channel(ctx.channel, ctx.guild)
-		
-		if channel_match is None:
-			await send_error(ctx, 2)
-			return
-		if not channel_match.started:
-			await send_error(ctx, 9)
-			return
-		if channel_match.get_current_turn().user != ctx.author:
-			await send_error(ctx, 10)
-			return
-		
-		offset = get_attack_offset(atk_dir)
-		if offset is None:
-			await send_error(ctx, 14)
-			return
-		
-		attacker = channel_match.get_current_turn()
-		target = get_attack_target(attacker.equip['range'], attacker.get_position(), offset, channel_match.map)
-		if target is None:
-			await send_error(ctx, 15)
-		else:
-			await ctx.send(f"{attacker.user.mention} has dealt {attacker.equip['damage']} with a {attacker.equip['name']} to {target.user.mention}")
-			await damage_target(ctx, attacker.equip['damage'], target, channel_match)
-			await ctx.send(embed=channel_match.update_map())
+		async with locked_match(ctx) as channel_match:
+			if channel_match is None:
+				await send_error(ctx, 2)
+				return
+
+			attack = await bot.game.run(channel_match, "attack", ctx.author.id, atk_dir)
+			if attack.error is not None:
+				await send_error(ctx, attack.error, *attack.params)
+				return
+
+			await report_action(ctx, channel_match, ctx.author.id, "attack", attack)
 
-	@bot.command()
-	async def throw(ctx, target_mention):
+	@bot.hybrid_command(description="Throw a dagger at a fighter within 5 squares (needs a dagger)")
+	@app_commands.describe(target_mention="the fighter to throw at")
+	async def throw(ctx, target_mention: str):
 		"""
 		***SPECIAL COMMAND: REQUIRES DAGGER***
 		Throw a dagger at the mentioned user, if user is in match.
 		Will succeed if the target is within 5 squares from your square.
 
 		***ARGUEMENTS***:
-		`target_mention` - must be an `@mention` of a target in match
+		`target_mention` - must be an `@mention` of a target in match, or the number of an AI fighter
 		"""
 		global matches
 
-		channel_match = get_match_in_channel(ctx.channel, ctx.guild)
-		
-		if channel_match is None:
-			await send_error(ctx, 2)
-			return
-		if not channel_match.started:
-			await send_error(ctx, 9)
-			return
-		if channel_match.get_current_turn().user != ctx.author:
-			await send_error(ctx, 10)
-			return
-		
-		attacker = channel_match.get_current_turn()
-		if attacker.equip['name'] != "dagger":
-			await send_error(ctx, 17, "dagger", "throw")
-			return
-		
-		target = channel_match.find_user_in_match(target_mention)
-		if target is None:
-			await send_error(ctx, 18, target_mention)
-			return
-		
-		distance = get_ranged_distance(attacker.get_position(), target.get_position())
-		if distance > 5:
-			await send_error(ctx, 19)
-		else:
-			await ctx.send(f"{attacker.user.mention} threw a dagger at {target_mention}, dealing {attacker.equip['damage']}")
-			await damage_target(ctx, attacker.equip['damage'], target, channel_match)
-			await ctx.send(embed=channel_match.update_map())
-
-	@bot.command()
-	async def shove(ctx, atk_dir):
+		async with locked_match(ctx) as channel_match:
+			if channel_match is None:
+				await send_error(ctx, 2)
+				return
+
+			throw = await bot.game.run(channel_match, "throw", ctx.author.id, helpers.mention_to_id(target_mention))
+			if throw.error == 18:
+				await send_error(ctx, 18, target_mention)
+				return
+			if throw.error is not None:
+				await send_error(ctx, throw.error, *throw.params)
+				return
+
+			await report_action(ctx, channel_match, ctx.author.id, "throw", throw)
+
+	@bot.hybrid_command(description="Shove an enemy 2 squares away for 1 damage (needs an axe)")
+	@app_commands.describe(atk_dir="direction to shove")
+	@app_commands.choices(atk_dir=directions)
+	async def shove(ctx, atk_dir: str):
 		"""
 		***SPECIAL COMMAND: REQUIRES AXE***
 		Shove the target in the specified direction and push
@@ -418,39 +718,22 @@ if __name__ == '__main__':
 		"""
 		global matches
 
-		channel_match = get_match_in_channel(ctx.channel, ctx.guild)
-		
-		if channel_match is None:
-			await send_error(ctx, 2)
-			return
-		if not channel_match.started:
-			await send_error(ctx, 9)
-			return
-		if channel_match.get_current_turn().user != ctx.author:
-			await send_error(ctx, 10)
-			return
-		
-		attacker = channel_match.get_current_turn()
-		if attacker.equip['name'] != "axe":
-			await send_error(ctx, 17, "axe", "shove")
-			return
+		async with locked_match(ctx) as channel_match:
+			if channel_match is None:
+				await send_error(ctx, 2)
+				return
 
-		offset = get_attack_offset(atk_dir)
-		if offset is None:
-			await send_error(ctx, 14)
-			return
+			shove = await bot.game.run(channel_match, "shove", ctx.author.id, atk_dir)
+			if shove.error is not None:
+				await send_error(ctx, shove.error, *shove.params)
+				return
 
-		target = get_attack_target(attacker.equip['range'], attacker.get_position(), offset, channel_match.map)
-		if target is None:
-			await send_error(ctx, 15)
-		else:
-			await ctx.send(f"{attacker.user.mention} has shoved {target.user.mention} by 2 square with a {attacker.equip['name']} and dealt 1 damage")
-			move_shove_target(channel_match, offset, target)
-			await damage_target(ctx, 1, target, channel_match)
-			await ctx.send(embed=channel_match.update_map())
+			await report_action(ctx, channel_match, ctx.author.id, "shove", shove)
 
-	@bot.command()
-	async def disarm(ctx, atk_dir):
+	@bot.hybrid_command(description="Knock the weapon out of an enemy's hands (needs a rapier)")
+	@app_commands.describe(atk_dir="direction to disarm")
+	@app_commands.choices(atk_dir=directions)
+	async def disarm(ctx, atk_dir: str):
 		"""
 		***SPECIAL COMMAND: REQUIRES RAPIER***
 		Removes the weapon of target in the specified direction
@@ -461,36 +744,203 @@ if __name__ == '__main__':
 		"""
 		global matches
 
-		channel_match = get_match_in_channel(ctx.channel, ctx.guild)
-		
-		if channel_match is None:
-			await send_error(ctx, 2)
+		async with locked_match(ctx) as channel_match:
+			if channel_match is None:
+				await send_error(ctx, 2)
+				return
+
+			disarm = await bot.game.run(channel_match, "disarm", ctx.author.id, atk_dir)
+			if disarm.error is not None:
+				await send_error(ctx, disarm.error, *disarm.params)
+				return
+
+			await report_action(ctx, channel_match, ctx.author.id, "disarm", disarm)
+
+	@bot.hybrid_group(name="tournament", fallback="status", invoke_without_command=True)
+	async def tournament_command(ctx):
+		"""
+		Show the sign-ups or the progress of the tournament in the current channel.
+		"""
+		event = tournaments.get(registry.channel_key(ctx.guild, ctx.channel))
+		if event is None:
+			await send_error(ctx, 25)
 			return
-		if not channel_match.started:
-			await send_error(ctx, 9)
+
+		outbox.send(ctx.channel, embed=event.describe())
+
+	@tournament_command.command(name="open")
+	@app_commands.describe(group_size="players in each match", size="width and height of every board", layout="how every board is filled")
+	@app_commands.choices(layout=layouts)
+	async def tournament_open(ctx, group_size: int = 4, size: int = 10, layout: str = generation.default):
+		"""
+		Open sign-ups for a tournament in the current channel.
+		Once started, every round splits the players into matches of up to
+		group_size fighters, each played in its own thread, and the winners
+		go on to the next round until one is left.
+
+		***EXAMPLE***:
+		`//tournament open 2` for one on one matches
+		"""
+		key = registry.channel_key(ctx.guild, ctx.channel)
+		if key in tournaments:
+			await send_error(ctx, 24)
 			return
-		if channel_match.get_current_turn().user != ctx.author:
-			await send_error(ctx, 10)
+		if not 2 <= group_size <= 4:
+			await send_error(ctx, 30)
 			return
-		
-		attacker = channel_match.get_current_turn()
-		if attacker.equip['name'] != "rapier":
-			await send_error(ctx, 17, "rapier", "disarm")
+		if not 10 <= size <= max_size:
+			await send_error(ctx, 22)
 			return
 
-		offset = get_attack_offset(atk_dir)
-		if offset is None:
-			await send_error(ctx, 14)
+		layout = layout.lower()
+		if layout not in generation.layouts:
+			await send_error(ctx, 23, layout)
 			return
 
-		target = get_attack_target(attacker.equip['range'], attacker.get_position(), offset, channel_match.map)
-		if target is None:
-			await send_error(ctx, 15)
-		else:
-			await ctx.send(f"{attacker.user.mention} has disarmed {target.user.mention}")
-			target.equip = arena.weapons_data[0]
-			await ctx.send(embed=channel_match.update_map())
+		event = tournaments[key] = tournament.Tournament(ctx.channel, ctx.author.id, group_size, size, layout, tournament_concurrency)
+		event.join(ctx.author)
+		outbox.send(ctx.channel, f"{ctx.author.mention} has opened a tournament, use `//tournament join` to sign up!", embed=event.describe())
+
+	@tournament_command.command(name="join")
+	async def tournament_join(ctx):
+		"""
+		Sign up for the tournament in the current channel.
+		"""
+		event = tournaments.get(registry.channel_key(ctx.guild, ctx.channel))
+		if event is None:
+			await send_error(ctx, 25)
+			return
+		if event.started:
+			await send_error(ctx, 29)
+			return
+		if ctx.author.id in event.players:
+			await send_error(ctx, 26)
+			return
+
+		event.join(ctx.author)
+		outbox.send(ctx.channel, f"{ctx.author.mention} has signed up for the tournament!", embed=event.describe())
+
+	@tournament_command.command(name="leave")
+	async def tournament_leave(ctx):
+		"""
+		Take your name off the tournament in the current channel before it starts.
+		"""
+		event = tournaments.get(registry.channel_key(ctx.guild, ctx.channel))
+		if event is None:
+			await send_error(ctx, 25)
+			return
+		if event.started:
+			await send_error(ctx, 29)
+			return
+
+		event.leave(ctx.author)
+		outbox.send(ctx.channel, f"{ctx.author} has left the tournament", embed=event.describe())
+
+	@tournament_command.command(name="start")
+	async def tournament_start(ctx):
+		"""
+		Start the tournament in the current channel.
+		Only the player who opened it or an admin can start it.
+		"""
+		key = registry.channel_key(ctx.guild, ctx.channel)
+		event = tournaments.get(key)
+		if event is None:
+			await send_error(ctx, 25)
+			return
+		if event.started:
+			await send_error(ctx, 29)
+			return
+		if event.organiser != ctx.author.id and not ctx.author.guild_permissions.administrator:
+			await send_error(ctx, 28)
+			return
+		if len(event.players) < 2:
+			await send_error(ctx, 27)
+			return
+
+		# closed to joins and second starts while the ratings are read
+		event.started = True
+		players = list(event.players)
+
+		# stronger players are seeded apart, or everyone at random when the
+		# ratings cannot be read
+		try:
+			ratings = await asyncio.to_thread(bot.stats.ratings, ctx.guild.id if ctx.guild else None, players)
+		except sqlite3.Error:
+			ratings = {}
+		if tournaments.get(key) is not event:
+			return
+
+		task = event.start(launch_match, lambda user: matches.playing(user.id), lambda user: ratings.get(user.id, stats.default_rating))
+		task.add_done_callback(lambda task: tournaments.pop(key, None) if tournaments.get(key) is event else None)
+		outbox.send(ctx.channel, "The tournament has started!", embed=event.describe())
+
+	@tournament_command.command(name="cancel")
+	async def tournament_cancel(ctx):
+		"""
+		Call off the tournament in the current channel.
+		Matches already being fought carry on, but nobody advances from them.
+		"""
+		key = registry.channel_key(ctx.guild, ctx.channel)
+		event = tournaments.get(key)
+		if event is None:
+			await send_error(ctx, 25)
+			return
+		if event.organiser != ctx.author.id and not ctx.author.guild_permissions.administrator:
+			await send_error(ctx, 28)
+			return
+
+		event.cancel()
+		del tournaments[key]
+		outbox.send(ctx.channel, f"{ctx.author} has called off the tournament")
+
+	@bot.hybrid_command()
+	async def leaderboard(ctx):
+		"""
+		Show the best rated fighters of the server, with their wins,
+		kills, damage dealt and favourite weapon.
+		"""
+		rows = await bot.stats.leaderboard(ctx.guild.id if ctx.guild else None)
+
+		message = ""
+		for index, (user, rating, played, wins, kills, deaths, damage, traps, weapon) in enumerate(rows):
+			message += f"{index+1}. {helpers.mention(user)} **{rating:.0f}** - {wins}/{played} won, {kills} kills, {damage} damage"
+			message += f", favours the {weapon}\n" if weapon else "\n"
+
+		embed = discord.Embed(title=f"Leaderboard of {ctx.guild or 'the arena'}", description=message or "No matches played yet")
+		outbox.send(ctx.channel, embed=embed)
+
+	@throw.autocomplete("target_mention")
+	async def throw_targets(interaction, current):
+		channel_match = matches.get_match_in_channel(interaction.channel, interaction.guild)
+		if channel_match is None:
+			return []
+
+		current = current.lower()
+		return [app_commands.Choice(name=i.name, value=str(i.player) if helpers.is_ai(i.player) else f"<@{i.player}>")
+			for i in channel_match.fighters if i.player != interaction.user.id and current in i.name.lower()][:25]
 
+	# admins reach this one through a mention when message content is off
+	@bot.command(hidden=True)
+	async def profile(ctx, seconds: float = 10):
+		"""
+		***FOR ADMINS ONLY***
+
+		Profile the bot for a number of seconds and upload the results.
+		"""
+		if ctx.guild is None or not ctx.author.guild_permissions.administrator:
+			await send_error(ctx, 20)
+			return
+
+		seconds = helpers.clamp(seconds, 1, 60)
+		stats = await metrics.profile(seconds)
+		if stats is None:
+			await send_error(ctx, 21)
+			return
+
+		await ctx.send(f"Profiled for {seconds:g} seconds", file=discord.File(io.BytesIO(stats.encode("utf-8")), "profile.txt"))
+
+	@challenge.error
+	@tournament_open.error
 	@move.error
 	@attack.error
 	@throw.error
@@ -498,6 +948,11 @@ if __name__ == '__main__':
 	@disarm.error
 	async def discord_errors(ctx, error):
 		if isinstance(error, commands.MissingRequiredArgument):
-			await ctx.send("Error: missing arguements for command used")
+			await reply(ctx, "Error: missing arguements for command used")
+		elif isinstance(error, commands.BadArgument):
+			await send_error(ctx, 13)
+
+	return bot
 
-	bot.run(getenv("TOKEN"))
\ No newline at end of file
+if __name__ == '__main__':
+	create_bot().run(getenv("TOKEN"))
\ No newline at end of file
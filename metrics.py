@@ -0,0 +1,166 @@
+import asyncio
+import bisect
+import contextvars
+import cProfile
+import functools
+import io
+import pstats
+import time
+
+from aiohttp import web
+
+
+buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# the command being handled, so calls made on its behalf can be attributed
+command = contextvars.ContextVar("command", default=None)
+
+histograms = {}
+counters = {}
+gauges = {}
+
+profiling = False
+
+
+class Histogram:
+	__slots__ = ("counts", "sum", "count")
+
+	def __init__(self):
+		self.counts = [0] * (len(buckets) + 1)
+		self.sum = 0.0
+		self.count = 0
+
+	def observe(self, value):
+		self.counts[bisect.bisect_left(buckets, value)] += 1
+		self.sum += value
+		self.count += 1
+
+
+def labelled(name, labels):
+	return (name, tuple(sorted(labels.items())))
+
+def observe(name, value, **labels):
+	key = labelled(name, labels)
+	histogram = histograms.get(key)
+	if histogram is None:
+		histogram = histograms[key] = Histogram()
+	histogram.observe(value)
+
+def count(name, amount=1, **labels):
+	key = labelled(name, labels)
+	counters[key] = counters.get(key, 0) + amount
+
+def count_call(name):
+	count(name, command=command.get() or "")
+
+def gauge(name, func):
+	gauges[name] = func
+
+def timed(name):
+	def decorate(func):
+		if asyncio.iscoroutinefunction(func):
+			@functools.wraps(func)
+			async def wrapper(*args, **kwargs):
+				start = time.perf_counter()
+				try:
+					return await func(*args, **kwargs)
+				finally:
+					observe(name, time.perf_counter() - start)
+		else:
+			@functools.wraps(func)
+			def wrapper(*args, **kwargs):
+				start = time.perf_counter()
+				try:
+					return func(*args, **kwargs)
+				finally:
+					observe(name, time.perf_counter() - start)
+		return wrapper
+	return decorate
+
+
+def format_labels(labels, extra=()):
+	labels = tuple(labels) + tuple(extra)
+	if not labels:
+		return ""
+	return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+def render():
+	lines = []
+
+	for (name, labels), value in sorted(counters.items()):
+		lines.append(f"{name}{format_labels(labels)} {value}")
+
+	for (name, labels), histogram in sorted(histograms.items()):
+		total = 0
+		for bound, amount in zip(buckets, histogram.counts):
+			total += amount
+			lines.append(f"{name}_bucket{format_labels(labels, [('le', bound)])} {total}")
+		lines.append(f"{name}_bucket{format_labels(labels, [('le', '+Inf')])} {histogram.count}")
+		lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+		lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+
+	for name, func in sorted(gauges.items()):
+		value = func()
+		if isinstance(value, dict):
+			for key, amount in sorted(value.items()):
+				lines.append(f"{name}_{key} {amount}")
+		else:
+			lines.append(f"{name} {value}")
+
+	return "\n".join(lines) + "\n"
+
+
+async def serve(port, host="127.0.0.1"):
+	async def handle(request):
+		return web.Response(text=render(), content_type="text/plain")
+
+	app = web.Application()
+	app.router.add_get("/metrics", handle)
+
+	runner = web.AppRunner(app, access_log=None)
+	await runner.setup()
+	await web.TCPSite(runner, host, port).start()
+	return runner
+
+
+class LagMonitor:
+	def __init__(self, interval=1.0):
+		self.interval = interval
+		self.task = None
+
+	def start(self):
+		if self.task is None:
+			self.task = asyncio.get_running_loop().create_task(self.run())
+
+	def stop(self):
+		if self.task is not None:
+			self.task.cancel()
+			self.task = None
+
+	async def run(self):
+		# a sleep of its own, since timers also wait on each other's
+		# callbacks; how late it wakes is how long the loop was busy
+		while True:
+			deadline = time.monotonic() + self.interval
+			await asyncio.sleep(self.interval)
+			observe("arena_loop_lag_seconds", max(0.0, time.monotonic() - deadline))
+
+
+async def profile(seconds, limit=40):
+	global profiling
+
+	if profiling:
+		return None
+	profiling = True
+
+	profiler = cProfile.Profile()
+	profiler.enable()
+	try:
+		await asyncio.sleep(seconds)
+	finally:
+		profiler.disable()
+		profiling = False
+
+	output = io.StringIO()
+	pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(limit)
+	return output.getvalue()
\ No newline at end of file
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+import discord
+
+import metrics
+
+
+log = logging.getLogger(__name__)
+
+max_length = 2000
+
+outboxes = {}
+
+counters = {"sent": 0, "merged": 0, "dropped": 0, "errors": 0}
+latencies = deque(maxlen=1000)
+
+
+class Text:
+	def __init__(self, content, embed):
+		self.content = content
+		self.embed = embed
+		self.queued = time.monotonic()
+
+class Call:
+	def __init__(self, func, key):
+		self.func = func
+		self.key = key
+		self.queued = time.monotonic()
+
+
+class Outbox:
+	def __init__(self, channel, rate=5, per=5.0):
+		self.channel = channel
+		self.pending = deque()
+		self.keys = set()
+		self.task = None
+
+		# discord allows about 5 messages per 5 seconds in a channel
+		self.rate = rate
+		self.per = per
+		self.sent_at = deque(maxlen=rate)
+
+	def start(self):
+		if self.task is None:
+			self.task = asyncio.get_running_loop().create_task(self.run())
+
+	def send(self, content=None, embed=None):
+		metrics.count_call("arena_outbox_queued_total")
+		self.pending.append(Text(content, embed))
+		self.start()
+
+	def call(self, func, key=None):
+		# a pending call with the same key reads the latest state when it runs
+		if key is not None:
+			if key in self.keys:
+				counters["dropped"] += 1
+				return
+			self.keys.add(key)
+
+		metrics.count_call("arena_outbox_queued_total")
+		self.pending.append(Call(func, key))
+		self.start()
+
+	def take(self):
+		first = self.pending.popleft()
+		items = [first]
+
+		if isinstance(first, Call):
+			self.keys.discard(first.key)
+			return items, first.func
+
+		content = [first.content] if first.content else []
+		embed = first.embed
+		length = len(first.content or "")
+
+		while embed is None and self.pending and isinstance(self.pending[0], Text):
+			following = self.pending[0]
+			if following.content and length + len(following.content) + 1 > max_length:
+				break
+
+			self.pending.popleft()
+			items.append(following)
+			if following.content:
+				content.append(following.content)
+				length += len(following.content) + 1
+			embed = following.embed
+
+		counters["merged"] += len(items) - 1
+		text = "\n".join(content) or None
+		return items, lambda: self.channel.send(text, embed=embed)
+
+	async def wait_for_bucket(self):
+		if len(self.sent_at) == self.rate:
+			delay = self.sent_at[0] + self.per - time.monotonic()
+			if delay > 0:
+				await asyncio.sleep(delay)
+
+	async def run(self):
+		try:
+			while self.pending:
+				await self.wait_for_bucket()
+				items, func = self.take()
+
+				# a failed send is dropped, the rest of the queue still goes out
+				try:
+					await func()
+				except discord.HTTPException:
+					counters["errors"] += 1
+				except Exception:
+					counters["errors"] += 1
+					log.exception("sending to channel %d failed", self.channel.id)
+				metrics.count("arena_rest_calls_total")
+
+				now = time.monotonic()
+				self.sent_at.append(now)
+				counters["sent"] += 1
+				for i in items:
+					latencies.append(now - i.queued)
+		finally:
+			self.task = None
+			if not self.pending and outboxes.get(self.channel.id) is self:
+				del outboxes[self.channel.id]
+
+	def depth(self):
+		return len(self.pending)
+
+
+def get(channel):
+	box = outboxes.get(channel.id)
+	if box is None:
+		box = outboxes[channel.id] = Outbox(channel)
+	return box
+
+def send(channel, content=None, embed=None):
+	get(channel).send(content, embed)
+
+def stats():
+	ordered = sorted(latencies)
+	def percentile(fraction):
+		return ordered[min(len(ordered)-1, int(len(ordered) * fraction))] if ordered else 0.0
+
+	return dict(counters,
+		channels=len(outboxes),
+		depth=sum(i.depth() for i in outboxes.values()),
+		latency_p50=percentile(0.5),
+		latency_p99=percentile(0.99))
\ No newline at end of file
@@ -0,0 +1,140 @@
+import helpers
+
+import asyncio
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+
+log = logging.getLogger(__name__)
+
+
+def channel_key(guild, channel):
+	return (guild.id if guild else None, channel.id)
+
+def shard_for(guild_id, shard_count):
+	return ((guild_id or 0) >> 22) % shard_count
+
+
+class PlayerStore:
+	"""
+	Which players are in a match in any shard process. Every call runs on
+	one thread of its own, in the order it was made, so a player released
+	and then claimed again is never refused, and waiting on another
+	process's lock never holds up the loop.
+	"""
+	def __init__(self, path):
+		self.db = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+		self.db.execute("PRAGMA journal_mode=WAL")
+		self.db.execute("""CREATE TABLE IF NOT EXISTS players (
+			user INTEGER PRIMARY KEY,
+			guild INTEGER NOT NULL,
+			channel INTEGER NOT NULL)""")
+
+		self.executor = ThreadPoolExecutor(1, thread_name_prefix="players")
+
+	def run(self, func, *args):
+		return asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+	def insert(self, player, guild_id, channel_id):
+		# the primary key makes the claim atomic across processes
+		try:
+			self.db.execute("INSERT INTO players VALUES (?, ?, ?)", (player, guild_id or 0, channel_id))
+		except sqlite3.IntegrityError:
+			return False
+		return True
+
+	def delete(self, player, channel_id):
+		try:
+			self.db.execute("DELETE FROM players WHERE user = ? AND channel = ?", (player, channel_id))
+		except sqlite3.Error:
+			log.exception("could not release player %d", player)
+
+	def select(self, player):
+		return self.db.execute("SELECT 1 FROM players WHERE user = ?", (player,)).fetchone() is not None
+
+	def clear(self, shard_ids, shard_count):
+		marks = ",".join("?" * len(shard_ids))
+		self.db.execute(f"DELETE FROM players WHERE ((guild >> 22) % ?) IN ({marks})", (shard_count, *shard_ids))
+
+	async def claim(self, player, guild_id, channel_id):
+		return await self.run(self.insert, player, guild_id, channel_id)
+
+	def release(self, player, channel_id):
+		# nothing waits on a release, the next claim queues up behind it
+		self.run(self.delete, player, channel_id)
+
+	async def contains(self, player):
+		return await self.run(self.select, player)
+
+	async def reset_shards(self, shard_ids, shard_count):
+		await self.run(self.clear, shard_ids, shard_count)
+
+	def close(self):
+		self.executor.shutdown()
+		self.db.close()
+
+
+class MatchRegistry:
+	def __init__(self, shared=None):
+		self.by_channel = {}
+		self.by_user = {}
+
+		# players in matches owned by other shard processes
+		self.shared = shared
+
+	def __len__(self):
+		return len(self.by_channel)
+
+	def __iter__(self):
+		return iter(list(self.by_channel.values()))
+
+	async def add(self, match):
+		"""Index match and claim its fighters, returning the players already in another match."""
+		self.by_channel[channel_key(match.guild, match.channel)] = match
+		return [i.player for i in list(match.fighters) if not await self.claim(match, i.player)]
+
+	def remove(self, match):
+		key = channel_key(match.guild, match.channel)
+		if self.by_channel.get(key) is match:
+			del self.by_channel[key]
+
+		for i in match.fighters:
+			if self.by_user.get(i.player) is match:
+				self.remove_player(i.player)
+
+	async def claim(self, match, player):
+		# ai fighters reuse the same ids in every match
+		if helpers.is_ai(player):
+			return True
+
+		current = self.by_user.get(player)
+		if current is not None:
+			return current is match
+
+		# held here while the other shards are asked, so a second claim in
+		# this process is refused straight away
+		self.by_user[player] = match
+		if self.shared is not None and not await self.shared.claim(player, match.guild.id if match.guild else None, match.channel.id):
+			if self.by_user.get(player) is match:
+				del self.by_user[player]
+			return False
+
+		return True
+
+	def remove_player(self, player):
+		match = self.by_user.pop(player, None)
+
+		if self.shared is not None and match is not None:
+			self.shared.release(player, match.channel.id)
+
+	def get_match_in_channel(self, channel, guild):
+		return self.by_channel.get(channel_key(guild, channel))
+
+	def is_playing(self, player):
+		return player in self.by_user
+
+	async def playing(self, player):
+		if player in self.by_user:
+			return True
+		return self.shared is not None and await self.shared.contains(player)
\ No newline at end of file
@@ -0,0 +1,141 @@
+import board
+
+import io
+import zlib
+from collections import OrderedDict
+
+try:
+	from PIL import Image, ImageDraw
+except ImportError:
+	Image = None
+
+
+weapon_colors = {
+	"fist": (160, 160, 160),
+	"dagger": (200, 200, 220),
+	"rapier": (230, 200, 90),
+	"axe": (190, 110, 60),
+	"spear": (120, 180, 120),
+}
+
+def available():
+	return Image is not None
+
+
+class Canvas:
+	def __init__(self, renderer, width, height):
+		self.image = Image.new("RGB", (width * renderer.tile, height * renderer.tile))
+		self.drawn = {}
+
+		for x in range(1, width+1):
+			for y in range(1, height+1):
+				renderer.paste(self.image, renderer.background(x, y), x, y)
+
+
+class Renderer:
+	def __init__(self, tile=32, cache_size=256):
+		self.tile = tile
+		self.sprites = {}
+
+		self.cache_size = cache_size
+		self.frames = OrderedDict()
+
+	def paste(self, image, sprite, x, y):
+		image.paste(sprite, ((x-1) * self.tile, (y-1) * self.tile))
+
+	def background(self, x, y):
+		key = ("floor", (x + y) % 2)
+		sprite = self.sprites.get(key)
+
+		if sprite is None:
+			shade = 70 if key[1] else 80
+			sprite = Image.new("RGB", (self.tile, self.tile), (shade, shade, shade))
+			ImageDraw.Draw(sprite).rectangle((0, 0, self.tile-1, self.tile-1), outline=(55, 55, 55))
+			self.sprites[key] = sprite
+
+		return sprite
+
+	def sprite(self, tag, name, x, y):
+		key = (tag, name, (x + y) % 2)
+		sprite = self.sprites.get(key)
+		if sprite is None:
+			sprite = self.background(x, y).copy()
+			draw = ImageDraw.Draw(sprite)
+			edge = self.tile - 4
+
+			match tag:
+				case board.FIGHTER:
+					color = tuple(60 + (zlib.crc32(name.encode()) >> shift) % 160 for shift in (0, 8, 16))
+					draw.ellipse((3, 3, edge, edge), fill=color, outline=(255, 255, 255))
+					draw.text((self.tile // 2, self.tile // 2), name[:2].upper(), fill=(255, 255, 255), anchor="mm")
+				case board.WEAPON:
+					draw.rectangle((6, 6, edge - 2, edge - 2), fill=weapon_colors.get(name, (200, 200, 200)))
+					draw.text((self.tile // 2, self.tile // 2), name[0].upper(), fill=(0, 0, 0), anchor="mm")
+				case _:
+					draw.line((6, 6, edge - 2, edge - 2), fill=(200, 40, 40), width=3)
+					draw.line((6, edge - 2, edge - 2, 6), fill=(200, 40, 40), width=3)
+
+			self.sprites[key] = sprite
+
+		return sprite
+
+	def render(self, match_map, canvas, view=None):
+		key = frame_key(match_map, view)
+		frame = self.frames.get(key)
+		if frame is not None:
+			self.frames.move_to_end(key)
+			return frame
+
+		return self.compose(canvas, key, visible(match_map, key[1]))
+
+	def compose(self, canvas, key, cells):
+		frame = self.frames.get(key)
+		if frame is not None:
+			self.frames.move_to_end(key)
+			return frame
+
+		# canvas cells are keyed by their place in the view, and only those
+		# whose token changed since they were last drawn are recomposited
+		drawn = set()
+		for cell, segment, tag, name in cells:
+			drawn.add(cell)
+			if canvas.drawn.get(cell) != segment:
+				self.paste(canvas.image, self.sprite(tag, name, *cell), *cell)
+				canvas.drawn[cell] = segment
+
+		for cell in [i for i in canvas.drawn if i not in drawn]:
+			self.paste(canvas.image, self.background(*cell), *cell)
+			del canvas.drawn[cell]
+
+		buffer = io.BytesIO()
+		canvas.image.save(buffer, "PNG", compress_level=1)
+		frame = buffer.getvalue()
+
+		self.frames[key] = frame
+		while len(self.frames) > self.cache_size:
+			self.frames.popitem(last=False)
+
+		return frame
+
+
+def frame_key(match_map, view=None):
+	# view is the (left, top, width, height) window of the board the
+	# canvas shows, the whole board by default
+	if view is None:
+		view = (0, 0, match_map.width, match_map.height)
+	return (match_map.hash, view)
+
+def visible(match_map, view):
+	"""The cells of the board inside view, as (cell, segment, tag, name) with cells counted from the view's corner."""
+	left, top, width, height = view
+	cells = []
+
+	for index in match_map.within(left, top, width, height):
+		x, y = divmod(index, match_map.height)
+		obj = match_map.entities[match_map.cells[index]]
+		match obj.tag:
+			case board.WEAPON: name = obj.data['name']
+			case _: name = obj.name
+		cells.append(((x - left + 1, y - top + 1), match_map.segments[index], obj.tag, name))
+
+	return cells
\ No newline at end of file
@@ -0,0 +1,40 @@
+import events
+
+import argparse
+import time
+from os import getenv
+
+def summary(state):
+	winner = state.get_winner()
+	if winner is not None:
+		return f"won by {winner.player} in round {state.current_round}"
+	if not state.started:
+		return f"lobby with {len(state.fighters)} fighters"
+	return f"unfinished, round {state.current_round}, {len(state.fighters)} fighters left"
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Rebuild matches from their seed and event log")
+	parser.add_argument("path", nargs="?", default=getenv("EVENT_LOG", "events.log"))
+	parser.add_argument("--match", type=int, help="only replay the match at this index")
+	parser.add_argument("--repeat", type=int, default=1, help="replay the log this many times, for benchmarking")
+	parser.add_argument("--verbose", action="store_true")
+	args = parser.parse_args()
+
+	records = list(events.read_file(args.path))
+	if args.match is not None:
+		records = [records[args.match]]
+
+	count = sum(sum(1 for i in log) for seed, log in records)
+
+	start = time.perf_counter()
+	for i in range(args.repeat):
+		for index, (seed, log) in enumerate(records):
+			state = events.replay(seed, log)
+
+			if args.verbose and i == 0:
+				print(f"#{index} seed={seed}: {summary(state)}")
+	elapsed = time.perf_counter() - start
+
+	print(f"matches:      {len(records) * args.repeat}")
+	print(f"events:       {count * args.repeat}")
+	print(f"events/sec:   {count * args.repeat / elapsed:,.0f}")
\ No newline at end of file
@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+import time
+from os import getenv
+
+# runs main.py once per process, each owning an interleaved slice of the
+# shards; discord routes every guild to shard (guild_id >> 22) % shard_count
+
+def spawn(index, shard_count, processes):
+	shard_ids = ",".join(str(i) for i in range(index, shard_count, processes))
+	env = dict(os.environ,
+		SHARD_COUNT=str(shard_count),
+		SHARD_IDS=shard_ids,
+		SHARED_DB=getenv("SHARED_DB", "players.db"))
+
+	# every process serves its own metrics, one port after the other
+	if getenv("METRICS_PORT"):
+		env["METRICS_PORT"] = str(int(getenv("METRICS_PORT")) + index)
+
+	return subprocess.Popen([sys.executable, "main.py"], env=env)
+
+if __name__ == '__main__':
+	shard_count = int(getenv("SHARD_COUNT", 2))
+	processes = min(int(getenv("SHARD_PROCESSES", shard_count)), shard_count)
+
+	workers = [spawn(i, shard_count, processes) for i in range(processes)]
+
+	try:
+		while True:
+			time.sleep(5)
+
+			for i, worker in enumerate(workers):
+				if worker.poll() is not None:
+					print(f"shard process {i} exited with {worker.returncode}, restarting", file=sys.stderr)
+					workers[i] = spawn(i, shard_count, processes)
+	except KeyboardInterrupt:
+		for worker in workers:
+			worker.terminate()
+		for worker in workers:
+			worker.wait()
\ No newline at end of file
@@ -0,0 +1,172 @@
+import board
+import engine
+import events
+
+import sqlite3
+import struct
+
+magic = b"ARN3"
+
+# ARN2 snapshots predate board sizes and are always 10x10
+magics = (b"ARN2", magic)
+header = struct.Struct("<4sQQQQQBHIBBB")
+size = struct.Struct("<HH")
+log_length = struct.Struct("<I")
+fighter = struct.Struct("<QhBBBBB")
+item = struct.Struct("<BBBB")
+
+
+def pack_text(text):
+	data = (text or "").encode("utf-8")[:255]
+	return bytes([len(data)]) + data
+
+def unpack_text(data, offset):
+	length = data[offset]
+	return data[offset+1:offset+1+length].decode("utf-8"), offset + 1 + length
+
+def dump(match, guild_id, channel_id, message_id=0, with_events=True):
+	weapons = []
+	traps = []
+	for i in match.map.entities.values():
+		if i.tag == board.WEAPON:
+			weapons.append(i)
+		elif i.tag == board.TRAP:
+			traps.append(i)
+
+	parts = [header.pack(magic, guild_id or 0, channel_id, match.invoker or 0, message_id or 0,
+		match.seed or 0, match.started, match.current_turn, match.current_round,
+		len(match.fighters), len(weapons), len(traps)), size.pack(match.map.width, match.map.height)]
+
+	for i in match.fighters:
+		parts.append(fighter.pack(i.player, i.hp, i.move, i.actions,
+			engine.weapons_data.index(i.equip), i.x, i.y))
+		parts.append(pack_text(i.name))
+		parts.append(pack_text(i.shortcode))
+
+	for i in weapons:
+		parts.append(item.pack(i.x, i.y, engine.weapons_data.index(i.data), 0))
+
+	for i in traps:
+		parts.append(item.pack(i.x, i.y, 0, i.damage))
+		parts.append(pack_text(i.name))
+
+	log = match.events.data if with_events else b""
+	parts.append(log_length.pack(len(log)))
+	parts.append(log)
+
+	return b"".join(parts)
+
+def read_header(data):
+	values = header.unpack_from(data)
+	if values[0] not in magics:
+		raise ValueError("not a match snapshot")
+
+	guild_id, channel_id, invoker, message_id = values[1:5]
+	return guild_id or None, channel_id, message_id or None
+
+def load(data, match):
+	values = header.unpack_from(data)
+	if values[0] not in magics:
+		raise ValueError("not a match snapshot")
+
+	offset = header.size
+	width, height = 10, 10
+	if values[0] == magic:
+		width, height = size.unpack_from(data, offset)
+		offset += size.size
+	if (width, height) != (match.map.width, match.map.height):
+		match.resize(width, height)
+
+	invoker, message_id, seed, started, current_turn, current_round, fighters, weapons, traps = values[3:]
+	match.invoker = invoker or None
+	match.started = bool(started)
+	match.current_turn = current_turn
+	match.current_round = current_round
+
+	for i in range(fighters):
+		player, hp, move, actions, equip, x, y = fighter.unpack_from(data, offset)
+		name, offset = unpack_text(data, offset + fighter.size)
+		shortcode, offset = unpack_text(data, offset)
+
+		new = engine.Fighter(x, y, match.map, player, name, shortcode or None)
+		new.hp = hp
+		new.move = move
+		new.actions = actions
+		if equip:
+			new.equip = engine.weapons_data[equip]
+			match.map.refresh(new)
+		match.fighters.append(new)
+		match.players[player] = new
+
+	for i in range(weapons):
+		x, y, data_index, unused = item.unpack_from(data, offset)
+		offset += item.size
+		match.weapons.append(engine.Weapon(x, y, engine.weapons_data[data_index], match.map))
+
+	for i in range(traps):
+		x, y, unused, damage = item.unpack_from(data, offset)
+		name, offset = unpack_text(data, offset + item.size)
+		match.traps.append(engine.Trap(x, y, name, damage, match.map))
+
+	length, = log_length.unpack_from(data, offset)
+	offset += log_length.size
+	match.events = events.EventLog(data[offset:offset+length])
+
+	# a lobby still draws spawn points, so its rng has to pick up where the
+	# original left off
+	match.seed = seed or None
+	if match.seed is not None and not match.started:
+		replayed = events.replay(match.seed, match.events)
+		match.rng = replayed.rng
+		match.layout = replayed.layout
+		# and so does the order of its free cells, which depends on the
+		# order everything was placed in
+		match.map.free = replayed.map.free
+
+	return match
+
+
+class CheckpointStore:
+	def __init__(self, path):
+		self.db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+		self.db.execute("PRAGMA journal_mode=WAL")
+		self.db.execute("""CREATE TABLE IF NOT EXISTS matches (
+			channel INTEGER PRIMARY KEY,
+			data BLOB NOT NULL)""")
+		self.db.commit()
+
+		self.dirty = {}
+		self.removed = set()
+
+	def mark(self, channel_id, match):
+		self.dirty[channel_id] = match
+		self.removed.discard(channel_id)
+
+	def discard(self, channel_id):
+		self.dirty.pop(channel_id, None)
+		self.removed.add(channel_id)
+
+	def take(self):
+		dirty, removed = self.dirty, self.removed
+		self.dirty, self.removed = {}, set()
+		return dirty, removed
+
+	def put_back(self, dirty, removed):
+		# anything marked or discarded since is newer than what comes back
+		for key, match in dirty.items():
+			if key not in self.dirty and key not in self.removed:
+				self.dirty[key] = match
+		for key in removed:
+			if key not in self.dirty:
+				self.removed.add(key)
+
+	def write(self, dirty, removed):
+		with self.db:
+			self.db.executemany("INSERT OR REPLACE INTO matches VALUES (?, ?)", dirty.items())
+			self.db.executemany("DELETE FROM matches WHERE channel = ?", [(i,) for i in removed])
+
+	def load_all(self):
+		return [row[0] for row in self.db.execute("SELECT data FROM matches")]
+
+	def close(self):
+		self.db.close()
\ No newline at end of file
@@ -0,0 +1,226 @@
+import helpers
+
+import asyncio
+import sqlite3
+import threading
+import time
+
+# order of the counters kept for every player
+fields = ("matches", "wins", "kills", "deaths", "damage", "traps")
+
+default_rating = 1500.0
+k_factor = 32.0
+
+
+def elo(ratings, placements):
+	"""Rating changes for players listed from first to last place, scoring every pair as one game split across the match."""
+	changes = dict.fromkeys(placements, 0.0)
+	if len(placements) < 2:
+		return changes
+
+	k = k_factor / (len(placements) - 1)
+	for index, winner in enumerate(placements):
+		for loser in placements[index+1:]:
+			expected = 1 / (1 + 10 ** ((ratings[loser] - ratings[winner]) / 400))
+			changes[winner] += k * (1 - expected)
+			changes[loser] -= k * (1 - expected)
+
+	return changes
+
+
+class StatsStore:
+	"""
+	Player results per guild and an Elo rating, written behind: matches
+	only add to counters in memory, and a timer hands them to a thread that
+	writes them and rates finished matches in one transaction.
+	"""
+	def __init__(self, path, cache_ttl=60.0):
+		self.db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+		self.db.execute("PRAGMA journal_mode=WAL")
+		self.db.execute("""CREATE TABLE IF NOT EXISTS players (
+			guild INTEGER NOT NULL,
+			user INTEGER NOT NULL,
+			matches INTEGER NOT NULL DEFAULT 0,
+			wins INTEGER NOT NULL DEFAULT 0,
+			kills INTEGER NOT NULL DEFAULT 0,
+			deaths INTEGER NOT NULL DEFAULT 0,
+			damage INTEGER NOT NULL DEFAULT 0,
+			traps INTEGER NOT NULL DEFAULT 0,
+			rating REAL NOT NULL DEFAULT 1500,
+			PRIMARY KEY (guild, user))""")
+		self.db.execute("""CREATE TABLE IF NOT EXISTS weapons (
+			guild INTEGER NOT NULL,
+			user INTEGER NOT NULL,
+			weapon TEXT NOT NULL,
+			uses INTEGER NOT NULL DEFAULT 0,
+			PRIMARY KEY (guild, user, weapon))""")
+		self.db.execute("CREATE INDEX IF NOT EXISTS players_rating ON players (guild, rating DESC)")
+		self.db.commit()
+
+		# the writer thread and leaderboard queries share the connection
+		self.lock = threading.Lock()
+
+		self.counters = {}
+		self.weapons = {}
+		self.results = []
+
+		# players knocked out of each match so far, first out first
+		self.eliminated = {}
+
+		self.cache_ttl = cache_ttl
+		self.boards = {}
+
+	def pending(self):
+		return len(self.counters) + len(self.weapons) + len(self.results)
+
+	def add(self, guild_id, player, field, amount=1):
+		if helpers.is_ai(player):
+			return
+
+		key = (guild_id or 0, player)
+		counters = self.counters.get(key)
+		if counters is None:
+			counters = self.counters[key] = [0] * len(fields)
+		counters[fields.index(field)] += amount
+
+	def action(self, match, player, op, outcome):
+		guild_id = match.guild.id if match.guild else 0
+
+		if outcome.kind == "trap":
+			self.add(guild_id, player, "traps")
+		if op == "move" or helpers.is_ai(player):
+			return
+
+		# a shove always lands for 1 and a disarm for nothing, whatever
+		# the weapon would deal
+		match op:
+			case "attack" | "throw": damage = outcome.damage
+			case "shove": damage = 1
+			case _: damage = 0
+		if damage:
+			self.add(guild_id, player, "damage", damage)
+
+		key = (guild_id, player, outcome.weapon)
+		self.weapons[key] = self.weapons.get(key, 0) + 1
+
+	def dead(self, match, player, killer):
+		guild_id = match.guild.id if match.guild else 0
+		self.add(guild_id, player, "deaths")
+		if killer is not None and killer != player:
+			self.add(guild_id, killer, "kills")
+
+		self.eliminated.setdefault(match, []).append(player)
+
+	def finish(self, match, winner):
+		eliminated = self.eliminated.pop(match, [])
+		if not match.started:
+			return
+
+		# fighters still standing when a match is cut short place by health
+		standing = sorted((i for i in match.fighters if i.player != winner), key=lambda i: i.hp, reverse=True)
+		placements = ([winner] if winner is not None else []) + [i.player for i in standing] + eliminated[::-1]
+		placements = [i for i in placements if not helpers.is_ai(i)]
+
+		guild_id = match.guild.id if match.guild else 0
+		for i in placements:
+			self.add(guild_id, i, "matches")
+		if winner is not None:
+			self.add(guild_id, winner, "wins")
+
+		if len(placements) > 1:
+			self.results.append((guild_id, placements))
+
+	def take(self):
+		taken = self.counters, self.weapons, self.results
+		self.counters, self.weapons, self.results = {}, {}, []
+		return taken
+
+	def write(self, counters, weapons, results):
+		columns = ", ".join(fields)
+		updates = ", ".join(f"{i} = {i} + excluded.{i}" for i in fields)
+
+		with self.lock, self.db:
+			self.db.executemany(f"""INSERT INTO players (guild, user, {columns}) VALUES (?, ?, {", ".join("?" * len(fields))})
+				ON CONFLICT (guild, user) DO UPDATE SET {updates}""", [(*key, *values) for key, values in counters.items()])
+			self.db.executemany("""INSERT INTO weapons VALUES (?, ?, ?, ?)
+				ON CONFLICT (guild, user, weapon) DO UPDATE SET uses = uses + excluded.uses""", [(*key, uses) for key, uses in weapons.items()])
+
+			# rated in the order the matches ended, each against the ratings
+			# the one before it left
+			for guild_id, placements in results:
+				ratings = self.read_ratings(guild_id, placements)
+				changes = elo(ratings, placements)
+				self.db.executemany("UPDATE players SET rating = ? WHERE guild = ? AND user = ?",
+					[(ratings[i] + change, guild_id, i) for i, change in changes.items()])
+
+	def read_ratings(self, guild_id, players):
+		marks = ",".join("?" * len(players))
+		rows = self.db.execute(f"SELECT user, rating FROM players WHERE guild = ? AND user IN ({marks})", (guild_id, *players))
+		ratings = dict.fromkeys(players, default_rating)
+		ratings.update(rows)
+		return ratings
+
+	def ratings(self, guild_id, players):
+		with self.lock:
+			return self.read_ratings(guild_id or 0, list(players))
+
+	def put_back(self, counters, weapons, results):
+		for key, values in counters.items():
+			pending = self.counters.get(key)
+			if pending is None:
+				self.counters[key] = values
+			else:
+				self.counters[key] = [i + j for i, j in zip(values, pending)]
+
+		for key, uses in weapons.items():
+			self.weapons[key] = self.weapons.get(key, 0) + uses
+
+		# rated before anything that finished since
+		self.results[:0] = results
+
+	async def flush(self):
+		counters, weapons, results = self.take()
+		if not (counters or weapons or results):
+			return
+
+		# a write that fails, say on a lock another shard holds, is retried
+		# with the next flush
+		try:
+			await asyncio.to_thread(self.write, counters, weapons, results)
+		except sqlite3.Error:
+			self.put_back(counters, weapons, results)
+			raise
+
+		# boards of guilds that just changed are read again next time
+		for guild_id in {key[0] for key in counters} | {key[0] for key in weapons}:
+			self.boards.pop(guild_id, None)
+
+	def query(self, guild_id, limit):
+		with self.lock:
+			rows = self.db.execute(f"""SELECT user, rating, {", ".join(fields)} FROM players
+				WHERE guild = ? ORDER BY rating DESC LIMIT ?""", (guild_id, limit)).fetchall()
+			# sqlite takes the bare weapon column from the row with the max
+			favourites = {user: weapon for user, weapon, uses in self.db.execute("""SELECT user, weapon, MAX(uses)
+				FROM weapons WHERE guild = ? GROUP BY user""", (guild_id,))}
+
+		return [(*row, favourites.get(row[0])) for row in rows]
+
+	async def leaderboard(self, guild_id, limit=10):
+		guild_id = guild_id or 0
+		entry = self.boards.get(guild_id)
+
+		# requests that miss at the same time share one query
+		if entry is None or time.monotonic() - entry[0] > self.cache_ttl or entry[1] < limit:
+			task = asyncio.ensure_future(asyncio.to_thread(self.query, guild_id, limit))
+			entry = self.boards[guild_id] = (time.monotonic(), limit, task)
+
+		try:
+			return (await asyncio.shield(entry[2]))[:limit]
+		except sqlite3.Error:
+			if self.boards.get(guild_id) is entry:
+				del self.boards[guild_id]
+			raise
+
+	def close(self):
+		self.write(*self.take())
+		self.db.close()
\ No newline at end of file
@@ -0,0 +1,40 @@
+import ai
+import engine
+import snapshot
+
+import pytest
+
+
+def lobby(seed=1, players=3):
+	match = engine.Match(seed=seed)
+	for i in range(players):
+		match.add_fighter(i+1, f"p{i+1}")
+	match.start_match()
+	return match
+
+def test_no_time_skips():
+	match = lobby()
+	data = snapshot.dump(match, 0, 0, with_events=False)
+	assert ai.search(data, match.get_current_turn().player, 0) == ("skip", (), 0)
+
+def test_nothing_to_do_skips(monkeypatch):
+	match = lobby()
+	monkeypatch.setattr(ai, "candidates", lambda match, player: iter(()))
+	data = snapshot.dump(match, 0, 0, with_events=False)
+	assert ai.search(data, match.get_current_turn().player, 1)[:2] == ("skip", ())
+
+@pytest.mark.parametrize("seed", range(5))
+def test_picks_a_legal_action(seed):
+	match = lobby(seed)
+	player = match.get_current_turn().player
+	op, args, nodes = ai.search(snapshot.dump(match, 0, 0, with_events=False), player, 0.05)
+
+	assert nodes > 0
+	assert (op, args) in list(ai.candidates(match, player))
+	getattr(match, op)(*args)
+
+def test_searches_without_touching_the_match():
+	match = lobby()
+	data = snapshot.dump(match, 0, 0, with_events=False)
+	ai.search(data, match.get_current_turn().player, 0.05)
+	assert snapshot.dump(match, 0, 0, with_events=False) == data
\ No newline at end of file
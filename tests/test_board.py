@@ -0,0 +1,67 @@
+import board
+import engine
+import snapshot
+
+import random
+
+import pytest
+
+from test_snapshot import play
+
+
+def test_free_cells():
+	free = board.FreeCells(20)
+	rng = random.Random(0)
+	taken = set()
+
+	for i in range(2000):
+		index = rng.randrange(20)
+		# adding a free cell or removing a taken one changes nothing
+		if rng.random() < 0.5:
+			free.add(index)
+			taken.discard(index)
+		else:
+			free.remove(index)
+			taken.add(index)
+
+		assert len(free) == 20 - len(taken)
+		assert all((i in free) == (i not in taken) for i in range(20))
+		assert sorted(free[i] for i in range(len(free))) == sorted(set(range(20)) - taken)
+		if free:
+			assert free.choice(rng) not in taken
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("size, layout", [(10, "classic"), (12, "dense"), (40, "spread")])
+def test_free_cells_follow_the_board(seed, size, layout):
+	match = play(seed, size, layout, actions=150)
+	free = match.map.free
+
+	assert sorted(free[i] for i in range(len(free))) == sorted(set(range(size * size)) - set(match.map.cells))
+
+def test_full_board():
+	match = engine.Match(seed=1, layout="standard")
+	while match.map.free:
+		match.layout.trap(match, *match.layout.pick(match))
+
+	assert len(match.traps) == match.get_area()
+	with pytest.raises(engine.ArenaError):
+		match.layout.pick(match)
+
+@pytest.mark.parametrize("seed", range(5))
+def test_free_cells_after_restore(seed):
+	match = play(seed, 20, "dense", actions=100)
+	restored = engine.Match()
+	snapshot.load(snapshot.dump(match, 1, 2, 3), restored)
+
+	free = restored.map.free
+	assert sorted(free[i] for i in range(len(free))) == sorted(set(range(400)) - set(restored.map.cells))
+
+@pytest.mark.parametrize("layout", ["classic", "standard", "dense", "spread"])
+def test_picks_are_free(layout):
+	match = engine.Match(seed=3, width=6, height=6, layout=layout)
+	for i in range(match.get_area()):
+		x, y = match.layout.pick(match)
+		assert match.is_empty(x, y)
+		match.layout.trap(match, x, y)
+
+	assert not match.map.free
\ No newline at end of file
@@ -0,0 +1,61 @@
+import cache
+
+import asyncio
+import os
+
+
+def test_memory_and_disk(tmp_path):
+	path = str(tmp_path / "shortcodes.db")
+
+	async def run():
+		shortcodes = cache.ShortcodeCache(path)
+		assert shortcodes.peek("url") is None
+		assert await shortcodes.get("url") is None
+		await shortcodes.set("url", "code")
+		assert shortcodes.peek("url") == "code"
+		shortcodes.close()
+
+		# a restart finds it on disk, and then in memory
+		shortcodes = cache.ShortcodeCache(path)
+		assert shortcodes.peek("url") is None
+		assert await shortcodes.get("url") == "code"
+		assert shortcodes.peek("url") == "code"
+		shortcodes.close()
+		return shortcodes.stats()
+
+	assert asyncio.run(run()) == {"hits": 2, "misses": 0, "writes": 0, "errors": 0, "memory": 1}
+
+def test_opened_on_first_use(tmp_path):
+	path = str(tmp_path / "shortcodes.db")
+	shortcodes = cache.ShortcodeCache(path)
+	assert not os.path.exists(path)
+
+	asyncio.run(shortcodes.get("url"))
+	assert os.path.exists(path)
+	shortcodes.close()
+
+def test_expired(tmp_path):
+	async def run():
+		shortcodes = cache.ShortcodeCache(str(tmp_path / "shortcodes.db"), ttl=-1)
+		await shortcodes.set("url", "code")
+		return shortcodes.peek("url"), await shortcodes.get("url")
+
+	assert asyncio.run(run()) == (None, None)
+
+def test_memory_size():
+	shortcodes = cache.ShortcodeCache(None, memory_size=2)
+	for i in range(3):
+		asyncio.run(shortcodes.set(f"url{i}", f"code{i}"))
+
+	assert [shortcodes.peek(f"url{i}") for i in range(3)] == [None, "code1", "code2"]
+
+def test_disk_errors_fall_back_to_memory(tmp_path):
+	# a directory cannot be opened as a database
+	shortcodes = cache.ShortcodeCache(str(tmp_path))
+
+	async def run():
+		await shortcodes.set("url", "code")
+		return shortcodes.peek("url"), await shortcodes.get("other")
+
+	assert asyncio.run(run()) == ("code", None)
+	assert shortcodes.errors == 2
\ No newline at end of file
@@ -0,0 +1,55 @@
+import engine
+
+import pytest
+
+
+def started(players=3, seed=1):
+	match = engine.Match(seed=seed)
+	for i in range(players):
+		match.add_fighter(i+1, f"p{i+1}")
+	match.start_match()
+	return match
+
+def test_last_fighter_dying_on_their_turn_ends_the_round():
+	match = started()
+	match.current_turn = 2
+	first = match.fighters[0]
+	first.actions = 1
+
+	match.get_current_turn().hp = 0
+	match.remove_dead()
+
+	assert (match.current_round, match.get_current_turn()) == (2, first)
+	assert first.actions == 2
+
+def test_dying_on_their_turn_passes_it_on():
+	match = started()
+	match.current_turn = 1
+	following = match.fighters[2]
+
+	match.get_current_turn().hp = 0
+	match.remove_dead()
+
+	assert (match.current_round, match.get_current_turn()) == (1, following)
+
+def test_earlier_fighter_dying_keeps_the_turn():
+	match = started()
+	match.current_turn = 2
+	current = match.get_current_turn()
+
+	match.fighters[0].hp = 0
+	match.remove_dead()
+
+	assert (match.current_round, match.get_current_turn()) == (1, current)
+
+def test_end_turn_wraps_into_a_new_round():
+	match = started(2)
+	match.current_turn = 0
+	for i in range(2):
+		match.end_turn()
+	assert (match.current_round, match.current_turn) == (2, 0)
+
+def test_actions_out_of_turn():
+	match = started()
+	with pytest.raises(engine.ArenaError):
+		match.move(match.fighters[match.current_turn-1].player, 1, 0)
\ No newline at end of file
@@ -0,0 +1,108 @@
+import engine
+import events
+
+import random
+
+import pytest
+
+from test_snapshot import play, state
+
+
+def test_codec_round_trip():
+	log = events.EventLog()
+	log.add(1 << 40, "p1")
+	log.add(2, "")
+	log.board(30, 20)
+	log.layout("symmetric")
+	log.start()
+	log.move(1 << 40, -200, 3)
+	log.direction(events.ATTACK, 2, "left")
+	log.direction(events.SHOVE, 2, "up")
+	log.direction(events.DISARM, 2, "down")
+	log.throw(2, 1 << 40)
+	log.throw(2, None)
+	log.skip()
+	log.dead()
+	log.retire(2)
+
+	assert list(events.EventLog(bytes(log.data))) == [
+		(events.ADD, (1 << 40, "p1")),
+		(events.ADD, (2, "")),
+		(events.BOARD, (30, 20)),
+		(events.LAYOUT, ("symmetric",)),
+		(events.START, ()),
+		(events.MOVE, (1 << 40, -128, 3)),
+		(events.ATTACK, (2, "left")),
+		(events.SHOVE, (2, "up")),
+		(events.DISARM, (2, "down")),
+		(events.THROW, (2, 1 << 40)),
+		(events.THROW, (2, None)),
+		(events.SKIP, ()),
+		(events.DEAD, ()),
+		(events.RETIRE, (2,)),
+	]
+
+@pytest.mark.parametrize("seed", range(100))
+@pytest.mark.parametrize("size, layout", [(10, "classic"), (16, "dense"), (30, "symmetric")])
+def test_replay_matches_the_live_match(seed, size, layout):
+	match = play(seed, size, layout, actions=200)
+	assert state(events.replay(match.seed, match.events)) == state(match)
+
+def test_replay_after_retire_and_skip():
+	match = engine.Match(seed=11)
+	for i in range(3):
+		match.add_fighter(i+1, f"p{i+1}")
+	match.retire(2)
+	match.add_fighter(4, "p4")
+	match.start_match()
+	match.skip_turn()
+	match.move(match.get_current_turn().player, 1, 0)
+
+	assert state(events.replay(match.seed, match.events)) == state(match)
+
+def test_event_file(tmp_path):
+	path = str(tmp_path / "events.log")
+	matches = [play(seed) for seed in range(3)]
+
+	log = events.EventFile(path)
+	for i in matches:
+		log.write(i.seed, i.events)
+	log.close()
+
+	read = list(events.read_file(path))
+	assert [(seed, bytes(i.data)) for seed, i in read] == [(i.seed, bytes(i.events.data)) for i in matches]
+	assert [state(events.replay(seed, i)) for seed, i in read] == [state(i) for i in matches]
+
+def test_event_file_waits_for_append(tmp_path):
+	path = str(tmp_path / "events.log")
+	first, second = play(1), play(2)
+
+	log = events.EventFile(path)
+	log.write(first.seed, first.events)
+	assert list(events.read_file(path)) == []
+
+	# a failed append goes back in front of what finished since
+	records = log.take()
+	log.write(second.seed, second.events)
+	log.put_back(records)
+	log.append(log.take())
+	assert log.take() == b""
+
+	read = list(events.read_file(path))
+	assert [(seed, bytes(i.data)) for seed, i in read] == [(i.seed, bytes(i.events.data)) for i in (first, second)]
+	log.close()
+
+def test_event_file_cut_off(tmp_path):
+	path = str(tmp_path / "events.log")
+	matches = [play(seed) for seed in range(2)]
+
+	log = events.EventFile(path)
+	for i in matches:
+		log.write(i.seed, i.events)
+	log.close()
+
+	with open(path, "r+b") as file:
+		file.truncate(len(file.read()) - 1)
+
+	read = list(events.read_file(path))
+	assert [(seed, bytes(i.data)) for seed, i in read] == [(matches[0].seed, bytes(matches[0].events.data))]
\ No newline at end of file
@@ -0,0 +1,24 @@
+import helpers
+
+import pytest
+
+
+@pytest.mark.parametrize("num, alpha", [(1, "a"), (26, "z"), (27, "aa"), (52, "az"), (53, "ba"), (64, "bl"), (702, "zz"), (703, "aaa")])
+def test_columns(num, alpha):
+	assert helpers.num_to_alpha(num) == alpha
+	assert helpers.alpha_to_num(alpha) == num
+
+def test_columns_round_trip():
+	assert all(helpers.alpha_to_num(helpers.num_to_alpha(i)) == i for i in range(1, 2000))
+
+def test_numbered_fits():
+	assert helpers.numbered(["a", "b"]) == "1. a\n2. b\n"
+
+@pytest.mark.parametrize("count", [150, 163, 255, 1000])
+def test_numbered_roster_fits_an_embed(count):
+	text = helpers.numbered([helpers.mention(123456789012345678 + i) for i in range(count)])
+	assert len(text) <= helpers.description_length
+	assert text.startswith("1. <@123456789012345678>\n")
+
+def test_numbered_says_what_was_left_off():
+	assert helpers.numbered(["a" * 10] * 3, 30) == "1. aaaaaaaaaa\n...and 2 more\n"
\ No newline at end of file
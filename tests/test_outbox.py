@@ -0,0 +1,105 @@
+import outbox
+
+import asyncio
+import time
+
+
+class FakeChannel:
+	def __init__(self, id=1, fail=0):
+		self.id = id
+		self.fail = fail
+		self.sent = []
+
+	async def send(self, content=None, embed=None):
+		if self.fail:
+			self.fail -= 1
+			raise RuntimeError("send failed")
+		self.sent.append((content, embed))
+
+async def drain(box):
+	while box.task is not None:
+		await asyncio.sleep(0)
+
+def test_merges_lines():
+	async def run():
+		channel = FakeChannel()
+		box = outbox.Outbox(channel)
+		box.send("one")
+		box.send("two")
+		box.send("three", embed="roster")
+		box.send("four")
+		await drain(box)
+		return channel.sent
+
+	# lines before an embed go out with it, the ones after it wait
+	assert asyncio.run(run()) == [("one\ntwo\nthree", "roster"), ("four", None)]
+
+def test_merged_length():
+	async def run():
+		channel = FakeChannel()
+		box = outbox.Outbox(channel)
+		for i in range(3):
+			box.send("x" * 900)
+		await drain(box)
+		return channel.sent
+
+	sent = asyncio.run(run())
+	assert [len(content) for content, embed in sent] == [1801, 900]
+
+def test_calls_by_key():
+	async def run():
+		channel = FakeChannel()
+		box = outbox.Outbox(channel)
+		calls = []
+		async def edit(value):
+			calls.append(value)
+
+		box.send("line")
+		box.call(lambda: edit(1), key="board")
+		box.call(lambda: edit(2), key="board")
+		box.call(lambda: edit(3))
+		box.send("after")
+		await drain(box)
+		return channel.sent, calls
+
+	# the second edit of the board was already queued and is dropped
+	assert asyncio.run(run()) == ([("line", None), ("after", None)], [1, 3])
+
+def test_failed_send_keeps_draining():
+	async def run():
+		channel = FakeChannel(fail=1)
+		box = outbox.Outbox(channel)
+		box.send("lost", embed="embed")
+		box.send("kept")
+		await drain(box)
+		return channel.sent
+
+	errors = outbox.counters["errors"]
+	assert asyncio.run(run()) == [("kept", None)]
+	assert outbox.counters["errors"] == errors + 1
+
+def test_rate_limit():
+	async def run():
+		channel = FakeChannel()
+		box = outbox.Outbox(channel, rate=2, per=0.2)
+		for i in range(3):
+			box.send(embed=i)
+
+		start = time.monotonic()
+		await drain(box)
+		return time.monotonic() - start, channel.sent
+
+	elapsed, sent = asyncio.run(run())
+	assert [embed for content, embed in sent] == [0, 1, 2]
+	assert elapsed >= 0.15
+
+def test_forgotten_when_drained():
+	async def run():
+		channel = FakeChannel(id=42)
+		outbox.send(channel, "line")
+		box = outbox.outboxes[42]
+		assert outbox.stats()["depth"] >= 1
+		await drain(box)
+		return 42 in outbox.outboxes
+
+	assert not asyncio.run(run())
\ No newline at end of file
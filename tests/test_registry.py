@@ -0,0 +1,98 @@
+import registry
+
+import asyncio
+from types import SimpleNamespace
+
+
+def fake_match(guild_id, channel_id, *players):
+	guild = SimpleNamespace(id=guild_id) if guild_id is not None else None
+	return SimpleNamespace(guild=guild, channel=SimpleNamespace(id=channel_id), fighters=[SimpleNamespace(player=i) for i in players])
+
+# discord ids are far above the ones given to ai fighters
+alice = 1 << 40
+bob = 2 << 40
+
+def test_shard_for():
+	assert registry.shard_for(None, 4) == 0
+	assert registry.shard_for(5 << 22, 4) == 1
+	assert registry.shard_for(7 << 22, 4) == 3
+
+def test_one_match_per_player():
+	async def run():
+		matches = registry.MatchRegistry()
+		first = fake_match(1, 10, alice, 1)
+		second = fake_match(1, 11, bob, alice, 1)
+
+		assert await matches.add(first) == []
+		# ai fighters can be in any number of matches
+		assert await matches.add(second) == [alice]
+		assert matches.get_match_in_channel(second.channel, second.guild) is second
+		assert len(matches) == 2
+
+		assert matches.is_playing(alice) and await matches.playing(bob)
+		assert not matches.is_playing(1)
+
+		matches.remove(first)
+		assert not matches.is_playing(alice)
+		assert await matches.claim(second, alice)
+		assert list(matches) == [second]
+
+	asyncio.run(run())
+
+def test_remove_keeps_other_claims():
+	async def run():
+		matches = registry.MatchRegistry()
+		first = fake_match(None, 10, alice)
+		second = fake_match(None, 11, alice, bob)
+		await matches.add(first)
+		await matches.add(second)
+
+		# alice belongs to the first match, so the second leaves her there
+		matches.remove(second)
+		assert matches.is_playing(alice) and not matches.is_playing(bob)
+		assert matches.get_match_in_channel(second.channel, None) is None
+
+	asyncio.run(run())
+
+def test_shared_between_shards(tmp_path):
+	path = str(tmp_path / "players.db")
+
+	async def run():
+		one = registry.PlayerStore(path)
+		two = registry.PlayerStore(path)
+		left = registry.MatchRegistry(one)
+		right = registry.MatchRegistry(two)
+
+		first = fake_match(1, 10, alice, bob)
+		second = fake_match(2, 20, bob, 1)
+		assert await left.add(first) == []
+		assert await right.add(second) == [bob]
+		assert await right.playing(alice) and not right.is_playing(alice)
+
+		# a release is queued ahead of the next call to the same store
+		left.remove_player(bob)
+		third = fake_match(1, 30, bob)
+		assert await left.claim(third, bob)
+		left.remove_player(bob)
+		assert not await one.contains(bob)
+		assert await right.claim(second, bob)
+
+		one.close()
+		two.close()
+
+	asyncio.run(run())
+
+def test_reset_shards(tmp_path):
+	async def run():
+		players = registry.PlayerStore(str(tmp_path / "players.db"))
+		assert await players.claim(alice, 4 << 22, 10)
+		assert await players.claim(bob, 5 << 22, 20)
+
+		await players.reset_shards([0], 2)
+		assert not await players.contains(alice)
+		assert await players.contains(bob)
+		assert await players.claim(alice, 4 << 22, 11)
+
+		players.close()
+
+	asyncio.run(run())
\ No newline at end of file
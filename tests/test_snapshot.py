@@ -0,0 +1,110 @@
+import bench
+import board
+import engine
+import events
+import snapshot
+
+import random
+
+import pytest
+
+
+def state(match):
+	fighters = [(i.player, i.name, i.shortcode, i.x, i.y, i.hp, i.move, i.actions, i.equip['name']) for i in match.fighters]
+	# the lists keep items already picked up, the board only what is left
+	weapons = sorted((i.x, i.y, i.data['name']) for i in match.map.entities.values() if i.tag == board.WEAPON)
+	traps = sorted((i.x, i.y, i.name, i.damage) for i in match.map.entities.values() if i.tag == board.TRAP)
+	return (match.map.width, match.map.height, match.invoker, match.started, match.current_turn, match.current_round,
+		fighters, weapons, traps, match.map.hash)
+
+def play(seed, size=10, layout="classic", actions=40, shortcode=None):
+	rng = random.Random(seed)
+	match = engine.Match(seed=seed, width=size, height=size, layout=layout)
+	for i in range(4):
+		match.add_fighter(i+1, f"p{i+1}", shortcode if i % 2 else None)
+	match.start_match()
+
+	for i in range(actions):
+		if match.get_winner() is not None:
+			break
+		action, args = bench.random_action(match, rng)
+		try:
+			action(*args)
+		except engine.ArenaError:
+			pass
+		match.remove_dead()
+
+	return match
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("size, layout", [(10, "classic"), (10, "standard"), (24, "symmetric"), (40, "spread")])
+def test_round_trip(seed, size, layout):
+	match = play(seed, size, layout, shortcode="code")
+	data = snapshot.dump(match, 1, 2, 3)
+
+	assert snapshot.read_header(data) == (1, 2, 3)
+	loaded = snapshot.load(data, engine.Match())
+	assert state(loaded) == state(match)
+	assert bytes(loaded.events.data) == bytes(match.events.data)
+	assert snapshot.dump(loaded, 1, 2, 3) == data
+
+def test_without_events():
+	match = play(1)
+	loaded = snapshot.load(snapshot.dump(match, None, 2, with_events=False), engine.Match())
+	assert snapshot.read_header(snapshot.dump(match, None, 2)) == (None, 2, None)
+	assert state(loaded) == state(match)
+	assert len(loaded.events) == 0
+
+def test_reads_arn2():
+	match = play(3)
+	data = snapshot.dump(match, 1, 2)
+
+	# the same snapshot before boards had a size
+	old = b"ARN2" + data[4:snapshot.header.size] + data[snapshot.header.size+snapshot.size.size:]
+	loaded = snapshot.load(old, engine.Match(width=20, height=20))
+	assert state(loaded) == state(match)
+
+def test_rejects_other_data():
+	with pytest.raises(ValueError):
+		snapshot.read_header(b"\0" * snapshot.header.size)
+
+@pytest.mark.parametrize("layout", ["classic", "standard", "spread", "symmetric"])
+def test_restored_lobby_continues_the_same(layout):
+	match = engine.Match(seed=7, width=30, height=30, layout=layout)
+	for i in range(5):
+		match.add_fighter(i+1, f"p{i+1}")
+
+	loaded = snapshot.load(snapshot.dump(match, 1, 2), engine.Match())
+	for i in (match, loaded):
+		i.add_fighter(99, "late")
+		i.start_match()
+
+	assert state(loaded) == state(match)
+
+def test_checkpoint_store(tmp_path):
+	store = snapshot.CheckpointStore(str(tmp_path / "matches.db"))
+	match = play(5)
+	store.write({2: snapshot.dump(match, 1, 2)}, set())
+	store.close()
+
+	store = snapshot.CheckpointStore(str(tmp_path / "matches.db"))
+	loaded = [snapshot.load(i, engine.Match()) for i in store.load_all()]
+	assert [state(i) for i in loaded] == [state(match)]
+	store.close()
+
+def test_failed_checkpoint_is_put_back(tmp_path):
+	store = snapshot.CheckpointStore(str(tmp_path / "matches.db"))
+	first, second, third = play(1), play(2), play(3)
+	store.mark(1, first)
+	store.mark(2, second)
+	store.discard(3)
+	dirty, removed = store.take()
+
+	# while the write was away, 2 ended and 3 got a new match
+	store.discard(2)
+	store.mark(3, third)
+	store.put_back(dirty, removed)
+
+	assert store.take() == ({1: first, 3: third}, {2})
+	store.close()
\ No newline at end of file
@@ -0,0 +1,137 @@
+import stats
+
+import asyncio
+import sqlite3
+
+import pytest
+
+from types import SimpleNamespace
+
+
+def test_elo_is_zero_sum():
+	ratings = {1: 1500.0, 2: 1600.0, 3: 1400.0, 4: 1550.0}
+	changes = stats.elo(ratings, [3, 1, 4, 2])
+
+	assert sum(changes.values()) == pytest.approx(0)
+	assert changes[3] > 0 > changes[2]
+
+def test_elo_pairs():
+	changes = stats.elo({1: 1500.0, 2: 1500.0}, [1, 2])
+	assert changes == {1: stats.k_factor / 2, 2: -stats.k_factor / 2}
+
+	# an upset moves the ratings further than the expected result
+	assert stats.elo({1: 1400.0, 2: 1600.0}, [1, 2])[1] > stats.elo({1: 1600.0, 2: 1400.0}, [1, 2])[1]
+
+	# a match of any size moves ratings by at most one k factor
+	changes = stats.elo(dict.fromkeys(range(8), 1500.0), list(range(8)))
+	assert changes[0] == pytest.approx(stats.k_factor / 2)
+
+def test_elo_single_player():
+	assert stats.elo({1: 1500.0}, [1]) == {1: 0.0}
+
+def test_store_round_trip(tmp_path):
+	path = str(tmp_path / "stats.db")
+	store = stats.StatsStore(path)
+	store.add(7, 1 << 40, "damage", 5)
+	store.add(7, 1 << 40, "matches")
+	store.add(7, (1 << 40) + 1, "matches")
+	store.add(7, 3, "kills")
+	store.weapons[(7, 1 << 40, "axe")] = 2
+	store.results.append((7, [1 << 40, (1 << 40) + 1]))
+	store.close()
+
+	store = stats.StatsStore(path)
+	rows = store.query(7, 10)
+	assert [i[0] for i in rows] == [1 << 40, (1 << 40) + 1]
+	assert rows[0][1] == pytest.approx(stats.default_rating + stats.k_factor / 2)
+	assert rows[0][2:] == (1, 0, 0, 0, 5, 0, "axe")
+	assert store.ratings(7, [(1 << 40) + 1, 99]) == {(1 << 40) + 1: pytest.approx(stats.default_rating - stats.k_factor / 2), 99: stats.default_rating}
+	assert store.query(8, 10) == []
+	store.close()
+
+def test_failed_flush_keeps_the_batch(tmp_path, monkeypatch):
+	store = stats.StatsStore(str(tmp_path / "stats.db"))
+	store.add(7, 1 << 40, "damage", 5)
+	store.add(7, 3 << 40, "matches")
+	store.weapons[(7, 1 << 40, "axe")] = 2
+	store.results.append((7, [1 << 40, 3 << 40]))
+
+	def locked(*args):
+		# something else finished while the write was away
+		store.add(7, 1 << 40, "damage", 1)
+		store.results.append((7, [3 << 40, 1 << 40]))
+		raise sqlite3.OperationalError("database is locked")
+
+	monkeypatch.setattr(store, "write", locked)
+	with pytest.raises(sqlite3.OperationalError):
+		asyncio.run(store.flush())
+
+	assert store.counters == {(7, 1 << 40): [0, 0, 0, 0, 6, 0], (7, 3 << 40): [1, 0, 0, 0, 0, 0]}
+	assert store.weapons == {(7, 1 << 40, "axe"): 2}
+	assert store.results == [(7, [1 << 40, 3 << 40]), (7, [3 << 40, 1 << 40])]
+
+	monkeypatch.undo()
+	asyncio.run(store.flush())
+	assert store.pending() == 0
+	rows = store.query(7, 10)
+	assert sum(i[1] for i in rows) == pytest.approx(2 * stats.default_rating)
+	assert [i[6] for i in rows if i[0] == 1 << 40] == [6]
+	store.close()
+
+class FakeMatch:
+	def __init__(self, guild_id, *fighters):
+		self.guild = SimpleNamespace(id=guild_id)
+		self.started = True
+		self.fighters = [SimpleNamespace(player=player, hp=hp) for player, hp in fighters]
+
+def test_match_results(tmp_path):
+	store = stats.StatsStore(str(tmp_path / "stats.db"))
+	first, second, third, ai = 1 << 40, 2 << 40, 3 << 40, 1
+	match = FakeMatch(7, (first, 5), (second, 8))
+
+	store.action(match, first, "attack", SimpleNamespace(kind="attack", weapon="axe", damage=3))
+	store.action(match, first, "shove", SimpleNamespace(kind="shove", weapon="axe", damage=3))
+	store.action(match, second, "move", SimpleNamespace(kind="trap", weapon="fist", damage=1))
+	store.action(match, ai, "attack", SimpleNamespace(kind="attack", weapon="spear", damage=2))
+	store.dead(match, third, first)
+	store.dead(match, ai, second)
+
+	# cut short, so the healthiest one left places first, and the ai
+	# fighter is left out
+	store.finish(match, None)
+	assert store.results == [(7, [second, first, third])]
+	assert store.counters == {
+		(7, first): [1, 0, 1, 0, 4, 0],
+		(7, second): [1, 0, 1, 0, 0, 1],
+		(7, third): [1, 0, 0, 1, 0, 0],
+	}
+	assert store.weapons == {(7, first, "axe"): 2}
+	assert store.eliminated == {}
+	store.close()
+
+def test_leaderboard_cached(tmp_path, monkeypatch):
+	store = stats.StatsStore(str(tmp_path / "stats.db"))
+	store.add(7, 1 << 40, "matches")
+	store.write(*store.take())
+
+	queries = []
+	query = store.query
+	def counted(guild_id, limit):
+		queries.append(guild_id)
+		return query(guild_id, limit)
+	monkeypatch.setattr(store, "query", counted)
+
+	async def run():
+		# requests at the same time share one query, and a flush that
+		# touches the guild drops it
+		first, second = await asyncio.gather(store.leaderboard(7), store.leaderboard(7, 5))
+		await store.leaderboard(7)
+		store.add(7, 2 << 40, "matches")
+		await store.flush()
+		return first, second, await store.leaderboard(7)
+
+	first, second, third = asyncio.run(run())
+	assert first == second
+	assert len(third) == 2
+	assert queries == [7, 7]
+	store.close()
\ No newline at end of file
@@ -0,0 +1,97 @@
+import engine
+import helpers
+import snapshot
+import threats
+
+import random
+from collections import OrderedDict
+
+import pytest
+
+
+def ray_cells(fighter, direction, match_map):
+	# the cells get_attack_target walks, clamped the same way
+	ox, oy = threats.directions[direction]
+	return {(helpers.clamp(fighter.x+ox*i, 1, match_map.width), helpers.clamp(fighter.y+oy*i, 1, match_map.height))
+		for i in range(1, fighter.equip['range']+1)}
+
+def check(match):
+	match_map = match.map
+	threat_map = match_map.threats
+
+	for fighter in match.fighters:
+		for direction, name in enumerate(("up", "down", "left", "right")):
+			want = engine.get_attack_target(fighter.equip['range'], fighter.get_position(), engine.get_attack_offset(name), match_map)
+			assert threat_map.target(fighter, direction) is want
+
+		for other in match.fighters:
+			distance = engine.get_ranged_distance(fighter.get_position(), other.get_position())
+			assert threat_map.in_throw_range(fighter, other) == (distance <= threats.throw_range)
+
+	for x in range(1, match_map.width+1):
+		for y in range(1, match_map.height+1):
+			want = 0
+			for fighter in match.fighters:
+				if (x, y) == (fighter.x, fighter.y):
+					continue
+				reaches = any((x, y) in ray_cells(fighter, i, match_map) for i in range(len(threats.directions)))
+				throws = fighter.equip['name'] == "dagger" and abs(x-fighter.x) + abs(y-fighter.y) <= threats.throw_range
+				if reaches or throws:
+					want += fighter.equip['damage']
+			assert threat_map.danger_at(x, y) == want
+
+	assert set(threat_map.rays) == {i.id for i in match.fighters}
+
+def random_action(match, rng):
+	fighter = match.get_current_turn()
+	roll = rng.random()
+
+	if roll < 0.45:
+		x = rng.randint(-4, 4)
+		y = rng.randint(-(4-abs(x)), 4-abs(x))
+		return match.move, (fighter.player, x, y)
+	if roll < 0.8:
+		return match.attack, (fighter.player, rng.choice(("up", "down", "left", "right")))
+	if roll < 0.9:
+		return match.throw, (fighter.player, rng.choice(match.fighters).player)
+	if roll < 0.95:
+		return match.shove, (fighter.player, rng.choice(("up", "down", "left", "right")))
+	return match.disarm, (fighter.player, rng.choice(("up", "down", "left", "right")))
+
+@pytest.mark.parametrize("seed", range(8))
+@pytest.mark.parametrize("size", (10, 13))
+def test_matches_a_ray_scan(seed, size):
+	rng = random.Random(seed)
+	match = engine.Match(seed=seed, width=size, height=size)
+	for i in range(4):
+		match.add_fighter(i+1, f"p{i+1}")
+	match.start_match()
+	check(match)
+
+	for i in range(120):
+		if match.get_winner() is not None:
+			break
+		action, args = random_action(match, rng)
+		try:
+			action(*args)
+		except engine.ArenaError:
+			pass
+		match.remove_dead()
+		check(match)
+
+	# a restored match builds its threats from the loaded board
+	restored = engine.Match()
+	snapshot.load(snapshot.dump(match, 1, 2, 3), restored)
+	check(restored)
+
+def test_caches_bounded(monkeypatch):
+	monkeypatch.setattr(threats, "cache_size", 8)
+	for name in ("rays", "areas", "footprints"):
+		monkeypatch.setattr(threats, name, OrderedDict())
+	match = engine.Match(seed=1, width=20, height=20)
+	for i in range(4):
+		match.add_fighter(i+1, f"p{i+1}")
+
+	assert len(threats.rays) <= 8
+	assert len(threats.areas) <= 8
+	assert len(threats.footprints) <= 8
\ No newline at end of file
@@ -0,0 +1,72 @@
+import timers
+
+import asyncio
+
+
+def test_order_and_reschedule():
+	async def run():
+		scheduler = timers.Scheduler()
+		scheduler.start()
+		fired = []
+
+		def record(name):
+			async def callback():
+				fired.append(name)
+			return callback
+
+		scheduler.schedule("late", 0.06, record("late"))
+		scheduler.schedule("early", 0.02, record("early"))
+		scheduler.schedule("moved", 0.01, record("first"))
+		# scheduling a key again replaces its deadline and callback
+		scheduler.schedule("moved", 0.04, record("moved"))
+		scheduler.schedule("cancelled", 0.03, record("cancelled"))
+		scheduler.cancel("cancelled")
+
+		await asyncio.sleep(0.1)
+		scheduler.stop()
+		return fired
+
+	assert asyncio.run(run()) == ["early", "moved", "late"]
+
+def test_slow_and_failing_callbacks():
+	async def run():
+		scheduler = timers.Scheduler()
+		scheduler.start()
+		fired = []
+
+		async def slow():
+			await asyncio.sleep(1)
+			fired.append("slow")
+
+		async def failing():
+			raise ValueError("callback failed")
+
+		async def fast():
+			fired.append("fast")
+
+		# neither a callback still running nor one that raised holds up the rest
+		scheduler.schedule("slow", 0, slow)
+		scheduler.schedule("failing", 0.01, failing)
+		scheduler.schedule("fast", 0.02, fast)
+		await asyncio.sleep(0.1)
+
+		running = len(scheduler.running)
+		scheduler.stop()
+		await asyncio.sleep(0)
+		return fired, running, scheduler.task
+
+	assert asyncio.run(run()) == (["fast"], 1, None)
+
+def test_heap_rebuilt():
+	async def run():
+		scheduler = timers.Scheduler()
+		async def callback():
+			pass
+
+		for i in range(1000):
+			scheduler.schedule("key", 60, callback)
+		return len(scheduler.heap), len(scheduler.deadlines)
+
+	heap, deadlines = asyncio.run(run())
+	assert deadlines == 1
+	assert heap <= 2 * deadlines + 65
\ No newline at end of file
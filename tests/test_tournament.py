@@ -0,0 +1,121 @@
+import helpers
+import tournament
+
+import asyncio
+from types import SimpleNamespace
+
+
+class FakeChannel:
+	# not a discord.TextChannel, so every group plays in it in turn
+	def __init__(self):
+		self.id = 1
+		self.guild = None
+		self.sent = []
+
+	async def send(self, content=None, embed=None):
+		self.sent.append(content)
+
+def user(id):
+	return SimpleNamespace(id=id, mention=helpers.mention(id))
+
+class FakeMatch:
+	def __init__(self):
+		self.finished = asyncio.get_running_loop().create_future()
+
+class FakeLaunch:
+	"""Opens a match for each group that the first player in it wins."""
+	def __init__(self, refuse=0):
+		self.refuse = refuse
+		self.groups = []
+
+	async def __call__(self, channel, group, size, layout):
+		if self.refuse:
+			self.refuse -= 1
+			return None
+
+		self.groups.append([i.id for i in group])
+		match = FakeMatch()
+		asyncio.get_running_loop().call_soon(match.finished.set_result, group[0].id)
+		return match
+
+def play(players, group_size=4, busy=(), refuse=0, key=None):
+	async def run():
+		event = tournament.Tournament(FakeChannel(), players[0], group_size)
+		for i in players:
+			event.join(i)
+
+		launch = FakeLaunch(refuse)
+		async def is_busy(player):
+			return player.id in busy
+
+		winner = await event.start(launch, is_busy, key)
+		return winner, launch.groups, event
+
+	return asyncio.run(run())
+
+def test_snake():
+	groups = tournament.snake(list(range(10)), 4)
+	assert groups == [[0, 5, 6], [1, 4, 7], [2, 3, 8, 9]]
+	assert tournament.snake([0, 1], 4) == [[0, 1]]
+
+def test_rounds_until_one_is_left():
+	players = [user(i) for i in range(1, 9)]
+	winner, groups, event = play(players, key=lambda i: -i.id)
+
+	# seeded by the key, so player 1 is the top seed and wins every group
+	assert winner is players[0]
+	assert event.round == 2
+	assert len(groups) == 3
+	assert sorted(i for group in groups[:2] for i in group) == list(range(1, 9))
+	assert groups[2] == [1, 2]
+	assert event.channel.sent[-1] == f"{players[0].mention} has won the tournament!"
+
+def test_busy_player_forfeits():
+	players = [user(i) for i in range(1, 4)]
+	winner, groups, event = play(players, group_size=2, busy={3}, key=lambda i: -i.id)
+
+	# 1 goes through alone, and 2 without a fight since 3 is in another match
+	assert groups == [[1, 2]]
+	assert winner is players[0]
+	assert any("without a fight" in (i or "") for i in event.channel.sent)
+
+def test_refused_launch_is_retried(monkeypatch):
+	monkeypatch.setattr(tournament, "retry_delay", 0)
+	players = [user(1), user(2)]
+	winner, groups, event = play(players, refuse=2, key=lambda i: -i.id)
+
+	assert groups == [[1, 2]]
+	assert winner is players[0]
+
+def test_cancel_leaves_the_match():
+	async def run():
+		event = tournament.Tournament(FakeChannel(), user(1))
+		event.join(user(1))
+		event.join(user(2))
+
+		match = FakeMatch()
+		async def launch(channel, group, size, layout):
+			return match
+		async def busy(player):
+			return False
+
+		task = event.start(launch, busy)
+		await asyncio.sleep(0)
+		await asyncio.sleep(0)
+		live = len(event.live)
+
+		event.cancel()
+		try:
+			await task
+		except asyncio.CancelledError:
+			pass
+		return live, task.cancelled(), match.finished.cancelled(), len(event.live)
+
+	assert asyncio.run(run()) == (1, True, False, 0)
+
+def test_describe_within_limit():
+	event = tournament.Tournament(FakeChannel(), user(1))
+	for i in range(1 << 22, (1 << 22) + 1000):
+		event.join(user(i))
+
+	assert len(event.describe().description) <= helpers.description_length
\ No newline at end of file
@@ -0,0 +1,159 @@
+import board
+import helpers
+
+from collections import OrderedDict
+
+# same order as engine.get_attack_offset
+directions = ((0, -1), (0, 1), (-1, 0), (1, 0))
+
+throw_range = 5
+
+# shared by every match, and bounded since boards come in many sizes
+rays = OrderedDict()
+areas = OrderedDict()
+footprints = OrderedDict()
+cache_size = 2048
+
+
+def remember(cache, key, value):
+	cache[key] = value
+	while len(cache) > cache_size:
+		cache.popitem(last=False)
+	return value
+
+
+def get_ray(match_map, x, y, direction, reach):
+	key = (match_map.width, match_map.height, x, y, direction, reach)
+	ray = rays.get(key)
+
+	# clamped like get_attack_target, so a ray off the edge ends on the
+	# attacker's own cell
+	if ray is None:
+		ox, oy = directions[direction]
+		return remember(rays, key, tuple(match_map.index(helpers.clamp(x+ox*i, 1, match_map.width), helpers.clamp(y+oy*i, 1, match_map.height))
+			for i in range(1, reach+1)))
+
+	rays.move_to_end(key)
+	return ray
+
+def get_area(match_map, x, y, distance):
+	key = (match_map.width, match_map.height, x, y, distance)
+	area = areas.get(key)
+
+	if area is None:
+		return remember(areas, key, frozenset(match_map.index(i, j)
+			for i in range(max(1, x-distance), min(match_map.width, x+distance)+1)
+			for j in range(max(1, y-distance), min(match_map.height, y+distance)+1)
+			if abs(i-x) + abs(j-y) <= distance))
+
+	areas.move_to_end(key)
+	return area
+
+
+def get_footprint(match_map, x, y, reach, throws):
+	key = (match_map.width, match_map.height, x, y, reach, throws)
+	footprint = footprints.get(key)
+
+	# everything a fighter covers from one square, shared by every match
+	if footprint is None:
+		ray_cells = tuple(get_ray(match_map, x, y, i, reach) for i in range(len(directions)))
+		covers = tuple((index, direction) for direction, ray in enumerate(ray_cells) for index in ray)
+		area = get_area(match_map, x, y, throw_range) if throws else None
+
+		cells = {index for ray in ray_cells for index in ray}
+		if area is not None:
+			cells.update(area)
+		cells.discard(match_map.index(x, y))
+		return remember(footprints, key, (ray_cells, covers, area, frozenset(cells)))
+
+	footprints.move_to_end(key)
+	return footprint
+
+
+class ThreatMap:
+	"""
+	What every fighter can hit from where it stands: its attack ray and
+	first fighter in each direction, the cells in its throw range, and the
+	damage it could land on each of them. The board keeps it current as
+	fighters are placed, cleared and refreshed.
+	"""
+	__slots__ = ("map", "rays", "targets", "covers", "throws", "contributions")
+
+	def __init__(self, match_map):
+		self.map = match_map
+		self.rays = {}
+		self.targets = {}
+		self.throws = {}
+		self.contributions = {}
+
+		# which (fighter, direction) rays pass over each cell
+		self.covers = {}
+
+	def scan(self, ray):
+		tags = self.map.tags
+		for index in ray:
+			if tags.get(index) == board.FIGHTER:
+				return self.map.entities[self.map.cells[index]]
+
+	def track(self, fighter):
+		equip = fighter.equip
+		rays, covers, area, cells = get_footprint(self.map, fighter.x, fighter.y, equip['range'], equip['name'] == "dagger")
+		entity = fighter.id
+
+		self.rays[entity] = rays
+		self.targets[entity] = [self.scan(i) for i in rays]
+		for index, direction in covers:
+			cover = self.covers.get(index)
+			if cover is None:
+				cover = self.covers[index] = set()
+			cover.add((entity, direction))
+		if area is not None:
+			self.throws[entity] = area
+
+		self.contributions[entity] = (covers, cells, equip['damage'])
+
+	def untrack(self, fighter):
+		entity = fighter.id
+		contribution = self.contributions.pop(entity, None)
+		if contribution is None:
+			return
+
+		del self.rays[entity]
+		del self.targets[entity]
+		self.throws.pop(entity, None)
+
+		for index, direction in contribution[0]:
+			self.covers[index].discard((entity, direction))
+
+	def rescan(self, index):
+		for entity, direction in self.covers.get(index, ()):
+			self.targets[entity][direction] = self.scan(self.rays[entity][direction])
+
+	def placed(self, fighter, index):
+		self.untrack(fighter)
+		self.track(fighter)
+		self.rescan(index)
+
+	def cleared(self, fighter, index):
+		self.untrack(fighter)
+		self.rescan(index)
+
+	def target(self, fighter, direction):
+		return self.targets[fighter.id][direction]
+
+	def in_throw_range(self, fighter, target):
+		area = self.throws.get(fighter.id)
+		if area is None:
+			area = get_area(self.map, fighter.x, fighter.y, throw_range)
+		return self.map.index(target.x, target.y) in area
+
+	def danger_at(self, x, y, exclude=None):
+		index = self.map.index(x, y)
+		danger = 0
+
+		# a fighter weighing its own moves does not count its own reach
+		for entity, (covers, cells, damage) in self.contributions.items():
+			if index in cells and (exclude is None or entity != exclude.id):
+				danger += damage
+
+		return danger
\ No newline at end of file
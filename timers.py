@@ -0,0 +1,79 @@
+import asyncio
+import functools
+import heapq
+import itertools
+import logging
+import time
+
+
+log = logging.getLogger(__name__)
+
+
+class Scheduler:
+	def __init__(self):
+		self.heap = []
+		self.deadlines = {}
+		self.counter = itertools.count()
+		self.wakeup = asyncio.Event()
+		self.task = None
+		self.running = set()
+
+	def schedule(self, key, delay, callback):
+		when = time.monotonic() + delay
+		self.deadlines[key] = (when, callback)
+		heapq.heappush(self.heap, (when, next(self.counter), key))
+
+		# superseded entries stay in the heap until they surface, so rebuild
+		# it once they outnumber the live ones
+		if len(self.heap) > 2 * len(self.deadlines) + 64:
+			self.heap = [(when, next(self.counter), key) for key, (when, callback) in self.deadlines.items()]
+			heapq.heapify(self.heap)
+
+		if self.heap[0][2] == key:
+			self.wakeup.set()
+
+	def cancel(self, key):
+		self.deadlines.pop(key, None)
+
+	def start(self):
+		if self.task is None:
+			self.task = asyncio.get_running_loop().create_task(self.run())
+
+	def stop(self):
+		if self.task is not None:
+			self.task.cancel()
+			self.task = None
+
+		for i in self.running:
+			i.cancel()
+
+	def done(self, key, task):
+		self.running.discard(task)
+		if not task.cancelled() and task.exception() is not None:
+			log.error("timer %r failed", key, exc_info=task.exception())
+
+	async def run(self):
+		while True:
+			now = time.monotonic()
+
+			while self.heap and self.heap[0][0] <= now:
+				when, count, key = heapq.heappop(self.heap)
+
+				entry = self.deadlines.get(key)
+				if entry is None or entry[0] != when:
+					continue
+				del self.deadlines[key]
+
+				# callbacks wait on locks, workers and threads, so each runs as
+				# its own task and none holds up the timers behind it
+				task = asyncio.get_running_loop().create_task(entry[1]())
+				self.running.add(task)
+				task.add_done_callback(functools.partial(self.done, key))
+
+			self.wakeup.clear()
+			timeout = self.heap[0][0] - time.monotonic() if self.heap else None
+
+			try:
+				await asyncio.wait_for(self.wakeup.wait(), timeout)
+			except asyncio.TimeoutError:
+				pass
\ No newline at end of file
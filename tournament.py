@@ -0,0 +1,160 @@
+import helpers
+import outbox
+
+import asyncio
+import math
+import random
+
+import discord
+
+retry_delay = 5.0
+
+def snake(players, group_size):
+	"""Split seeded players into groups of at most group_size, dealing them out back and forth so the top seeds meet last."""
+	count = math.ceil(len(players) / group_size)
+	groups = [[] for i in range(count)]
+
+	for index, player in enumerate(players):
+		lap, position = divmod(index, count)
+		groups[position if lap % 2 == 0 else count - 1 - position].append(player)
+
+	return groups
+
+
+class Tournament:
+	"""
+	A bracket of group matches that runs until one player is left. Every
+	round splits the players still in into groups of two to group_size,
+	plays each group as its own match in a thread of the tournament channel,
+	and sends the winners on to the next round. No more than concurrency
+	matches run at once, and the rest wait their turn.
+	"""
+	def __init__(self, channel, organiser, group_size=4, size=10, layout="standard", concurrency=8, rng=None):
+		self.channel = channel
+		self.guild = channel.guild
+		self.organiser = organiser
+		self.group_size = group_size
+		self.size = size
+		self.layout = layout
+		self.rng = rng or random.Random()
+
+		self.players = {}
+		self.started = False
+		self.round = 0
+		self.live = set()
+		self.task = None
+
+		# set by start, to open a match for a group and to tell whether a
+		# player is already fighting somewhere else
+		self.launch = None
+		self.busy = None
+
+		self.semaphore = asyncio.Semaphore(concurrency)
+		# groups that cannot get a thread take turns in the channel itself
+		self.shared = asyncio.Lock()
+
+	def join(self, user):
+		self.players[user.id] = user
+
+	def leave(self, user):
+		self.players.pop(user.id, None)
+
+	def seed(self, key=None):
+		players = list(self.players.values())
+		self.rng.shuffle(players)
+
+		# the sort is stable, so players with the same rating stay shuffled
+		if key is not None:
+			players.sort(key=key, reverse=True)
+
+		return players
+
+	def start(self, launch, busy, key=None):
+		self.started = True
+		self.launch = launch
+		self.busy = busy
+		self.task = asyncio.get_running_loop().create_task(self.run(self.seed(key)))
+		return self.task
+
+	def cancel(self):
+		if self.task is not None:
+			self.task.cancel()
+
+	async def run(self, players):
+		while len(players) > 1:
+			self.round += 1
+			groups = snake(players, self.group_size)
+			outbox.send(self.channel, f"Round {self.round} of the tournament has begun, {len(players)} players left")
+
+			winners = await asyncio.gather(*(self.play_group(index+1, group) for index, group in enumerate(groups)))
+			players = [i for i in winners if i is not None]
+
+		if players:
+			outbox.send(self.channel, f"{players[0].mention} has won the tournament!")
+		else:
+			outbox.send(self.channel, "The tournament has ended without a winner")
+
+		return players[0] if players else None
+
+	async def play_group(self, index, group):
+		async with self.semaphore:
+			group = await self.available(group)
+			if len(group) < 2:
+				return self.walkover(group)
+
+			thread = await self.open_thread(f"Round {self.round} Group {index}")
+
+			if thread is None:
+				async with self.shared:
+					return await self.play(self.channel, group)
+			return await self.play(thread, group)
+
+	async def available(self, group):
+		# whoever is busy in another match when the group comes up forfeits it
+		return [i for i in group if not await self.busy(i)]
+
+	def walkover(self, group):
+		if not group:
+			return None
+
+		outbox.send(self.channel, f"{group[0].mention} goes through round {self.round} without a fight")
+		return group[0]
+
+	async def open_thread(self, name):
+		if not isinstance(self.channel, discord.TextChannel):
+			return None
+
+		try:
+			return await self.channel.create_thread(name=name, type=discord.ChannelType.public_thread, auto_archive_duration=60)
+		except discord.HTTPException:
+			return None
+
+	async def play(self, channel, group):
+		# launch turns a group down while its channel has a match of its
+		# own, which only happens when there are no threads to use, or when
+		# a player got into another match first, who then forfeits
+		while True:
+			group = await self.available(group)
+			if len(group) < 2:
+				return self.walkover(group)
+
+			match = await self.launch(channel, group, self.size, self.layout)
+			if match is not None:
+				break
+			await asyncio.sleep(retry_delay)
+
+		self.live.add(match)
+		outbox.send(channel, " ".join(i.mention for i in group) + f", your round {self.round} match is on!")
+		try:
+			# cancelling the tournament leaves the match itself alone
+			winner = await asyncio.shield(match.finished)
+		finally:
+			self.live.discard(match)
+
+		return next((i for i in group if i.id == winner), None)
+
+	def describe(self):
+		message = f"PLAYERS({len(self.players)}):\n"
+		status = f"\nRound {self.round}, {len(self.live)} matches being fought" if self.started else ""
+		message += helpers.numbered([helpers.mention(i) for i in self.players], helpers.description_length - len(message) - len(status))
+		return discord.Embed(title=f"Tournament at {self.channel}!", description=message + status)
\ No newline at end of file
@@ -0,0 +1,145 @@
+import ai
+import engine
+import metrics
+import renderer
+
+import asyncio
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+actions = ("move", "attack", "throw", "shove", "disarm")
+
+
+class Outcome:
+	__slots__ = ("error", "params", "kind", "location", "target", "weapon", "damage", "trap")
+
+	def __init__(self):
+		self.error = None
+		self.params = ()
+		self.kind = None
+		self.location = None
+		self.target = None
+		self.weapon = None
+		self.damage = None
+		self.trap = None
+
+def resolve(match, op, args):
+	if op not in actions:
+		raise ValueError(f"unknown action {op}")
+
+	outcome = Outcome()
+	try:
+		result = getattr(match, op)(*args)
+	except engine.ArenaError as error:
+		outcome.error = error.code
+		outcome.params = error.params
+		return outcome
+
+	actor = match.find_user_in_match(args[0])
+	outcome.location = actor.label()
+	outcome.weapon = actor.equip['name']
+	outcome.damage = actor.equip['damage']
+
+	if op != "move":
+		outcome.kind = op
+		outcome.target = result.player
+	elif result == 0:
+		outcome.kind = "moved"
+	elif result is actor:
+		outcome.kind = "skipped"
+	elif isinstance(result, engine.Weapon):
+		outcome.kind = "weapon"
+	elif isinstance(result, engine.Trap):
+		outcome.kind = "trap"
+		outcome.trap = result.name
+
+	return outcome
+
+
+worker_renderer = None
+# canvases stay in the worker that a channel maps to, so each frame only
+# recomposites the cells that changed since that channel's last one
+canvases = OrderedDict()
+max_canvases = 256
+
+def render_job(channel_id, key, width, height, cells):
+	global worker_renderer
+
+	if worker_renderer is None:
+		worker_renderer = renderer.Renderer()
+
+	canvas = canvases.get(channel_id)
+	if canvas is None or canvas.image.size != (width * worker_renderer.tile, height * worker_renderer.tile):
+		canvas = canvases[channel_id] = renderer.Canvas(worker_renderer, width, height)
+	canvases.move_to_end(channel_id)
+	while len(canvases) > max_canvases:
+		canvases.popitem(last=False)
+
+	return worker_renderer.compose(canvas, key, cells)
+
+
+class GamePool:
+	"""
+	Rules resolve on the loop, where an action costs microseconds, and the
+	workers take the slow parts: board images and ai searches. A channel
+	always goes to the same worker so its canvas is already there.
+	"""
+	def __init__(self, processes=0, render=False):
+		self.render = render
+		self.executors = []
+		self.context = multiprocessing.get_context("spawn")
+		# a search holds the gil for its whole budget, so even without
+		# workers it gets a process of its own, started on the first one
+		self.searcher = None
+
+		if processes:
+			self.executors = [ProcessPoolExecutor(1, mp_context=self.context) for i in range(processes)]
+
+	def executor(self, match):
+		return self.executors[match.channel.id % len(self.executors)]
+
+	@metrics.timed("arena_action_seconds")
+	async def run(self, match, op, *args):
+		outcome = resolve(match, op, args)
+		if outcome.error is None:
+			await self.prerender(match)
+
+		return outcome
+
+	async def prerender(self, match):
+		# without workers the match renders its own board when it is shown
+		if not self.render or not self.executors:
+			return
+
+		view = match.get_view()
+		key = (match.map.hash, view)
+		if match.prerendered is not None and match.prerendered[0] == key:
+			return
+
+		# only the cells in view go over, already reduced to what their
+		# sprites are drawn from
+		window = view or (0, 0, match.map.width, match.map.height)
+		cells = renderer.visible(match.map, window)
+		loop = asyncio.get_running_loop()
+		image = await loop.run_in_executor(self.executor(match), render_job, match.channel.id, (match.map.hash, window), window[2], window[3], cells)
+		match.prerendered = (key, image)
+
+	async def think(self, match, player, budget):
+		data = match.dump_snapshot(with_events=False)
+		if self.executors:
+			executor = self.executor(match)
+		else:
+			if self.searcher is None:
+				self.searcher = ProcessPoolExecutor(1, mp_context=self.context)
+			executor = self.searcher
+
+		loop = asyncio.get_running_loop()
+		return await loop.run_in_executor(executor, ai.search, data, player, budget)
+
+	def close(self):
+		for i in self.executors:
+			i.shutdown(wait=False, cancel_futures=True)
+		if self.searcher is not None:
+			self.searcher.shutdown(wait=False, cancel_futures=True)
+			self.searcher = None
\ No newline at end of file